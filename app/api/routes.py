@@ -1,25 +1,40 @@
-from fastapi import APIRouter, HTTPException
+import asyncio
+from datetime import datetime
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Query
 from pydantic import BaseModel
-from app.services.call_manager import CallManager
-from app.services.session_manager import SessionManager
+from app.services.call_manager import call_manager
+from app.services.session_manager import session_manager
+from app.services.persistence import conversation_store
+from app.services.admission import admission
 from app.services.logger_service import logger_service
+from app.config import settings
 from loguru import logger
 
 router = APIRouter()
-call_manager = CallManager()
-session_manager = SessionManager()
 
 class CallInitiateRequest(BaseModel):
     phone_number: str
     prompt: str = "你是AI客服，请友善地与用户对话"
+    # 接通后播放的问候语，为空时使用 greeting_text 配置，空字符串不播放
+    greeting: Optional[str] = None
 
 @router.post("/call/initiate")
 async def initiate_call(request: CallInitiateRequest):
     """发起呼叫"""
+    if not admission.accepting_calls:
+        # 通话与排队名额都已占满，立即拒绝而不是拖慢进行中的通话
+        raise HTTPException(
+            status_code=503,
+            detail="通话已满，请稍后重试",
+            headers={"Retry-After": str(int(settings.call_queue_timeout) or 1)}
+        )
+    
     try:
         call = await call_manager.initiate_call(
             request.phone_number,
-            request.prompt
+            request.prompt,
+            request.greeting
         )
         
         logger.info(f"呼叫发起: {call['call_id']} -> {request.phone_number}")
@@ -33,7 +48,9 @@ async def initiate_call(request: CallInitiateRequest):
 @router.get("/call/{call_id}")
 async def get_call_status(call_id: str):
     """查询呼叫状态"""
-    status = call_manager.get_call_status(call_id)
+    status = await call_manager.get_call_status(call_id)
+    if not status and conversation_store.available:
+        status = await asyncio.to_thread(conversation_store.get_call, call_id)
     if not status:
         raise HTTPException(status_code=404, detail="呼叫不存在")
     
@@ -52,10 +69,42 @@ async def terminate_call(call_id: str):
 async def get_conversation(call_id: str):
     """获取对话记录"""
     session = session_manager.get_session(call_id)
-    if not session:
+    if session:
+        return {
+            "call_id": call_id,
+            "conversation": session.messages
+        }
+    
+    # 已结束或重启前的通话从数据库读取
+    messages = []
+    if conversation_store.available:
+        messages = await asyncio.to_thread(conversation_store.get_messages, call_id)
+    if not messages:
         raise HTTPException(status_code=404, detail="会话不存在")
     
     return {
         "call_id": call_id,
-        "conversation": session.messages
+        "conversation": messages
     }
+
+@router.get("/calls")
+async def list_calls(
+    phone_number: Optional[str] = None,
+    status: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    limit: int = Query(100, ge=1, le=1000)
+):
+    """按号码、状态、时间范围查询历史呼叫"""
+    if not conversation_store.available:
+        raise HTTPException(status_code=503, detail="数据库未启用")
+    
+    calls = await asyncio.to_thread(
+        conversation_store.find_calls,
+        phone_number,
+        status,
+        start,
+        end,
+        limit
+    )
+    return {"calls": calls}
@@ -1,110 +1,393 @@
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
-from app.services.session_manager import SessionManager
-from app.services.audio_processor import AudioProcessor
-from app.services.vad_service import VADService
-from app.services.model_client import ModelServiceClient
-from app.services.call_manager import CallManager
+from app.services.session_manager import session_manager
+from app.services.audio_processor import AudioProcessor, OutboundTranscoder
+from app.services.codec import AudioFormat
+from app.services.vad_service import vad_engine
+from app.services.call_manager import call_manager
+from app.services.call_warmup import call_warmup
+from app.services.dsp_executor import CallDSPStage, dsp_executor
+from app.services.utterance_buffer import UtteranceBuffer
+from app.services.audio_archiver import audio_archiver
+from app.services.admission import AdmissionRejected, admission
+from app.services.outbound_scheduler import outbound_scheduler
+from app.services.metrics import (
+    audio_upload_committed,
+    audio_upload_withdrawn,
+    speculation_committed,
+    speculation_head_start_seconds,
+    speculation_wasted,
+    speculation_wasted_seconds,
+    turn_first_audio_seconds,
+    turn_seconds,
+    utterance_buffer_bytes,
+    vad_endpoint_seconds
+)
 from app.config import settings
 from loguru import logger
+import asyncio
 import time
-import wave
-import os
+from contextlib import aclosing
+from typing import Optional
 
 router = APIRouter()
-session_manager = SessionManager()
 audio_processor = AudioProcessor()
-vad_service = VADService()
-call_manager = CallManager()
+
+def negotiate_format(websocket: WebSocket) -> Optional[AudioFormat]:
+    """读取对端在连接参数中声明的音频格式（?encoding=ulaw&sample_rate=8000）
+
+    未声明时返回 None：按旧协议接收 8kHz PCM，回复按 tts_response_format 原样发送。
+    """
+    params = websocket.query_params
+    if "encoding" not in params and "sample_rate" not in params:
+        return None
+    return AudioFormat.parse(
+        params.get("encoding", "pcm"),
+        params.get("sample_rate", 8000)
+    )
 
 @router.websocket("/call/{call_id}")
 async def websocket_call_endpoint(websocket: WebSocket, call_id: str):
     """WebSocket音频流端点"""
     await websocket.accept()
+    try:
+        audio_format = negotiate_format(websocket)
+    except ValueError as e:
+        logger.warning(f"音频格式不支持: {call_id} {e}")
+        await websocket.close(code=1003, reason="unsupported audio format")
+        return
+    
+    try:
+        await admission.calls.acquire()
+    except AdmissionRejected as e:
+        # 1013 Try Again Later：通话已满，由对端稍后重试或转人工
+        logger.warning(f"拒绝接入: {call_id} {e}")
+        await websocket.close(code=1013, reason="server busy")
+        return
+    
+    try:
+        # 本通话内的日志（含模型客户端中的）都带上 call_id
+        with logger.contextualize(call_id=call_id):
+            await serve_call(websocket, call_id, audio_format)
+    finally:
+        admission.calls.release()
+
+async def serve_call(
+    websocket: WebSocket,
+    call_id: str,
+    audio_format: AudioFormat = None
+):
+    """一路通话：接收、DSP、VAD与回复播放
+
+    对端声明了音频格式时，TTS取裸PCM并转为对端格式发送，格式一致时
+    收发两个方向都直通，不做重采样。裸PCM/G.711回复经出站定时轮按
+    20ms帧、实时节奏发送，插话时未发出的帧立即丢弃。发起呼叫时已预热
+    的通话直接使用预热的会话，接通即播放问候语音。
+    """
+    connected_at = time.perf_counter()
     logger.info(f"WebSocket连接建立: {call_id}")
     
-    session = await session_manager.create_session(
-        call_id,
-        "你是AI客服，请友善地与用户对话"
+    warm = await call_warmup.claim(call_id)
+    if warm is not None:
+        session = warm.session
+        greeting_text = warm.greeting_text
+    else:
+        # 未在本worker预热（多worker、预热关闭或失败）：用发起时保存的提示词现建会话，
+        # 问候语接通后现合成（已预合成进TTS缓存时无需请求）
+        call = await call_manager.get_call_status(call_id)
+        session = await session_manager.create_session(
+            call_id,
+            (call or {}).get("prompt") or "你是AI客服，请友善地与用户对话"
+        )
+        greeting_text = None
+        if call is not None:
+            greeting_text = call.get("greeting", settings.greeting_text)
+    
+    call_stream = await call_manager.connect_audio_stream(call_id)
+    source_format = audio_format or AudioFormat()
+    tts_format = "pcm" if audio_format is not None else None
+    dsp_stage = CallDSPStage(
+        dsp_executor,
+        audio_processor,
+        audio_processor.create_resampler(source_sr=source_format.sample_rate),
+        audio_processor.create_agc(),
+        audio_format=source_format
     )
+    vad_slot = vad_engine.register()
     
-    call_stream = call_manager.connect_audio_stream(call_id)
+    async def receive_audio():
+        """接收端只负责入队，DSP在执行器中按通话顺序批量处理"""
+        try:
+            while True:
+                dsp_stage.push(await websocket.receive_bytes())
+        finally:
+            dsp_stage.close()
     
-    audio_buffer = []
-    is_speaking = False
-    silence_counter = 0
-    silence_threshold = int(
-        settings.silence_duration * 
-        settings.audio_sample_rate * 2 / 1000
-    )
+    receiver = asyncio.create_task(receive_audio())
     
+    utterance = UtteranceBuffer()
+    utterance_buffer_bytes.inc(utterance.nbytes)
+    model_client = session_manager.model_client
+    
+    if audio_format is not None:
+        frame_bytes = outbound_scheduler.frame_bytes(
+            audio_format.sample_rate, audio_format.sample_width
+        )
+    elif settings.tts_response_format == "pcm":
+        frame_bytes = outbound_scheduler.frame_bytes(settings.tts_sample_rate, 2)
+    else:
+        # mp3等压缩格式无法按字节分帧，到达即发
+        frame_bytes = None
+    outbound = outbound_scheduler.create(websocket.send_bytes, frame_bytes)
+    
+    async def play_turn(
+        audio_data,
+        turn_started: float,
+        previous: asyncio.Task = None,
+        commit: asyncio.Future = None
+    ):
+        """播放一轮回复；与接收、VAD并行，插话时被取消
+
+        commit 非空时为在暂定停顿处提前上传（或推测生成）的一轮，端点确认后
+        commit 给出本轮开始时间。
+        """
+        if previous is not None and not previous.done():
+            await asyncio.wait([previous])
+        
+        first_audio_ms = None
+        queued_before = outbound.bytes_queued
+        response_audio_buffer = []
+        transcoder = None
+        if audio_format is not None:
+            transcoder = OutboundTranscoder(settings.tts_sample_rate, audio_format)
+        try:
+            async with aclosing(model_client.generate_response(
+                session.remote_session_id,
+                audio_data,
+                tts_format,
+                commit
+            )) as response_chunks:
+                async for response_chunk in response_chunks:
+                    response_audio_buffer.append(response_chunk)
+                    payload = response_chunk
+                    if transcoder is not None:
+                        payload = transcoder.process(response_chunk)
+                        if not payload:
+                            continue
+                    await outbound.write(payload)
+                    if first_audio_ms is None and outbound.bytes_queued > queued_before:
+                        sent = time.perf_counter()
+                        if commit is not None:
+                            turn_started = commit.result()
+                        turn_first_audio_seconds.observe(sent - turn_started)
+                        first_audio_ms = int((sent - turn_started) * 1000)
+                        logger.bind(stage="first_audio", ms=first_audio_ms).info(
+                            f"首个音频字节: {call_id} {first_audio_ms}ms"
+                        )
+            # 回复按实时节奏发送，全部发出后才算本轮结束
+            await outbound.finish()
+            await outbound.drain()
+        except asyncio.CancelledError:
+            if commit is not None and not commit.done():
+                logger.info(f"提前发出的一轮已撤回: {call_id}")
+            else:
+                logger.info(f"回复被打断: {call_id}")
+            raise
+        except Exception as e:
+            logger.error(f"生成回复失败: {call_id} {e}")
+            return
+        finally:
+            # 归档在后台线程完成，被打断时只归档已生成的部分
+            audio_archiver.submit_turn(call_id, response_audio_buffer, tts_format)
+            conversation = await model_client.get_conversation(
+                session.remote_session_id
+            )
+            session_manager.update_history(call_id, conversation)
+        
+        if commit is not None:
+            turn_started = commit.result()
+        turn_elapsed = time.perf_counter() - turn_started
+        turn_seconds.observe(turn_elapsed)
+        logger.bind(
+            stage="turn", ms=int(turn_elapsed * 1000), first_audio_ms=first_audio_ms
+        ).info(f"本轮完成: {call_id}")
+        await websocket.send_json({
+            "type": "turn_complete",
+            "timestamp": int(time.time()),
+            "first_audio_ms": first_audio_ms
+        })
+    
+    async def play_greeting(text: str, audio: Optional[bytes], response_format: Optional[str]):
+        """接通即播放问候语音；与回复一样可被插话打断"""
+        if audio is None or response_format != (tts_format or settings.tts_response_format):
+            # 未预热、预热未合成成功或格式与本通话不符：现合成（TTS缓存命中时无需请求）
+            try:
+                audio = await model_client.generate_greeting(text, tts_format)
+            except Exception:
+                return
+        model_client.add_greeting(session.remote_session_id, text)
+        session_manager.update_history(
+            call_id, await model_client.get_conversation(session.remote_session_id)
+        )
+        
+        payload = audio
+        if audio_format is not None:
+            payload = OutboundTranscoder(settings.tts_sample_rate, audio_format).process(audio)
+        try:
+            await outbound.write(payload)
+            first_audio_ms = int((time.perf_counter() - connected_at) * 1000)
+            logger.bind(stage="greeting", ms=first_audio_ms).info(
+                f"问候语音开始播放: {call_id} {first_audio_ms}ms"
+            )
+            await outbound.finish()
+            await outbound.drain()
+        except asyncio.CancelledError:
+            logger.info(f"问候被打断: {call_id}")
+            raise
+        await websocket.send_json({
+            "type": "turn_complete",
+            "timestamp": int(time.time()),
+            "first_audio_ms": first_audio_ms
+        })
+    
+    turn_count = 0
+    
+    def start_turn(coro) -> asyncio.Task:
+        """新建一轮的任务；任务复制当前上下文，本轮日志都带上 turn 序号"""
+        nonlocal turn_count
+        turn_count += 1
+        with logger.contextualize(turn=turn_count):
+            return asyncio.create_task(coro)
+    
+    async def interrupt(turn: asyncio.Task):
+        """插话：取消进行中的生成与播放，通知对端清空播放缓冲"""
+        await model_client.cancel_generation(session.remote_session_id)
+        turn.cancel()
+        await asyncio.wait([turn])
+        outbound.flush()
+        await call_manager.stop_audio(websocket)
+        await websocket.send_json({
+            "type": "interrupted",
+            "timestamp": int(time.time())
+        })
+    
+    async def withdraw(pending: asyncio.Task, started: float):
+        """撤回提前发出的一轮：提前上传时请求体最后一个字节未发出，服务端
+        不会开始生成；推测生成时断开请求，已生成的部分计为浪费"""
+        pending.cancel()
+        await asyncio.wait([pending])
+        if settings.speculative_prefill:
+            speculation_wasted.inc()
+            speculation_wasted_seconds.inc(time.perf_counter() - started)
+        else:
+            audio_upload_withdrawn.inc()
+    
+    def commit_early(commit: asyncio.Future, started: float):
+        now = time.perf_counter()
+        commit.set_result(now)
+        if settings.speculative_prefill:
+            speculation_committed.inc()
+            speculation_head_start_seconds.observe(now - started)
+        else:
+            audio_upload_committed.inc()
+    
+    async def finish_utterance(end_offset: Optional[int]):
+        """结束当前这段话并开始回复；须在处理同一批中随后的 speech_start 之前调用"""
+        nonlocal turn, upload
+        # 环形缓冲随后继续写入，交出前拷贝本轮语音；上一轮未结束时排在其后
+        full_audio = bytes(utterance.end(end_offset))
+        if upload is not None:
+            pause_offset, commit, started = upload
+            upload = None
+            if pause_offset == end_offset and not turn.done():
+                # 端点与停顿一致：语音已在上传（或已在生成），提交即可
+                commit_early(commit, started)
+                return
+            await withdraw(turn, started)
+        turn = start_turn(play_turn(full_audio, time.perf_counter(), turn))
+    
+    turn = None
+    if greeting_text:
+        if warm is not None:
+            turn = start_turn(play_greeting(
+                greeting_text, warm.greeting, warm.response_format
+            ))
+        else:
+            turn = start_turn(play_greeting(greeting_text, None, None))
+    # 提前发出的一轮：(暂定停顿偏移, commit, 发出时间)
+    upload = None
+    samples_processed = 0
     try:
-        while True:
-            audio_data = await websocket.receive_bytes()
-            
-            processed = audio_processor.process_chunk(audio_data, source_sr=8000)
+        async for processed in dsp_stage.results():
+            utterance.write(processed)
+            samples_processed += len(processed) // 2
+            decision = await vad_engine.submit(vad_slot, processed)
             
-            if vad_service.is_speech(processed):
-                silence_counter = 0
-                
-                if not is_speaking:
-                    is_speaking = True
-                    await websocket.send_json({
-                        "type": "speech_start",
-                        "timestamp": int(time.time())
-                    })
-                
-                audio_buffer.append(processed)
-                
-            else:
-                silence_counter += len(processed)
-                
-                if is_speaking and silence_counter > silence_threshold:
-                    is_speaking = False
-                    
-                    full_audio = b''.join(audio_buffer)
-                    await session_manager.model_client.send_audio(
-                        session.remote_session_id,
-                        full_audio
-                    )
-                    
-                    response_audio_buffer = []
-                    async for response_chunk in session_manager.model_client.stream_response(
-                        session.remote_session_id
+            for event in decision.events:
+                if event.kind == "speech_pause":
+                    # 暂定停顿：上一轮已结束时提前编码并上传这段话（推测生成时直接开始生成）
+                    if (
+                        (settings.audio_upload_early or settings.speculative_prefill)
+                        and utterance.active
+                        and (turn is None or turn.done())
                     ):
-                        await websocket.send_bytes(response_chunk)
-                        response_audio_buffer.append(response_chunk)
-                    
-                    if settings.save_audio_output and response_audio_buffer:
-                        os.makedirs(settings.audio_output_dir, exist_ok=True)
-                        timestamp = int(time.time())
-                        output_path = os.path.join(
-                            settings.audio_output_dir,
-                            f"response_{call_id}_{timestamp}.wav"
-                        )
-                        full_response_audio = b''.join(response_audio_buffer)
-                        with wave.open(output_path, "wb") as wav_file:
-                            wav_file.setnchannels(settings.audio_channels)
-                            wav_file.setsampwidth(settings.audio_bit_depth // 8)
-                            wav_file.setframerate(settings.audio_sample_rate)
-                            wav_file.writeframes(full_response_audio)
-                        
-                        logger.info(f"音频已保存: {output_path}")
-                    
-                    audio_buffer = []
-                    
-                    conversation = await session_manager.model_client.get_conversation(
-                        session.remote_session_id
+                        commit = asyncio.get_running_loop().create_future()
+                        upload = (event.sample_offset, commit, time.perf_counter())
+                        turn = start_turn(play_turn(
+                            bytes(utterance.peek(event.sample_offset)), None, None, commit
+                        ))
+                    continue
+                if event.kind == "speech_resume":
+                    if upload is not None:
+                        await withdraw(turn, upload[2])
+                        upload = None
+                    continue
+                if event.kind == "speech_start":
+                    utterance.begin(event.sample_offset)
+                    if (
+                        settings.barge_in_enabled
+                        and turn is not None
+                        and not turn.done()
+                    ):
+                        await interrupt(turn)
+                else:
+                    vad_endpoint_seconds.observe(
+                        (samples_processed - event.sample_offset)
+                        / settings.audio_sample_rate
                     )
-                    session_manager.update_history(call_id, conversation)
-                    
-                    await websocket.send_json({
-                        "type": "turn_complete",
-                        "timestamp": int(time.time())
-                    })
+                await websocket.send_json({
+                    "type": event.kind,
+                    "timestamp": int(time.time()),
+                    "sample_offset": event.sample_offset
+                })
+                if event.kind == "speech_end":
+                    # 大块输入时同一批里可能紧跟下一段的 speech_start，先结束这一段
+                    await finish_utterance(event.sample_offset)
+            
+            if decision.speaking and utterance.full:
+                # 超过最大语音长度，强制断句
+                logger.warning(f"语音超过最大长度，强制结束: {call_id}")
+                vad_engine.end_speech(vad_slot)
+                await finish_utterance(None)
+
+        if upload is not None:
+            await withdraw(turn, upload[2])
+        await receiver
+        if turn is not None:
+            await turn
     
     except WebSocketDisconnect:
         logger.info(f"WebSocket断开: {call_id}")
     except Exception as e:
         logger.error(f"WebSocket错误: {e}")
     finally:
+        receiver.cancel()
+        if turn is not None:
+            turn.cancel()
+        outbound.close()
+        if outbound.paced:
+            logger.info(f"出站统计: {call_id} {outbound.stats()}")
+        await dsp_stage.aclose()
+        vad_engine.release(vad_slot)
+        utterance_buffer_bytes.dec(utterance.nbytes)
+        audio_archiver.close_call(call_id)
         await session_manager.cleanup_session(call_id)
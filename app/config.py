@@ -6,26 +6,128 @@ class Settings(BaseSettings):
     host: str = "0.0.0.0"
     port: int = 8000
     max_concurrent_calls: int = 10
+    # 准入控制：通话满额时的排队长度与等待秒数
+    call_queue_size: int = 10
+    call_queue_timeout: float = 5.0
+    # 模型/TTS请求的并发上限、排队长度与等待秒数
+    model_max_concurrency: int = 32
+    model_queue_size: int = 64
+    model_queue_timeout: float = 10.0
+    
+    # 多worker/多节点：通话状态后端 memory（单worker）/ sql（共享数据库）及其过期秒数；
+    # cluster_nodes 形如 "node_a=ws://10.0.0.1:8000,node_b=ws://10.0.0.2:8000"，按 call_id 亲和路由
+    workers: int = 1
+    call_state_backend: str = "memory"
+    call_state_url: str = "sqlite:///./database/call_state.db"
+    call_state_ttl_seconds: int = 86400
+    node_id: str = ""
+    cluster_nodes: str = ""
     
     # 远程模型服务
     remote_model_service_url: str
     remote_model_service_api_key: str
     remote_model_service_timeout: int = 30
     
+    # 模型服务连接池
+    model_pool_max_connections: int = 100
+    model_pool_max_keepalive: int = 20
+    model_pool_keepalive_expiry: float = 30.0
+    model_http2: bool = False
+    
+    # 用户语音上传：封装格式 flac（需要soundfile，未安装时退回wav）/ wav；
+    # 提前上传时在暂定停顿处开始发送请求体，端点确认后再发出最后一个字节
+    model_audio_format: str = "flac"
+    audio_upload_early: bool = True
+    # 推测生成：暂定停顿处即发出完整请求开始生成，确认说话结束前不播放、不写入历史；
+    # 停顿后用户继续说话时取消（计为浪费）
+    speculative_prefill: bool = False
+    
     # 音频配置
     audio_sample_rate: int = 16000
     audio_channels: int = 1
     audio_bit_depth: int = 16
     audio_buffer_size: int = 3200
     
+    # 自动增益：目标峰值、最大增益、包络起音/释放时间、噪声门限（低于门限时保持增益）
+    agc_enabled: bool = True
+    agc_target_dbfs: float = -6.0
+    agc_max_gain_db: float = 20.0
+    agc_attack_ms: float = 10.0
+    agc_release_ms: float = 400.0
+    agc_noise_floor_dbfs: float = -45.0
+    
+    # TTS配置（response_format=pcm 时为 tts_sample_rate 的16bit单声道裸流，可直接播放）
+    tts_voice: str = "alloy"
+    tts_response_format: str = "mp3"
+    tts_sample_rate: int = 24000
+    tts_stream_chunk_size: int = 3200
+    
+    # 出站节奏：裸PCM/G.711回复按 outbound_frame_ms 分帧、实时节奏发送，领先对端播放
+    # outbound_lead_frames 帧；欠载时逐帧增加（不超过上限），连续 decay 帧无欠载后回落；
+    # 单帧发送超过 send_timeout 秒或待发帧超过 max_backlog_frames 时丢弃该路未发出的音频
+    outbound_pacing: bool = True
+    outbound_frame_ms: int = 20
+    outbound_lead_frames: int = 3
+    outbound_max_lead_frames: int = 10
+    outbound_lead_decay_frames: int = 500
+    outbound_send_timeout: float = 1.0
+    outbound_max_backlog_frames: int = 25
+    
+    # 插话：播放回复期间检测到用户说话时取消生成与播放
+    barge_in_enabled: bool = True
+    
+    # TTS缓存：内存层总字节上限、单条上限；tts_cache_dir 非空时启用磁盘层
+    tts_cache_enabled: bool = True
+    tts_cache_max_bytes: int = 67108864
+    tts_cache_max_item_bytes: int = 2097152
+    tts_cache_dir: str = ""
+    tts_cache_disk_max_bytes: int = 1073741824
+    
+    # 拨号前预热：发起呼叫时在后台创建会话并合成问候语音，接通后立即播放；
+    # 接通前超过 call_warmup_ttl 秒未取走的释放；greeting_text 为空时不播放问候
+    call_warmup_enabled: bool = True
+    call_warmup_ttl: float = 120.0
+    greeting_text: str = "您好，请问有什么可以帮您？"
+    
+    # 流水线模式：流式生成token，按句并行合成语音
+    pipeline_mode: bool = False
+    pipeline_max_tts_concurrency: int = 2
+    
     # 音频输出配置
     save_audio_output: bool = True
     audio_output_dir: str = "/cpfs/user/zhaochenxu1/users/liujinming/git_program/mp3"
+    # 归档队列上限（轮数）、队列满时丢弃策略 drop_newest / drop_oldest、
+    # 通话结束后压缩编码（空为保留原格式，opus 需要FFmpeg）
+    audio_archive_queue_size: int = 64
+    audio_archive_drop_policy: str = "drop_newest"
+    audio_archive_codec: str = ""
+    
+    # 逐帧DSP执行器：inline（事件循环内）/ thread / process
+    dsp_executor_mode: str = "inline"
+    dsp_workers: int = 0
+    dsp_batch_frames: int = 8
+    
+    # 对话上下文：token预算、保留原文的最近轮数、每批折叠进摘要的轮数、
+    # 用户语音每秒折算的token数
+    context_max_tokens: int = 3000
+    context_keep_turns: int = 6
+    context_summary_batch: int = 4
+    context_summary_max_tokens: int = 200
+    context_audio_tokens_per_second: int = 25
+    
+    # 会话存储上限：条目数、空闲过期秒数、按文本估算的内存字节数
+    session_max_entries: int = 10000
+    session_ttl_seconds: int = 3600
+    session_max_bytes: int = 67108864
     
     # VAD配置
     vad_aggressiveness: int = 2
     vad_frame_duration: int = 30
     silence_duration: int = 800
+    vad_preroll_ms: int = 300
+    max_utterance_ms: int = 15000
+    # 暂定停顿：语音中静音达到该时长（小于 silence_duration）时发出 speech_pause
+    vad_pause_ms: int = 240
     
     # 阿里云配置
     aliyun_access_key_id: str
@@ -36,9 +138,20 @@ class Settings(BaseSettings):
     # 日志配置
     log_level: str = "INFO"
     log_dir: str = "./logs"
+    # 日志管道：后台线程批量写入（文件为JSON行、控制台为文本），队列满时丢弃；
+    # 带 sample 标记的高频日志每 log_sample_rate 条保留一条
+    log_queue_size: int = 10000
+    log_batch_size: int = 256
+    log_flush_interval: float = 0.05
+    log_sample_rate: int = 100
     
     # 数据库
     database_url: str = "sqlite:///./database/conversations.db"
+    # 后台批量写入：每批最多条数、最长等待秒数、队列上限
+    database_enabled: bool = True
+    database_write_batch: int = 200
+    database_flush_interval: float = 0.2
+    database_queue_size: int = 10000
     
     class Config:
         env_file = ".env"
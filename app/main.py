@@ -1,9 +1,22 @@
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from app.config import settings
 from app.api import routes as api_router
 from app.api import websocket as ws_router
 from app.services.logger_service import logger_service
+from app.services.http_pool import model_http_pool
+from app.services.dsp_executor import dsp_executor
+from app.services.audio_archiver import audio_archiver
+from app.services.outbound_scheduler import outbound_scheduler
+from app.services.session_manager import session_manager
+from app.services.call_warmup import call_warmup
+from app.services.persistence import conversation_store
+from app.services.tts_cache import tts_cache
+from app.services.admission import admission
+from app.services.call_state import call_state
+from app.services.call_router import call_router
+from app.services.metrics import metrics_registry
 from loguru import logger
 
 app = FastAPI(
@@ -25,12 +38,26 @@ app.include_router(ws_router.router, prefix="/ws")
 
 @app.on_event("startup")
 async def startup():
+    logger_service.start()
     logger.info("AI电话助理服务启动")
     logger.info(f"服务地址: http://{settings.host}:{settings.port}")
+    await model_http_pool.start()
+    await tts_cache.start()
+    audio_archiver.start()
+    conversation_store.start()
+    call_state.start()
+    if settings.workers > 1 and call_state.backend == "memory":
+        logger.warning("多worker运行时通话状态不共享，请设置 CALL_STATE_BACKEND=sql")
 
 @app.on_event("shutdown")
 async def shutdown():
+    await model_http_pool.close()
+    dsp_executor.shutdown()
+    audio_archiver.stop()
+    conversation_store.stop()
+    call_state.stop()
     logger.info("AI电话助理服务关闭")
+    logger_service.stop()
 
 @app.get("/")
 async def root():
@@ -42,10 +69,34 @@ async def root():
 
 @app.get("/health")
 async def health():
-    return {
-        "status": "healthy",
-        "service": "ai-phone-assistant"
-    }
+    # 通话与排队都已满时返回503，负载均衡据此摘除本实例
+    accepting = admission.accepting_calls
+    return JSONResponse(
+        status_code=200 if accepting else 503,
+        content={
+            "status": "healthy" if accepting else "saturated",
+            "service": "ai-phone-assistant",
+            "load": admission.stats(),
+            "routing": call_router.stats(),
+            "call_state": call_state.stats(),
+            "model_pool": model_http_pool.stats(),
+            "audio_archive": audio_archiver.stats(),
+            "outbound": outbound_scheduler.stats(),
+            "sessions": session_manager.stats(),
+            "warmup": call_warmup.stats(),
+            "database": conversation_store.stats(),
+            "tts_cache": tts_cache.stats(),
+            "logging": logger_service.stats()
+        }
+    )
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus 文本格式指标"""
+    return PlainTextResponse(
+        metrics_registry.render(),
+        media_type="text/plain; version=0.0.4"
+    )
 
 if __name__ == "__main__":
     import uvicorn
@@ -53,6 +104,8 @@ if __name__ == "__main__":
         "app.main:app",
         host=settings.host,
         port=settings.port,
-        reload=True,
+        # reload 与多worker互斥
+        reload=settings.workers == 1,
+        workers=settings.workers,
         log_level=settings.log_level.lower()
     )
@@ -15,3 +15,5 @@ class Conversation(BaseModel):
     messages: List[Message] = []
     created_at: Optional[datetime] = None
     updated_at: Optional[datetime] = None
+    # 已写入数据库的消息数
+    _persisted_count: int = 0
@@ -0,0 +1,158 @@
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+from app.config import settings
+from app.services.metrics import metrics_registry
+
+
+class AdmissionRejected(Exception):
+    """超出并发上限且排队已满或等待超时"""
+
+    def __init__(self, name: str, reason: str):
+        super().__init__(f"{name}{reason}")
+        self.name = name
+        self.reason = reason
+
+
+class ConcurrencyLimiter:
+    """有界并发 + 有界FIFO等待队列
+
+    有空位时立即放行；否则排队等待，队列已满立即拒绝，等待超过
+    wait_timeout 秒也拒绝。释放时名额直接交给队首等待者。
+    """
+
+    def __init__(self, name: str, limit: int, max_waiting: int, wait_timeout: float):
+        self.name = name
+        self.limit = limit
+        self.max_waiting = max_waiting
+        self.wait_timeout = wait_timeout
+        self.active = 0
+        self._waiters: deque = deque()
+
+        # 准入指标
+        self.admitted = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.wait_ms_max = 0.0
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    @property
+    def accepting(self) -> bool:
+        """新请求是否还能立即放行或进入队列"""
+        return self.active < self.limit or self.waiting < self.max_waiting
+
+    async def acquire(self):
+        """获取一个名额，失败抛出 AdmissionRejected"""
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            self.admitted += 1
+            return
+
+        if self.waiting >= self.max_waiting:
+            self.rejected += 1
+            raise AdmissionRejected(self.name, "排队已满")
+
+        started = time.perf_counter()
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), self.wait_timeout)
+        except asyncio.TimeoutError:
+            self._abandon(waiter)
+            self.rejected += 1
+            self.timeouts += 1
+            raise AdmissionRejected(self.name, "排队超时")
+        except asyncio.CancelledError:
+            self._abandon(waiter)
+            raise
+
+        self.admitted += 1
+        self.wait_ms_max = max(
+            self.wait_ms_max, (time.perf_counter() - started) * 1000
+        )
+
+    def _abandon(self, waiter: asyncio.Future):
+        if waiter.done():
+            # 名额已交接给本等待者，转交下一位
+            self.release()
+        else:
+            waiter.cancel()
+            self._waiters.remove(waiter)
+
+    def release(self):
+        """归还名额"""
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        await self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self) -> dict:
+        return {
+            "active": self.active,
+            "limit": self.limit,
+            "waiting": self.waiting,
+            "max_waiting": self.max_waiting,
+            "utilization": round(self.active / self.limit, 4) if self.limit else 0.0,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timeouts": self.timeouts,
+            "wait_ms_max": round(self.wait_ms_max, 3)
+        }
+
+
+class AdmissionController:
+    """准入控制：通话数与模型/TTS请求数分别限流"""
+
+    def __init__(self):
+        self.calls = ConcurrencyLimiter(
+            "通话",
+            settings.max_concurrent_calls,
+            settings.call_queue_size,
+            settings.call_queue_timeout
+        )
+        self.model = ConcurrencyLimiter(
+            "模型请求",
+            settings.model_max_concurrency,
+            settings.model_queue_size,
+            settings.model_queue_timeout
+        )
+
+    @property
+    def accepting_calls(self) -> bool:
+        return self.calls.accepting
+
+    def stats(self) -> dict:
+        """负载指标，供负载均衡判断"""
+        return {
+            "accepting_calls": self.accepting_calls,
+            "calls": self.calls.stats(),
+            "model": self.model.stats()
+        }
+
+
+admission = AdmissionController()
+
+metrics_registry.gauge(
+    "active_calls", "Calls holding an admission slot", lambda: admission.calls.active
+)
+metrics_registry.gauge(
+    "waiting_calls", "Calls queued for an admission slot", lambda: admission.calls.waiting
+)
+metrics_registry.gauge(
+    "active_model_requests", "In-flight model and TTS requests", lambda: admission.model.active
+)
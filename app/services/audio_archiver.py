@@ -0,0 +1,246 @@
+import io
+import os
+import threading
+import time
+import wave
+from collections import deque
+from datetime import datetime
+from typing import Dict, List, Optional
+from app.config import settings
+from loguru import logger
+
+# 可直接拼接为单个文件的编码格式 -> 扩展名
+_STREAMABLE_FORMATS = {
+    "mp3": "mp3",
+    "aac": "aac",
+    "opus": "ogg",
+}
+
+
+class _CallArchive:
+    """一路通话的归档文件（各轮回复写入同一个文件）"""
+
+    def __init__(self, call_id: str, audio_format: str):
+        self.call_id = call_id
+        self.audio_format = audio_format
+        self.turns = 0
+        self.path: Optional[str] = None
+        self._file = None
+        self._wav: Optional[wave.Wave_write] = None
+        self._wav_params = None
+
+    def _open(self, extension: str):
+        os.makedirs(settings.audio_output_dir, exist_ok=True)
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        self.path = os.path.join(
+            settings.audio_output_dir,
+            f"call_{self.call_id}_{timestamp}.{extension}"
+        )
+
+    def _write_pcm(self, frames: bytes, channels: int, width: int, rate: int):
+        if self._wav is None:
+            self._open("wav")
+            self._wav = wave.open(self.path, "wb")
+            self._wav.setnchannels(channels)
+            self._wav.setsampwidth(width)
+            self._wav.setframerate(rate)
+            self._wav_params = (channels, width, rate)
+        elif self._wav_params != (channels, width, rate):
+            logger.warning(f"音频参数变化，跳过该轮归档: {self.call_id}")
+            return
+        self._wav.writeframes(frames)
+
+    def write_turn(self, audio: bytes):
+        if self.audio_format == "pcm":
+            self._write_pcm(audio, 1, 2, settings.tts_sample_rate)
+        elif self.audio_format == "wav":
+            with wave.open(io.BytesIO(audio), "rb") as turn:
+                self._write_pcm(
+                    turn.readframes(turn.getnframes()),
+                    turn.getnchannels(),
+                    turn.getsampwidth(),
+                    turn.getframerate()
+                )
+        elif self.audio_format in _STREAMABLE_FORMATS:
+            if self._file is None:
+                self._open(_STREAMABLE_FORMATS[self.audio_format])
+                self._file = open(self.path, "wb")
+            self._file.write(audio)
+        else:
+            # 无法直接拼接的容器（如flac）每轮单独成文件
+            self._open(f"turn{self.turns}.{self.audio_format}")
+            with open(self.path, "wb") as f:
+                f.write(audio)
+        self.turns += 1
+
+    def close(self) -> Optional[str]:
+        if self._wav is not None:
+            self._wav.close()
+        if self._file is not None:
+            self._file.close()
+        return self.path
+
+
+class AudioArchiver:
+    """后台音频归档
+
+    事件循环只把回复音频放入有界队列，由独立线程拼接、写盘；
+    队列满时按 drop_policy 丢弃最新或最旧的一轮，不阻塞通话。
+    """
+
+    def __init__(self):
+        self.enabled = settings.save_audio_output
+        self.max_pending = settings.audio_archive_queue_size
+        self.drop_policy = settings.audio_archive_drop_policy
+        self.codec = settings.audio_archive_codec
+
+        self._items = deque()
+        self._pending_turns = 0
+        self._condition = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+        self._archives: Dict[str, _CallArchive] = {}
+
+        # 归档指标
+        self.turns_written = 0
+        self.turns_dropped = 0
+        self.files_written = 0
+        self.bytes_written = 0
+        self.write_ms_total = 0.0
+        self.write_ms_max = 0.0
+
+    def start(self):
+        """启动写线程"""
+        if self._thread is not None or not self.enabled:
+            return
+        self._stopping = False
+        self._thread = threading.Thread(
+            target=self._run, name="audio-archiver", daemon=True
+        )
+        self._thread.start()
+        logger.info(f"音频归档已启动: {settings.audio_output_dir}")
+
+    def stop(self, timeout: float = 10.0):
+        """写完队列中剩余内容后关闭所有文件"""
+        if self._thread is None:
+            return
+        with self._condition:
+            self._stopping = True
+            self._condition.notify()
+        self._thread.join(timeout)
+        self._thread = None
+
+    def submit_turn(
+        self,
+        call_id: str,
+        chunks: List[bytes],
+        audio_format: str = None
+    ) -> bool:
+        """提交一轮回复音频（非阻塞），返回是否入队"""
+        if not self.enabled or not chunks:
+            return False
+        self.start()
+
+        item = ("turn", call_id, chunks, audio_format or settings.tts_response_format)
+        with self._condition:
+            if self._pending_turns >= self.max_pending:
+                self.turns_dropped += 1
+                if self.drop_policy != "drop_oldest":
+                    logger.warning(f"归档队列已满，丢弃本轮音频: {call_id}")
+                    return False
+                oldest = next(queued for queued in self._items if queued[0] == "turn")
+                self._items.remove(oldest)
+                self._pending_turns -= 1
+                logger.warning(f"归档队列已满，丢弃最旧一轮音频: {oldest[1]}")
+            self._items.append(item)
+            self._pending_turns += 1
+            self._condition.notify()
+        return True
+
+    def close_call(self, call_id: str):
+        """通话结束，关闭该通话的归档文件"""
+        if self._thread is None:
+            return
+        with self._condition:
+            self._items.append(("close", call_id, None, None))
+            self._condition.notify()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._items and not self._stopping:
+                    self._condition.wait()
+                if not self._items:
+                    break
+                kind, call_id, chunks, audio_format = self._items.popleft()
+                if kind == "turn":
+                    self._pending_turns -= 1
+
+            try:
+                if kind == "turn":
+                    self._write_turn(call_id, chunks, audio_format)
+                else:
+                    self._close_call(call_id)
+            except Exception as e:
+                logger.error(f"音频归档失败: {call_id} {e}")
+
+        for call_id in list(self._archives):
+            self._close_call(call_id)
+
+    def _write_turn(self, call_id: str, chunks: List[bytes], audio_format: str):
+        started = time.perf_counter()
+        archive = self._archives.get(call_id)
+        if archive is None:
+            archive = self._archives[call_id] = _CallArchive(call_id, audio_format)
+        audio = b"".join(chunks)
+        archive.write_turn(audio)
+
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self.turns_written += 1
+        self.bytes_written += len(audio)
+        self.write_ms_total += elapsed_ms
+        self.write_ms_max = max(self.write_ms_max, elapsed_ms)
+
+    def _close_call(self, call_id: str):
+        archive = self._archives.pop(call_id, None)
+        if archive is None:
+            return
+        path = archive.close()
+        if path and self.codec:
+            path = self._encode(path)
+        self.files_written += 1
+        logger.info(f"音频已保存: {path} ({archive.turns}轮)")
+
+    def _encode(self, path: str) -> str:
+        """用pydub（需要FFmpeg）压缩为指定编码，失败时保留原文件"""
+        try:
+            from pydub import AudioSegment
+
+            extension = "ogg" if self.codec == "opus" else self.codec
+            target = f"{os.path.splitext(path)[0]}.{extension}"
+            AudioSegment.from_file(path).export(
+                target, format=extension, codec="libopus" if self.codec == "opus" else None
+            )
+            os.remove(path)
+            return target
+        except Exception as e:
+            logger.warning(f"归档压缩失败，保留原文件: {path} {e}")
+            return path
+
+    def stats(self) -> dict:
+        """归档指标"""
+        return {
+            "enabled": self.enabled,
+            "queue_depth": self._pending_turns,
+            "turns_written": self.turns_written,
+            "turns_dropped": self.turns_dropped,
+            "files_written": self.files_written,
+            "bytes_written": self.bytes_written,
+            "write_ms_avg": round(
+                self.write_ms_total / self.turns_written, 3
+            ) if self.turns_written else 0.0,
+            "write_ms_max": round(self.write_ms_max, 3)
+        }
+
+
+audio_archiver = AudioArchiver()
@@ -1,46 +1,307 @@
 import numpy as np
+from typing import Optional
+from functools import lru_cache
+from math import gcd
+from numpy.lib.stride_tricks import as_strided
 from scipy import signal
 from app.config import settings
+from app.services.codec import AudioFormat, decode, encode
 from loguru import logger
 
+
+@lru_cache(maxsize=16)
+def _polyphase_taps(source_sr: int, target_sr: int) -> tuple:
+    """计算并缓存多相FIR滤波器系数，按 (source_sr, target_sr) 缓存"""
+    g = gcd(source_sr, target_sr)
+    up, down = target_sr // g, source_sr // g
+
+    # 与 scipy.signal.resample_poly 默认设计一致：Kaiser窗低通
+    max_rate = max(up, down)
+    half_len = 10 * max_rate
+    taps = signal.firwin(
+        2 * half_len + 1, 1.0 / max_rate, window=("kaiser", 5.0)
+    ) * up
+
+    # 补零使长度为 up 的整数倍，再拆成 up 个相位
+    taps = np.concatenate([
+        taps, np.zeros(-len(taps) % up)
+    ]).astype(np.float32)
+    phases = taps.reshape(-1, up).T.copy()
+    phases.setflags(write=False)
+    return up, down, phases
+
+
+class StreamingResampler:
+    """流式多相重采样器（每路通话一个实例，跨块保留滤波器历史）"""
+
+    def __init__(self, source_sr: int, target_sr: int):
+        self.source_sr = source_sr
+        self.target_sr = target_sr
+        self.up, self.down, self._phases = _polyphase_taps(
+            source_sr, target_sr
+        )
+        self._taps_per_phase = self._phases.shape[1]
+        # 窗口按时间正序排列，系数需反转后做矩阵乘
+        self._phases_reversed = np.ascontiguousarray(self._phases[:, ::-1].T)
+        self._history = np.zeros(self._taps_per_phase - 1, dtype=np.float32)
+        # 下一个输出样本在上采样域中的位置（相对当前块起点）
+        self._offset = 0
+
+    def process(self, audio_array: np.ndarray) -> np.ndarray:
+        """重采样一个int16音频块，输出与前一块连续"""
+        num_input = len(audio_array)
+        if num_input == 0:
+            return np.zeros(0, dtype=np.int16)
+
+        history_len = len(self._history)
+        extended = np.empty(history_len + num_input, dtype=np.float32)
+        extended[:history_len] = self._history
+        extended[history_len:] = audio_array
+
+        # 每个输入位置计算全部相位：(num_input, up)，一次矩阵乘完成
+        windows = as_strided(
+            extended,
+            shape=(num_input, self._taps_per_phase),
+            strides=(extended.strides[0], extended.strides[0])
+        )
+        filtered = windows @ self._phases_reversed
+
+        if self.down == 1:
+            output = filtered.reshape(-1)
+        else:
+            num_output = max(
+                0, -(-(num_input * self.up - self._offset) // self.down)
+            )
+            positions = self._offset + self.down * np.arange(num_output)
+            output = filtered[positions // self.up, positions % self.up]
+            self._offset += self.down * num_output - num_input * self.up
+
+        self._history = extended[num_input:]
+
+        np.clip(output, -32768, 32767, out=output)
+        return output.astype(np.int16)
+
+    def reset(self):
+        """清空滤波器历史"""
+        self._history[:] = 0
+        self._offset = 0
+
+
+class AutomaticGainControl:
+    """流式自动增益（每路通话一个实例，跨块保留包络与增益）
+
+    按块跟踪峰值包络：上升按 attack、回落按 release 时间常数平滑，
+    增益 = 目标峰值 / 包络，只放大不衰减且不超过 max_gain；包络低于
+    噪声门限时保持当前增益，静音帧中的线路噪声不会被放大到满幅。
+    当前块的峰值同时用作限幅，增益不会让本块削顶。
+
+    int16 / float32 缓冲区原地处理：增益上升时块内线性过渡，下降时
+    立即生效；增益为1时不触碰样本。
+    """
+
+    def __init__(
+        self,
+        sample_rate: int,
+        target_dbfs: float = None,
+        max_gain_db: float = None,
+        attack_ms: float = None,
+        release_ms: float = None,
+        noise_floor_dbfs: float = None
+    ):
+        self.sample_rate = sample_rate
+        self.target = 10 ** (
+            (settings.agc_target_dbfs if target_dbfs is None else target_dbfs) / 20
+        )
+        self.max_gain = 10 ** (
+            (settings.agc_max_gain_db if max_gain_db is None else max_gain_db) / 20
+        )
+        self.noise_floor = 10 ** (
+            (
+                settings.agc_noise_floor_dbfs
+                if noise_floor_dbfs is None else noise_floor_dbfs
+            ) / 20
+        )
+        self.attack_ms = settings.agc_attack_ms if attack_ms is None else attack_ms
+        self.release_ms = settings.agc_release_ms if release_ms is None else release_ms
+
+        # 包络与增益按满幅归一化（int16 的 32767、float32 的 1.0 均为 1）
+        self.envelope = 0.0
+        self.gain = 1.0
+        # 块长 -> (attack系数, release系数, 0..1 线性斜坡)
+        self._block_params = {}
+        self._scratch = np.empty(0, dtype=np.float32)
+        self._ramp = np.empty(0, dtype=np.float32)
+
+    def _params(self, num_samples: int) -> tuple:
+        params = self._block_params.get(num_samples)
+        if params is None:
+            block_ms = num_samples * 1000 / self.sample_rate
+            params = (
+                1 - np.exp(-block_ms / self.attack_ms) if self.attack_ms > 0 else 1.0,
+                1 - np.exp(-block_ms / self.release_ms) if self.release_ms > 0 else 1.0,
+                np.arange(1, num_samples + 1, dtype=np.float32) / num_samples
+            )
+            self._block_params[num_samples] = params
+            if len(self._scratch) < num_samples:
+                self._scratch = np.empty(num_samples, dtype=np.float32)
+                self._ramp = np.empty(num_samples, dtype=np.float32)
+        return params
+
+    def process(self, audio_array: np.ndarray) -> np.ndarray:
+        """原地调整一个 int16 或 float32 块的增益并返回它
+
+        只读输入（如直通的 frombuffer 视图）只在需要改写时复制一份。
+        """
+        num_samples = len(audio_array)
+        if num_samples == 0:
+            return audio_array
+        attack, release, ramp_base = self._params(num_samples)
+        work = self._ramp[:num_samples]
+
+        is_int = audio_array.dtype == np.int16
+        if is_int:
+            # int16 只转换一次到 float32 暂存区，峰值与增益都在暂存区上算
+            samples = self._scratch[:num_samples]
+            np.copyto(samples, audio_array)
+            peak = float(np.abs(samples, out=work).max()) / 32767.0
+        else:
+            samples = audio_array
+            peak = float(np.abs(samples, out=work).max())
+
+        coefficient = attack if peak > self.envelope else release
+        self.envelope += coefficient * (peak - self.envelope)
+
+        gain = self.gain
+        if self.envelope >= self.noise_floor:
+            gain = min(max(self.target / self.envelope, 1.0), self.max_gain)
+        if peak * gain > 1.0:
+            gain = 1.0 / peak
+        if abs(gain - 1.0) < 1e-3:
+            gain = 1.0
+
+        previous, self.gain = self.gain, gain
+        if gain == 1.0 and previous == 1.0:
+            return audio_array
+
+        if not audio_array.flags.writeable:
+            audio_array = audio_array.copy()
+            if not is_int:
+                samples = audio_array
+
+        if gain > previous:
+            # 从上一块的增益线性升到新增益，避免块边界跳变
+            np.multiply(ramp_base, gain - previous, out=work)
+            work += previous
+            samples *= work
+        else:
+            samples *= gain
+
+        if is_int:
+            np.copyto(audio_array, samples, casting="unsafe")
+        return audio_array
+
+    def reset(self):
+        """清空包络并恢复单位增益"""
+        self.envelope = 0.0
+        self.gain = 1.0
+
+
+class OutboundTranscoder:
+    """把 16bit PCM 音频流转为对端格式（每轮回复一个实例）
+
+    格式一致时原样透传；否则跨块保留未成对的字节与重采样状态，
+    流式重采样后查表编码。
+    """
+
+    def __init__(self, source_sample_rate: int, target: AudioFormat):
+        self.target = target
+        self.passthrough = (
+            target.encoding == "pcm" and target.sample_rate == source_sample_rate
+        )
+        self._resampler = None
+        if target.sample_rate != source_sample_rate:
+            self._resampler = StreamingResampler(
+                source_sample_rate, target.sample_rate
+            )
+        self._pending = b""
+
+    def process(self, chunk: bytes) -> bytes:
+        if self.passthrough:
+            return chunk
+        if self._pending:
+            chunk = self._pending + chunk
+        usable = len(chunk) & ~1
+        self._pending = chunk[usable:]
+        samples = np.frombuffer(chunk, dtype=np.int16, count=usable // 2)
+        if self._resampler is not None:
+            samples = self._resampler.process(samples)
+        return encode(samples, self.target.encoding)
+
+
 class AudioProcessor:
     def __init__(self):
         self.target_sample_rate = settings.audio_sample_rate
         self.target_channels = settings.audio_channels
         self.target_bit_depth = settings.audio_bit_depth
-        
+
+    def create_resampler(self, source_sr: int = 8000) -> Optional[StreamingResampler]:
+        """为一路通话创建流式重采样器，采样率一致时返回 None（直通）"""
+        if source_sr == self.target_sample_rate:
+            return None
+        return StreamingResampler(source_sr, self.target_sample_rate)
+    
+    def create_agc(self) -> Optional[AutomaticGainControl]:
+        """为一路通话创建自动增益（作用于重采样后的音频），未启用时返回 None"""
+        if not settings.agc_enabled:
+            return None
+        return AutomaticGainControl(self.target_sample_rate)
+
     def process_chunk(
-        self, 
-        audio_data: bytes, 
-        source_sr: int = 8000
+        self,
+        audio_data: bytes,
+        source_sr: int = 8000,
+        resampler: StreamingResampler = None,
+        agc: AutomaticGainControl = None,
+        encoding: str = "pcm"
     ) -> bytes:
-        """处理音频块：重采样、归一化"""
+        """处理音频块：解码、重采样、自动增益
+
+        传入 resampler 时使用流式多相重采样（跨块连续），
+        否则对每个块单独做FFT重采样，采样率一致时不重采样；
+        传入 agc 时原地调整增益。
+        """
         try:
-            audio_array = np.frombuffer(audio_data, dtype=np.int16)
-            
+            audio_array = decode(audio_data, encoding)
+
             # 重采样
-            if source_sr != self.target_sample_rate:
+            if resampler is not None:
+                audio_array = resampler.process(audio_array)
+            elif source_sr != self.target_sample_rate:
                 num_samples = int(
                     len(audio_array) * self.target_sample_rate / source_sr
                 )
                 audio_array = signal.resample(
                     audio_array, num_samples
                 ).astype(np.int16)
-            
-            audio_array = self._normalize(audio_array)
+
+            if agc is not None:
+                audio_array = agc.process(audio_array)
             return audio_array.tobytes()
-            
+
         except Exception as e:
             logger.error(f"音频处理失败: {e}")
             raise
-    
+
     def _normalize(self, audio_array: np.ndarray) -> np.ndarray:
-        """音频归一化"""
+        """按块峰值归一化（旧实现，逐块放大会把静音噪声拉到满幅，已由
+        AutomaticGainControl 取代）"""
+        if audio_array.size == 0:
+            return audio_array
         max_val = np.max(np.abs(audio_array))
         if max_val > 0:
             audio_array = (audio_array / max_val * 32767).astype(np.int16)
         return audio_array
-    
+
     def combine_chunks(self, chunks: list) -> bytes:
         """合并音频块"""
         return b''.join(chunks)
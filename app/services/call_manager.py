@@ -1,51 +1,104 @@
+import secrets
 from typing import Optional
 from datetime import datetime
 from alibabacloud_tea_openapi import models as open_api_models
 from app.config import settings
+from app.services.persistence import conversation_store
+from app.services.call_warmup import call_warmup
+from app.services.call_state import call_state
+from app.services.call_router import call_router
 from loguru import logger
 
 class CallManager:
-    def __init__(self):
-        self.active_calls = {}
+    def __init__(self, state=None):
+        # 通话状态后端：单worker用进程内存，多worker/多节点用共享数据库
+        self.state = state or call_state
+        self.router = call_router
         
     async def initiate_call(
         self, 
         phone_number: str, 
-        prompt: str
+        prompt: str,
+        greeting: Optional[str] = None
     ) -> dict:
-        """发起呼叫"""
+        """发起呼叫（greeting 为空时使用 greeting_text 配置）"""
         try:
             # 模拟呼叫ID生成（实际应调用阿里云API）
-            call_id = f"call_{datetime.now().strftime('%Y%m%d%H%M%S%f')}"
+            # 多worker同时发起时加随机后缀避免撞号
+            call_id = (
+                f"call_{datetime.now().strftime('%Y%m%d%H%M%S%f')}"
+                f"_{secrets.token_hex(3)}"
+            )
             
             logger.info(f"呼叫发起成功: {call_id} -> {phone_number}")
             
-            self.active_calls[call_id] = {
-                "call_id": call_id,
-                "phone_number": phone_number,
-                "status": "initiated",
-                "prompt": prompt,
-                "created_at": datetime.now()
-            }
+            created_at = datetime.now()
+            if greeting is None:
+                greeting = settings.greeting_text
+            # 问候语随通话状态保存，音频流接到任一worker都能播放
+            await self.state.put(
+                call_id,
+                phone_number=phone_number,
+                status="initiated",
+                prompt=prompt,
+                greeting=greeting,
+                created_at=created_at
+            )
+            conversation_store.save_call(
+                call_id,
+                phone_number=phone_number,
+                status="initiated",
+                prompt=prompt,
+                created_at=created_at
+            )
+            
+            self._start_warmup(call_id, prompt, greeting)
             
-            return {
+            call = {
                 "call_id": call_id,
                 "status": "initiated",
                 "phone_number": phone_number,
-                "prompt": prompt
+                "prompt": prompt,
+                "node": self.router.home_node(call_id)
             }
+            ws_url = self.router.ws_url(call_id)
+            if ws_url:
+                call["ws_url"] = ws_url
+            return call
             
         except Exception as e:
             logger.error(f"发起呼叫失败: {e}")
             raise
     
-    def connect_audio_stream(self, call_id: str):
+    def _start_warmup(self, call_id: str, prompt: str, greeting: str):
+        """等待对端接听期间预热会话与问候语音；音频流会接到其他节点时跳过
+
+        多worker时音频流不一定接到本worker，只把问候语音预合成进TTS缓存，
+        不在本进程保留按通话的预热结果。
+        """
+        if not settings.call_warmup_enabled:
+            return
+        if self.router.home_node(call_id) != self.router.node_id:
+            return
+        if settings.workers > 1:
+            call_warmup.prefetch_greeting(greeting)
+            return
+        call_warmup.start(call_id, prompt, greeting)
+    
+    async def connect_audio_stream(self, call_id: str):
         """连接音频流（返回WebSocket或音频流句柄）"""
         # 实际实现需要根据阿里云云呼叫中心的API文档
         # 这里提供框架
-        if call_id in self.active_calls:
-            self.active_calls[call_id]["status"] = "connected"
+        if not self.router.record_connection(call_id):
+            logger.warning(
+                f"音频流未落在归属节点: {call_id} -> {self.router.home_node(call_id)}"
+            )
+        # 记录承载该通话的worker，其他worker查询状态时可见
+        if await self.state.update(
+            call_id, status="connected", worker=self.router.worker_id
+        ):
             logger.info(f"音频流已连接: {call_id}")
+        conversation_store.save_call(call_id, status="connected")
         return call_id
     
     async def send_audio(self, stream, audio_data: bytes):
@@ -54,26 +107,38 @@ class CallManager:
         pass
     
     async def stop_audio(self, stream):
-        """停止播放音频"""
-        # 实际实现需要停止音频播放
-        pass
+        """停止播放音频：通知对端丢弃已缓冲、尚未播放的回复音频"""
+        await stream.send_json({
+            "type": "stop_audio",
+            "timestamp": int(datetime.now().timestamp())
+        })
     
     async def terminate_call(self, call_id: str):
         """结束呼叫"""
         try:
-            if call_id in self.active_calls:
-                self.active_calls[call_id]["status"] = "terminated"
-                self.active_calls[call_id]["ended_at"] = datetime.now()
+            # 未接通就结束的呼叫立即释放预热结果
+            call_warmup.discard(call_id)
+            call = await self.state.get(call_id)
+            if call is not None:
+                ended_at = datetime.now()
                 
                 # 计算通话时长
-                if "created_at" in self.active_calls[call_id]:
-                    duration = int(
-                        (
-                            datetime.now() - 
-                            self.active_calls[call_id]["created_at"]
-                        ).total_seconds()
-                    )
-                    self.active_calls[call_id]["duration"] = duration
+                duration = None
+                if "created_at" in call:
+                    duration = int((ended_at - call["created_at"]).total_seconds())
+                
+                await self.state.update(
+                    call_id,
+                    status="terminated",
+                    ended_at=ended_at,
+                    duration=duration
+                )
+                conversation_store.save_call(
+                    call_id,
+                    status="terminated",
+                    ended_at=ended_at,
+                    duration=duration
+                )
                 
                 logger.info(f"呼叫已结束: {call_id}")
                 
@@ -86,6 +151,9 @@ class CallManager:
             logger.error(f"结束呼叫失败: {e}")
             raise
     
-    def get_call_status(self, call_id: str) -> Optional[dict]:
+    async def get_call_status(self, call_id: str) -> Optional[dict]:
         """获取呼叫状态"""
-        return self.active_calls.get(call_id)
+        return await self.state.get(call_id)
+
+
+call_manager = CallManager()
@@ -0,0 +1,74 @@
+import hashlib
+import os
+import socket
+from typing import Dict, Optional
+from app.config import settings
+
+
+def parse_nodes(spec: str) -> Dict[str, str]:
+    """解析 "node_a=ws://10.0.0.1:8000,node_b=ws://10.0.0.2:8000" """
+    nodes = {}
+    for item in spec.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        node_id, _, url = item.partition("=")
+        nodes[node_id.strip()] = url.strip().rstrip("/")
+    return nodes
+
+
+class CallRouter:
+    """通话亲和路由
+
+    按 call_id 做最高随机权重（rendezvous）哈希选出归属节点：同一通话
+    总落在同一节点，增减节点时只有该节点上的通话改变归属。发起呼叫时
+    返回归属节点的 WebSocket 地址，由网关把音频流接到该节点。
+    """
+
+    def __init__(self, node_id: str = None, nodes: str = None):
+        self.node_id = node_id or settings.node_id or socket.gethostname()
+        self.nodes = parse_nodes(settings.cluster_nodes if nodes is None else nodes)
+
+        # 路由指标
+        self.local_connections = 0
+        self.misrouted_connections = 0
+
+    @property
+    def worker_id(self) -> str:
+        """当前worker标识（节点 + 进程号）"""
+        return f"{self.node_id}:{os.getpid()}"
+
+    def home_node(self, call_id: str) -> str:
+        """通话的归属节点；未配置集群时为本节点"""
+        if not self.nodes:
+            return self.node_id
+        return max(
+            self.nodes,
+            key=lambda node: hashlib.sha1(f"{node}/{call_id}".encode()).digest()
+        )
+
+    def ws_url(self, call_id: str) -> Optional[str]:
+        """归属节点上该通话的 WebSocket 地址"""
+        if not self.nodes:
+            return None
+        return f"{self.nodes[self.home_node(call_id)]}/ws/call/{call_id}"
+
+    def record_connection(self, call_id: str) -> bool:
+        """记录一次音频流接入，返回是否落在归属节点"""
+        if self.home_node(call_id) == self.node_id:
+            self.local_connections += 1
+            return True
+        self.misrouted_connections += 1
+        return False
+
+    def stats(self) -> dict:
+        return {
+            "node_id": self.node_id,
+            "worker_id": self.worker_id,
+            "nodes": len(self.nodes),
+            "local_connections": self.local_connections,
+            "misrouted_connections": self.misrouted_connections
+        }
+
+
+call_router = CallRouter()
@@ -0,0 +1,256 @@
+import asyncio
+import os
+import time
+from typing import Optional
+from sqlalchemy import (
+    Column,
+    DateTime,
+    Float,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    Text,
+    create_engine,
+    delete,
+    event,
+    insert,
+    inspect,
+    select,
+    text,
+    update
+)
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.schema import CreateIndex, CreateTable
+from app.config import settings
+from app.services.persistence import _enable_sqlite_wal
+from app.services.session_store import BoundedSessionStore
+from loguru import logger
+
+_metadata = MetaData()
+
+# 进行中通话的共享状态，与 calls 历史表分开存放，过期即删
+call_state_table = Table(
+    "call_state",
+    _metadata,
+    Column("call_id", String(64), primary_key=True),
+    Column("phone_number", String(32)),
+    Column("status", String(16)),
+    Column("prompt", Text),
+    Column("greeting", Text),
+    Column("created_at", DateTime),
+    Column("ended_at", DateTime),
+    Column("duration", Integer),
+    Column("worker", String(128)),
+    Column("updated_at", Float, index=True)
+)
+
+CALL_FIELDS = tuple(
+    column.name for column in call_state_table.columns if column.name != "updated_at"
+)
+
+
+class MemoryCallState:
+    """进程内通话状态（单worker）"""
+
+    backend = "memory"
+
+    def __init__(self):
+        self._calls = BoundedSessionStore(
+            "通话状态",
+            max_entries=settings.session_max_entries,
+            ttl_seconds=settings.call_state_ttl_seconds
+        )
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    async def put(self, call_id: str, **fields):
+        """新增或更新通话"""
+        record = self._calls.get(call_id, touch=False) or {"call_id": call_id}
+        record.update(fields)
+        self._calls.set(call_id, record)
+
+    async def update(self, call_id: str, **fields) -> bool:
+        """更新已有通话，不存在时返回 False"""
+        record = self._calls.get(call_id)
+        if record is None:
+            return False
+        record.update(fields)
+        return True
+
+    async def get(self, call_id: str) -> Optional[dict]:
+        record = self._calls.get(call_id)
+        return dict(record) if record is not None else None
+
+    def stats(self) -> dict:
+        return {"backend": self.backend, **self._calls.stats()}
+
+
+class SQLCallState:
+    """共享通话状态：同机多worker共用一个SQLite文件（WAL），
+    多节点时指向同一个数据库服务
+
+    每个操作是一条单行SQL，在线程中执行，不阻塞事件循环；新增或更新用
+    方言的 upsert（INSERT ... ON CONFLICT DO UPDATE），多个worker同时写
+    同一通话不会冲突。指标只在事件循环上更新。
+    """
+
+    backend = "sql"
+
+    def __init__(self, url: str = None):
+        self.url = url or settings.call_state_url
+        self.ttl_seconds = settings.call_state_ttl_seconds
+        self.engine: Optional[Engine] = None
+        self._last_purge = 0.0
+
+        # 状态指标
+        self.reads = 0
+        self.writes = 0
+        self.purged = 0
+
+    def start(self):
+        if self.engine is not None:
+            return
+        if self.url.startswith("sqlite:///"):
+            directory = os.path.dirname(self.url[len("sqlite:///"):])
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+
+        self.engine = create_engine(self.url)
+        if self.engine.dialect.name == "sqlite":
+            event.listen(self.engine, "connect", _enable_sqlite_wal)
+        # 多个worker同时启动，建表需幂等
+        with self.engine.begin() as connection:
+            connection.execute(CreateTable(call_state_table, if_not_exists=True))
+            for index in call_state_table.indexes:
+                connection.execute(CreateIndex(index, if_not_exists=True))
+            # 旧版本建的表补上新增的列（均可为空）
+            existing = {
+                column["name"]
+                for column in inspect(connection).get_columns(call_state_table.name)
+            }
+            for column in call_state_table.columns:
+                if column.name not in existing:
+                    connection.execute(text(
+                        f"ALTER TABLE {call_state_table.name} ADD COLUMN "
+                        f"{column.name} {column.type.compile(self.engine.dialect)}"
+                    ))
+        logger.info(f"共享通话状态: {self.engine.url.render_as_string()}")
+
+    def stop(self):
+        if self.engine is not None:
+            self.engine.dispose()
+            self.engine = None
+
+    async def put(self, call_id: str, **fields):
+        """新增或更新通话"""
+        now = time.time()
+        purge = bool(self.ttl_seconds) and now - self._last_purge > 60
+        if purge:
+            self._last_purge = now
+        self.purged += await asyncio.to_thread(self._put, call_id, fields, now, purge)
+        self.writes += 1
+
+    def _put(self, call_id: str, fields: dict, now: float, purge: bool) -> int:
+        """写入一条通话，返回顺带清理的过期条数"""
+        values = {"call_id": call_id, "updated_at": now, **fields}
+        with self.engine.begin() as connection:
+            upsert = self._upsert(values)
+            if upsert is not None:
+                connection.execute(upsert)
+            else:
+                self._update_or_insert(connection, values)
+            if not purge:
+                return 0
+            return connection.execute(
+                delete(call_state_table)
+                .where(call_state_table.c.updated_at < now - self.ttl_seconds)
+            ).rowcount
+
+    def _upsert(self, values: dict):
+        """方言的 INSERT ... ON CONFLICT DO UPDATE；不支持的方言返回 None"""
+        dialects = {"sqlite": sqlite, "postgresql": postgresql}
+        dialect = dialects.get(self.engine.dialect.name)
+        if dialect is None:
+            return None
+        statement = dialect.insert(call_state_table).values(**values)
+        return statement.on_conflict_do_update(
+            index_elements=[call_state_table.c.call_id],
+            set_={name: value for name, value in values.items() if name != "call_id"}
+        )
+
+    @staticmethod
+    def _update_or_insert(connection, values: dict):
+        """先UPDATE后INSERT；并发插入同一行时改为UPDATE"""
+        call_id = values["call_id"]
+        statement = (
+            update(call_state_table)
+            .where(call_state_table.c.call_id == call_id)
+            .values(**values)
+        )
+        if connection.execute(statement).rowcount:
+            return
+        try:
+            with connection.begin_nested():
+                connection.execute(insert(call_state_table).values(**values))
+        except IntegrityError:
+            connection.execute(statement)
+
+    async def update(self, call_id: str, **fields) -> bool:
+        """更新已有通话，不存在时返回 False"""
+        updated = await asyncio.to_thread(self._update, call_id, fields)
+        self.writes += 1
+        return updated
+
+    def _update(self, call_id: str, fields: dict) -> bool:
+        with self.engine.begin() as connection:
+            updated = connection.execute(
+                update(call_state_table)
+                .where(call_state_table.c.call_id == call_id)
+                .values(updated_at=time.time(), **fields)
+            ).rowcount
+        return updated > 0
+
+    async def get(self, call_id: str) -> Optional[dict]:
+        call = await asyncio.to_thread(self._get, call_id)
+        self.reads += 1
+        return call
+
+    def _get(self, call_id: str) -> Optional[dict]:
+        query = select(call_state_table).where(call_state_table.c.call_id == call_id)
+        if self.ttl_seconds:
+            query = query.where(
+                call_state_table.c.updated_at >= time.time() - self.ttl_seconds
+            )
+        with self.engine.connect() as connection:
+            row = connection.execute(query).mappings().first()
+        if row is None:
+            return None
+        return {name: row[name] for name in CALL_FIELDS if row[name] is not None}
+
+    def stats(self) -> dict:
+        return {
+            "backend": self.backend,
+            "reads": self.reads,
+            "writes": self.writes,
+            "purged": self.purged
+        }
+
+
+def create_call_state(backend: str = None):
+    """按 call_state_backend 配置创建通话状态后端"""
+    backend = backend or settings.call_state_backend
+    if backend == "memory":
+        return MemoryCallState()
+    if backend == "sql":
+        return SQLCallState()
+    raise ValueError(f"未知的通话状态后端: {backend}")
+
+
+call_state = create_call_state()
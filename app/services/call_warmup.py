@@ -0,0 +1,170 @@
+import asyncio
+import time
+from functools import partial
+from typing import Dict, NamedTuple, Optional
+from app.config import settings
+from app.models.conversation import Conversation
+from app.services.metrics import (
+    call_warmup_claimed,
+    call_warmup_expired,
+    call_warmup_failed,
+    call_warmup_seconds
+)
+from app.services.session_manager import session_manager
+from loguru import logger
+
+
+class WarmCall(NamedTuple):
+    """预热结果：已创建的会话与问候音频（合成失败或未配置时为空）"""
+    session: Conversation
+    greeting: Optional[bytes]
+    greeting_text: str
+    response_format: str
+
+
+class CallWarmup:
+    """拨号前预热
+
+    发起呼叫时在后台用发起时给的提示词创建会话，同时合成问候语音，结果
+    按 call_id 保存；音频流接通时 claim 取走，问候语音立即播放，不再等待
+    任何请求（预热尚未完成时等它完成，仍比接通后才开始快）。会话创建失败
+    的直接移除，接通前超过 ttl 秒未取走的释放会话。多worker时只用
+    prefetch_greeting 预合成问候语音进TTS缓存。
+    """
+
+    def __init__(self, ttl: float = None):
+        self.ttl = ttl or settings.call_warmup_ttl
+        self._pending: Dict[str, asyncio.Task] = {}
+        self._expiry: Dict[str, asyncio.TimerHandle] = {}
+        self._prefetches = set()
+
+        # 预热指标
+        self.started = 0
+        self.prefetched = 0
+        self.claimed = 0
+        self.failed = 0
+        self.expired = 0
+
+    def start(self, call_id: str, prompt: str, greeting_text: str):
+        """在后台开始预热（需在事件循环中调用）"""
+        task = asyncio.create_task(self._warm(call_id, prompt, greeting_text))
+        task.add_done_callback(partial(self._on_done, call_id))
+        self._pending[call_id] = task
+        self._expiry[call_id] = asyncio.get_running_loop().call_later(
+            self.ttl, self._expire, call_id
+        )
+        self.started += 1
+
+    def prefetch_greeting(self, greeting_text: str):
+        """只预合成问候语音进TTS缓存，接通时现合成即可命中"""
+        if not greeting_text:
+            return
+
+        async def prefetch():
+            try:
+                await session_manager.model_client.generate_greeting(greeting_text)
+            except Exception as e:
+                logger.warning(f"问候语音预合成失败: {e}")
+
+        task = asyncio.create_task(prefetch())
+        self._prefetches.add(task)
+        task.add_done_callback(self._prefetches.discard)
+        self.prefetched += 1
+
+    async def _warm(
+        self,
+        call_id: str,
+        prompt: str,
+        greeting_text: str
+    ) -> WarmCall:
+        started = time.perf_counter()
+        model_client = session_manager.model_client
+        # 问候语音按默认TTS格式合成；协商了对端格式的通话需要裸PCM
+        response_format = settings.tts_response_format
+        greeting_task = None
+        if greeting_text:
+            greeting_task = asyncio.create_task(
+                model_client.generate_greeting(greeting_text)
+            )
+
+        session = None
+        try:
+            session = await session_manager.create_session(call_id, prompt)
+            greeting = None
+            if greeting_task is not None:
+                try:
+                    greeting = await greeting_task
+                except Exception as e:
+                    # 没有问候语音仍可接通，会话照常使用
+                    logger.warning(f"问候语音预热失败: {call_id} {e}")
+        except BaseException:
+            if greeting_task is not None:
+                greeting_task.cancel()
+            if session is not None:
+                session_manager.discard_session(call_id, session)
+            raise
+
+        elapsed = time.perf_counter() - started
+        call_warmup_seconds.observe(elapsed)
+        logger.bind(call_id=call_id, stage="warmup", ms=int(elapsed * 1000)).info(
+            f"通话预热完成: {call_id}"
+        )
+        return WarmCall(session, greeting, greeting_text, response_format)
+
+    def _on_done(self, call_id: str, task: asyncio.Task):
+        if task.cancelled() or task.exception() is None:
+            return
+        if self._pending.get(call_id) is task:
+            del self._pending[call_id]
+            self._expiry.pop(call_id).cancel()
+        self.failed += 1
+        call_warmup_failed.inc()
+        logger.warning(f"通话预热失败: {call_id} {task.exception()}")
+
+    async def claim(self, call_id: str) -> Optional[WarmCall]:
+        """接通时取走预热结果；没有预热或预热失败时返回 None"""
+        task = self._pending.pop(call_id, None)
+        if task is None:
+            return None
+        self._expiry.pop(call_id).cancel()
+        try:
+            warm = await task
+        except Exception:
+            return None
+        self.claimed += 1
+        call_warmup_claimed.inc()
+        return warm
+
+    def _expire(self, call_id: str):
+        """接通前超时：取消未完成的预热，释放已创建的会话"""
+        task = self._pending.pop(call_id, None)
+        self._expiry.pop(call_id, None)
+        if task is None:
+            return
+        self.expired += 1
+        call_warmup_expired.inc()
+        if not task.done():
+            task.cancel()
+        elif not task.cancelled() and task.exception() is None:
+            session_manager.discard_session(call_id, task.result().session)
+        logger.info(f"通话预热过期: {call_id}")
+
+    def discard(self, call_id: str):
+        """呼叫结束而未接通：立即释放预热结果"""
+        handle = self._expiry.get(call_id)
+        if handle is not None:
+            handle.cancel()
+            self._expire(call_id)
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self._pending),
+            "started": self.started,
+            "prefetched": self.prefetched,
+            "claimed": self.claimed,
+            "failed": self.failed,
+            "expired": self.expired
+        }
+
+
+call_warmup = CallWarmup()
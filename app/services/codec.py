@@ -0,0 +1,121 @@
+import io
+import wave
+import numpy as np
+from typing import NamedTuple
+
+try:
+    import soundfile
+except ImportError:  # 可选依赖，未安装时上传给模型的语音退回WAV
+    soundfile = None
+
+# pcm 为16bit小端线性PCM；ulaw / alaw 为 G.711，每样本1字节
+ENCODINGS = ("pcm", "ulaw", "alaw")
+
+_ULAW_SEG_END = np.array([0x3F, 0x7F, 0xFF, 0x1FF, 0x3FF, 0x7FF, 0xFFF, 0x1FFF])
+_ALAW_SEG_END = np.array([0x1F, 0x3F, 0x7F, 0xFF, 0x1FF, 0x3FF, 0x7FF, 0xFFF])
+
+
+def _build_ulaw_tables() -> tuple:
+    """按 G.711 参考实现一次算出全部 65536 个 int16 的编码与 256 个码字的解码"""
+    pcm = np.arange(-32768, 32768, dtype=np.int32)
+    value = pcm >> 2
+    mask = np.where(value < 0, 0x7F, 0xFF)
+    value = np.minimum(np.abs(value), 8159) + 0x21
+    seg = np.searchsorted(_ULAW_SEG_END, value)
+    code = np.where(
+        seg >= 8, 0x7F, (seg << 4) | ((value >> (seg + 1)) & 0x0F)
+    ) ^ mask
+    encode = np.empty(65536, dtype=np.uint8)
+    encode[pcm.astype(np.uint16)] = code
+
+    inverted = ~np.arange(256, dtype=np.int32) & 0xFF
+    t = (((inverted & 0x0F) << 3) + 0x84) << ((inverted & 0x70) >> 4)
+    decode = np.where(inverted & 0x80, 0x84 - t, t - 0x84).astype(np.int16)
+    return encode, decode
+
+
+def _build_alaw_tables() -> tuple:
+    pcm = np.arange(-32768, 32768, dtype=np.int32)
+    value = pcm >> 3
+    mask = np.where(value >= 0, 0xD5, 0x55)
+    value = np.where(value >= 0, value, -value - 1)
+    seg = np.searchsorted(_ALAW_SEG_END, value)
+    mantissa = np.where(seg < 2, value >> 1, value >> np.maximum(seg, 1)) & 0x0F
+    code = np.where(seg >= 8, 0x7F, (seg << 4) | mantissa) ^ mask
+    encode = np.empty(65536, dtype=np.uint8)
+    encode[pcm.astype(np.uint16)] = code
+
+    toggled = np.arange(256, dtype=np.int32) ^ 0x55
+    seg = (toggled & 0x70) >> 4
+    t = ((toggled & 0x0F) << 4) + np.where(seg == 0, 8, 0x108)
+    t = np.where(seg > 1, t << np.maximum(seg - 1, 0), t)
+    decode = np.where(toggled & 0x80, t, -t).astype(np.int16)
+    return encode, decode
+
+
+_ENCODE_TABLES = {}
+_DECODE_TABLES = {}
+_ENCODE_TABLES["ulaw"], _DECODE_TABLES["ulaw"] = _build_ulaw_tables()
+_ENCODE_TABLES["alaw"], _DECODE_TABLES["alaw"] = _build_alaw_tables()
+for _table in (*_ENCODE_TABLES.values(), *_DECODE_TABLES.values()):
+    _table.setflags(write=False)
+
+
+def decode(data: bytes, encoding: str) -> np.ndarray:
+    """解码为 int16 样本（pcm 为只读零拷贝视图，G.711 查表生成新数组）"""
+    if encoding == "pcm":
+        return np.frombuffer(data, dtype=np.int16)
+    return _DECODE_TABLES[encoding][np.frombuffer(data, dtype=np.uint8)]
+
+
+def encode(samples: np.ndarray, encoding: str) -> bytes:
+    """把 int16 样本编码为指定格式"""
+    if encoding == "pcm":
+        return samples.tobytes()
+    return _ENCODE_TABLES[encoding][samples.view(np.uint16)].tobytes()
+
+
+class AudioFormat(NamedTuple):
+    """一路音频流的编码与采样率"""
+    encoding: str = "pcm"
+    sample_rate: int = 8000
+
+    @classmethod
+    def parse(cls, encoding: str, sample_rate) -> "AudioFormat":
+        """校验对端声明的格式，不支持时抛出 ValueError"""
+        encoding = encoding.lower()
+        if encoding not in ENCODINGS:
+            raise ValueError(f"不支持的音频编码: {encoding}")
+        sample_rate = int(sample_rate)
+        if encoding != "pcm" and sample_rate != 8000:
+            raise ValueError(f"G.711 只支持 8000Hz: {sample_rate}")
+        if not 8000 <= sample_rate <= 48000:
+            raise ValueError(f"不支持的采样率: {sample_rate}")
+        return cls(encoding, sample_rate)
+
+    @property
+    def sample_width(self) -> int:
+        return 2 if self.encoding == "pcm" else 1
+
+
+# 上传给模型的语音文件格式；flac 需要 soundfile，wav 总是可用
+CONTAINERS = ("flac", "wav")
+
+
+def container_available(container: str) -> bool:
+    return container == "wav" or (container == "flac" and soundfile is not None)
+
+
+def encode_container(pcm: bytes, sample_rate: int, container: str) -> bytes:
+    """把16bit单声道PCM封装为 wav / flac 文件"""
+    buffer = io.BytesIO()
+    if container == "flac":
+        samples = np.frombuffer(pcm, dtype=np.int16, count=len(pcm) // 2)
+        soundfile.write(buffer, samples, sample_rate, format="FLAC", subtype="PCM_16")
+    else:
+        with wave.open(buffer, "wb") as wav_file:
+            wav_file.setnchannels(1)
+            wav_file.setsampwidth(2)
+            wav_file.setframerate(sample_rate)
+            wav_file.writeframes(pcm)
+    return buffer.getvalue()
@@ -0,0 +1,173 @@
+import asyncio
+from typing import List, Optional
+from app.config import settings
+from app.utils.text import estimate_tokens
+
+# 每条消息的角色、分隔符等固定开销
+_MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def message_tokens(message: dict) -> int:
+    """估算单条消息的token数"""
+    content = message.get("content")
+    if not isinstance(content, str):
+        # 多模态消息只计文本部分
+        content = "".join(
+            part.get("text", "") for part in content or []
+            if isinstance(part, dict)
+        )
+    return estimate_tokens(content) + _MESSAGE_OVERHEAD_TOKENS
+
+
+def audio_tokens(seconds: float) -> int:
+    """估算一段用户语音占用的token数"""
+    return int(seconds * settings.context_audio_tokens_per_second)
+
+
+def audio_bytes(message: dict) -> int:
+    """消息中 input_audio 数据的字节数"""
+    content = message.get("content")
+    if isinstance(content, str):
+        return 0
+    return sum(
+        len(part["input_audio"]["data"]) for part in content or []
+        if isinstance(part, dict) and part.get("type") == "input_audio"
+    )
+
+
+class _Turn:
+    __slots__ = ("messages", "tokens", "audio_bytes")
+
+    def __init__(self, messages: List[dict], audio_seconds: float = 0.0):
+        self.messages = messages
+        self.tokens = (
+            sum(message_tokens(message) for message in messages)
+            + audio_tokens(audio_seconds)
+        )
+        self.audio_bytes = sum(audio_bytes(message) for message in messages)
+
+
+class ConversationContext:
+    """单个会话的上下文窗口
+
+    请求消息 = 系统提示（固定）+ 滚动摘要 + 最近若干轮原文 + 本轮输入。
+    原文轮次中的用户输入保留语音（input_audio），模型能听到此前说过的话，
+    语音按时长计入token预算。较早的轮次按批折叠进摘要，摘要在后台生成，
+    完成前这些轮次仍以原文发送；前缀只在一批折叠完成时变化一次，其余轮次
+    逐字不变，便于服务端前缀缓存命中。总量超过token预算时从最早的原文
+    轮次开始舍弃。
+    """
+
+    def __init__(
+        self,
+        system_prompt: str,
+        max_tokens: int = None,
+        keep_turns: int = None,
+        summary_batch: int = None
+    ):
+        self.system_message = {"role": "system", "content": system_prompt}
+        self.max_tokens = max_tokens or settings.context_max_tokens
+        self.keep_turns = keep_turns or settings.context_keep_turns
+        self.summary_batch = summary_batch or settings.context_summary_batch
+
+        self.summary = ""
+        self._summary_message: Optional[dict] = None
+        self._prefix_tokens = message_tokens(self.system_message)
+        self._turns: List[_Turn] = []
+        self._folding = 0
+        self.summary_task: Optional[asyncio.Task] = None
+
+        # 上下文指标
+        self.folds = 0
+        self.truncated_requests = 0
+
+    @property
+    def turn_count(self) -> int:
+        """尚以原文保留的轮数"""
+        return len(self._turns)
+
+    @property
+    def audio_bytes(self) -> int:
+        """原文轮次中保留的语音数据字节数"""
+        return sum(turn.audio_bytes for turn in self._turns)
+
+    def add_turn(self, messages: List[dict], audio_seconds: float = 0.0):
+        """记录一轮完整对话（用户输入 + 回复），只保留 role / content；
+        audio_seconds 为用户语音时长"""
+        self._turns.append(_Turn([
+            {"role": message["role"], "content": message["content"]}
+            for message in messages
+        ], audio_seconds))
+
+    def build(self, user_message: dict, audio_seconds: float = 0.0) -> List[dict]:
+        """按预算组装本轮请求的消息列表"""
+        budget = (
+            self.max_tokens
+            - self._prefix_tokens
+            - message_tokens(user_message)
+            - audio_tokens(audio_seconds)
+        )
+        start = len(self._turns)
+        while start > 0 and self._turns[start - 1].tokens <= budget:
+            start -= 1
+            budget -= self._turns[start].tokens
+        if start > self._folding:
+            # 超出预算而舍弃了尚未进入摘要的原文
+            self.truncated_requests += 1
+
+        messages = [self.system_message]
+        if self._summary_message is not None:
+            messages.append(self._summary_message)
+        for turn in self._turns[start:]:
+            messages.extend(turn.messages)
+        messages.append(user_message)
+        return messages
+
+    def needs_fold(self) -> bool:
+        """超出保留轮数的原文已攒够一批且没有进行中的折叠"""
+        return (
+            self._folding == 0
+            and self.summary_task is None
+            and len(self._turns) - self.keep_turns >= self.summary_batch
+        )
+
+    def begin_fold(self) -> List[dict]:
+        """取出待折叠轮次的消息（保留最近 keep_turns 轮原文）"""
+        self._folding = len(self._turns) - self.keep_turns
+        return [
+            message
+            for turn in self._turns[:self._folding]
+            for message in turn.messages
+        ]
+
+    def finish_fold(self, summary: str):
+        """摘要完成：替换摘要，移除已折叠的轮次"""
+        del self._turns[:self._folding]
+        self._folding = 0
+        self.summary = summary
+        self._summary_message = {
+            "role": "system",
+            "content": f"此前对话摘要：{summary}"
+        }
+        self._prefix_tokens = (
+            message_tokens(self.system_message)
+            + message_tokens(self._summary_message)
+        )
+        self.folds += 1
+
+    def abort_fold(self):
+        """摘要失败，下次再试"""
+        self._folding = 0
+
+    def cancel(self):
+        if self.summary_task is not None:
+            self.summary_task.cancel()
+            self.summary_task = None
+
+    def stats(self) -> dict:
+        return {
+            "turns": len(self._turns),
+            "summary_chars": len(self.summary),
+            "folds": self.folds,
+            "truncated_requests": self.truncated_requests
+        }
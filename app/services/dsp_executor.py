@@ -0,0 +1,163 @@
+import asyncio
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import AsyncIterator, List, Optional, Tuple
+from app.config import settings
+from app.services.audio_processor import (
+    AudioProcessor,
+    AutomaticGainControl,
+    StreamingResampler
+)
+from app.services.codec import AudioFormat
+from app.services.metrics import resample_seconds
+from loguru import logger
+
+
+def process_frames(
+    processor: AudioProcessor,
+    resampler: StreamingResampler,
+    agc: Optional[AutomaticGainControl],
+    audio_format: AudioFormat,
+    frames: List[bytes]
+) -> Tuple[StreamingResampler, Optional[AutomaticGainControl], List[bytes], float]:
+    """按顺序处理一批帧：解码、重采样、自动增益
+
+    返回更新后的重采样器与自动增益（进程池模式下状态随结果带回）、
+    处理结果与每帧平均耗时（秒），耗时在事件循环侧记入指标。
+    """
+    started = time.perf_counter()
+    results = [
+        processor.process_chunk(
+            frame,
+            source_sr=audio_format.sample_rate,
+            resampler=resampler,
+            agc=agc,
+            encoding=audio_format.encoding
+        )
+        for frame in frames
+    ]
+    return resampler, agc, results, (time.perf_counter() - started) / len(frames)
+
+
+class DSPExecutor:
+    """逐帧DSP的执行器：inline（事件循环内）、thread 或 process"""
+
+    def __init__(self):
+        self.mode = settings.dsp_executor_mode
+        self.max_workers = settings.dsp_workers or None
+        self._executor: Optional[Executor] = None
+
+    def _get_executor(self) -> Optional[Executor]:
+        if self.mode == "inline":
+            return None
+        if self._executor is None:
+            if self.mode == "process":
+                self._executor = ProcessPoolExecutor(self.max_workers)
+            else:
+                self._executor = ThreadPoolExecutor(
+                    self.max_workers, thread_name_prefix="dsp"
+                )
+            logger.info(f"DSP执行器已启动: mode={self.mode}")
+        return self._executor
+
+    async def run(self, fn, *args):
+        """在执行器中运行 fn(*args)"""
+        executor = self._get_executor()
+        if executor is None:
+            return fn(*args)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, fn, *args)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+class CallDSPStage:
+    """单路通话的DSP阶段
+
+    接收端只负责入队；后台任务每次取出已积压的全部帧（不超过
+    max_batch）整批提交执行器，结果按到达顺序输出。空闲时一帧
+    即一批，不额外增加延迟。
+    """
+
+    def __init__(
+        self,
+        executor: DSPExecutor,
+        processor: AudioProcessor,
+        resampler: StreamingResampler,
+        agc: AutomaticGainControl = None,
+        max_batch: int = None,
+        audio_format: AudioFormat = None
+    ):
+        self.executor = executor
+        self.processor = processor
+        self.resampler = resampler
+        self.agc = agc
+        self.audio_format = audio_format or AudioFormat()
+        self.max_batch = max_batch or settings.dsp_batch_frames
+        self._frames: asyncio.Queue = asyncio.Queue()
+        self._results: asyncio.Queue = asyncio.Queue()
+        self._worker = asyncio.create_task(self._run())
+
+    def push(self, frame: bytes):
+        """提交一帧原始音频"""
+        self._frames.put_nowait(frame)
+
+    def close(self):
+        """输入结束，处理完积压帧后结束输出"""
+        self._frames.put_nowait(None)
+
+    async def _run(self):
+        closed = False
+        try:
+            while not closed:
+                batch = [await self._frames.get()]
+                while (
+                    len(batch) < self.max_batch
+                    and not self._frames.empty()
+                ):
+                    batch.append(self._frames.get_nowait())
+
+                if batch[-1] is None:
+                    closed = True
+                    batch.pop()
+                if not batch:
+                    continue
+
+                (
+                    self.resampler, self.agc, results, frame_seconds
+                ) = await self.executor.run(
+                    process_frames,
+                    self.processor,
+                    self.resampler,
+                    self.agc,
+                    self.audio_format,
+                    batch
+                )
+                for result in results:
+                    resample_seconds.observe(frame_seconds)
+                    self._results.put_nowait(result)
+        except Exception as e:
+            logger.error(f"DSP处理失败: {e}")
+            self._results.put_nowait(e)
+        finally:
+            self._results.put_nowait(None)
+
+    async def results(self) -> AsyncIterator[bytes]:
+        """按到达顺序产出处理后的音频"""
+        while (result := await self._results.get()) is not None:
+            if isinstance(result, Exception):
+                raise result
+            yield result
+
+    async def aclose(self):
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+
+
+dsp_executor = DSPExecutor()
@@ -0,0 +1,141 @@
+import httpx
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+from app.config import settings
+from app.services.admission import admission
+from loguru import logger
+
+
+class ModelHTTPPool:
+    """模型服务共享HTTP连接池（长连接复用，可选HTTP/2）
+
+    连接数只从 httpx 的 trace 钩子统计（成功建立的TCP连接），不读取
+    httpx 内部的连接池对象；进行中的请求数按请求计，HTTP/2 下多个请求
+    可共用一个连接。
+    """
+
+    def __init__(self):
+        self.max_connections = settings.model_pool_max_connections
+        self.max_keepalive = settings.model_pool_max_keepalive
+        self.keepalive_expiry = settings.model_pool_keepalive_expiry
+        self.http2 = settings.model_http2
+        self.timeout = settings.remote_model_service_timeout
+        self._client: Optional[httpx.AsyncClient] = None
+
+        # 连接池指标
+        self.requests_total = 0
+        self.new_connections = 0
+        self.connect_failures = 0
+        # 发出时进行中的请求已达连接上限的次数（HTTP/1.1 下需等待空闲连接）
+        self.connection_waits = 0
+        self.requests_in_flight = 0
+        self.peak_requests_in_flight = 0
+
+    async def start(self):
+        """创建共享客户端（应用启动时调用）"""
+        if self._client is not None:
+            return
+
+        http2 = self.http2
+        if http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                logger.warning("未安装h2，模型连接池回退到HTTP/1.1")
+                http2 = False
+
+        self._client = httpx.AsyncClient(
+            timeout=self.timeout,
+            http2=http2,
+            limits=httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_keepalive,
+                keepalive_expiry=self.keepalive_expiry
+            )
+        )
+        logger.info(
+            f"模型连接池已启动: max_connections={self.max_connections}, "
+            f"keepalive={self.max_keepalive}, http2={http2}"
+        )
+
+    async def close(self):
+        """关闭共享客户端（应用关闭时调用）"""
+        if self._client is None:
+            return
+        client, self._client = self._client, None
+        await client.aclose()
+        logger.info("模型连接池已关闭")
+
+    async def _get_client(self) -> httpx.AsyncClient:
+        # 未经过FastAPI启动钩子（脚本、测试）时按需创建
+        if self._client is None:
+            await self.start()
+        return self._client
+
+    async def _trace(self, event: str, info: dict):
+        if event == "connection.connect_tcp.complete":
+            self.new_connections += 1
+        elif event == "connection.connect_tcp.failed":
+            self.connect_failures += 1
+
+    def _acquire(self):
+        self.requests_total += 1
+        if self.requests_in_flight >= self.max_connections:
+            self.connection_waits += 1
+        self.requests_in_flight += 1
+        self.peak_requests_in_flight = max(
+            self.peak_requests_in_flight, self.requests_in_flight
+        )
+
+    def _release(self):
+        self.requests_in_flight -= 1
+
+    async def post(self, url: str, **kwargs) -> httpx.Response:
+        """发送POST请求并读取完整响应（受模型并发上限约束）"""
+        client = await self._get_client()
+        async with admission.model.slot():
+            self._acquire()
+            try:
+                return await client.post(
+                    url, extensions={"trace": self._trace}, **kwargs
+                )
+            finally:
+                self._release()
+
+    @asynccontextmanager
+    async def stream(
+        self,
+        method: str,
+        url: str,
+        **kwargs
+    ) -> AsyncIterator[httpx.Response]:
+        """发送流式请求，响应体在上下文内逐块读取（整个流占用一个并发名额）"""
+        client = await self._get_client()
+        async with admission.model.slot():
+            self._acquire()
+            try:
+                async with client.stream(
+                    method, url, extensions={"trace": self._trace}, **kwargs
+                ) as response:
+                    yield response
+            finally:
+                self._release()
+
+    def stats(self) -> dict:
+        """连接池指标"""
+        reused = self.requests_total - self.new_connections
+        return {
+            "requests_total": self.requests_total,
+            "requests_in_flight": self.requests_in_flight,
+            "requests_in_flight_peak": self.peak_requests_in_flight,
+            "new_connections": self.new_connections,
+            "connect_failures": self.connect_failures,
+            "connection_waits": self.connection_waits,
+            "reuse_ratio": (
+                round(max(reused, 0) / self.requests_total, 4)
+                if self.requests_total else 0.0
+            )
+        }
+
+
+model_http_pool = ModelHTTPPool()
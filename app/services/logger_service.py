@@ -1,63 +1,292 @@
 from loguru import logger
 from app.config import settings
+import atexit
+import json
 import os
-from datetime import datetime
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from datetime import datetime, timedelta
+from functools import partial
+from typing import Callable
+
+class LogPipeline:
+    """后台批量日志管道
+
+    loguru 的 sink 只把记录放进有界队列，不格式化、不做IO；后台线程按批
+    把记录格式化为JSON行写入按天滚动的文件、按文本写控制台，每批各一次
+    write + flush。队列满时丢弃新记录并计数，磁盘或 stdout 阻塞不会卡住
+    事件循环。带 sample 标记的高频日志（logger.bind(sample="键")）每
+    sample_rate 条保留一条。
+    """
+
+    retention_days = 7
+    yield_every = 16
+
+    def __init__(
+        self,
+        log_dir: str = None,
+        console: bool = True,
+        queue_size: int = None,
+        batch_size: int = None,
+        flush_interval: float = None,
+        sample_rate: int = None
+    ):
+        self.log_dir = log_dir or settings.log_dir
+        self.console = console
+        self.queue_size = queue_size or settings.log_queue_size
+        self.batch_size = batch_size or settings.log_batch_size
+        self.flush_interval = flush_interval or settings.log_flush_interval
+        self.sample_rate = max(sample_rate or settings.log_sample_rate, 1)
+
+        self._queue = deque()
+        self._wakeup = threading.Event()
+        self._stopping = False
+        self._thread = None
+        self._file = None
+        self._file_date = None
+        self._samples = {}
+
+        # 管道指标
+        self.records = 0
+        self.dropped = 0
+        self.sampled_out = 0
+        self.batches = 0
+        self.max_batch = 0
+        self.write_seconds = 0.0
+
+    def sink(self, message):
+        """loguru sink：只入队"""
+        if len(self._queue) >= self.queue_size:
+            self.dropped += 1
+            return
+        self._queue.append(message.record)
+        if len(self._queue) >= self.batch_size:
+            self._wakeup.set()
+
+    def sample(self, record) -> bool:
+        """loguru filter：带 sample 标记的日志按键计数，每 sample_rate 条保留一条"""
+        key = record["extra"].get("sample")
+        if key is None:
+            return True
+        count = self._samples.get(key, 0)
+        self._samples[key] = count + 1
+        if count % self.sample_rate:
+            self.sampled_out += 1
+            return False
+        record["extra"]["sample_rate"] = self.sample_rate
+        return True
+
+    def submit(self, job: Callable):
+        """把一次性的写盘任务交给后台线程"""
+        self._queue.append(job)
+        self._wakeup.set()
+
+    def start(self):
+        if self._thread is not None:
+            return
+        os.makedirs(self.log_dir, exist_ok=True)
+        self._stopping = False
+        self._thread = threading.Thread(
+            target=self._run, name="log-writer", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        """写出队列中剩余的记录后停止"""
+        if self._thread is None:
+            return
+        self._stopping = True
+        self._wakeup.set()
+        self._thread.join(timeout=5)
+        self._thread = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _run(self):
+        while not self._stopping:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self._drain()
+        self._drain()
+
+    def _drain(self):
+        while self._queue:
+            batch = []
+            while self._queue and len(batch) < self.batch_size:
+                batch.append(self._queue.popleft())
+            self._write_batch(batch)
+
+    def _write_batch(self, batch: list):
+        started = time.perf_counter()
+        text, lines = [], []
+        for i, item in enumerate(batch):
+            if i and i % self.yield_every == 0:
+                # 格式化持有GIL，分段让出，避免事件循环线程等待一整批
+                time.sleep(0)
+            if callable(item):
+                try:
+                    item()
+                except Exception as e:
+                    text.append(f"后台写盘任务失败: {e}\n")
+                continue
+            if self.console:
+                text.append(self._format_text(item))
+            lines.append(self._format_json(item))
+
+        # 写日志失败不能影响服务：文件写入失败时本批计为丢弃，控制台失败忽略
+        if lines:
+            try:
+                self._log_file().write("".join(lines))
+                self._file.flush()
+                self.records += len(lines)
+            except Exception:
+                self.dropped += len(lines)
+        if text:
+            try:
+                stream = sys.stdout
+                stream.write("".join(text))
+                stream.flush()
+            except Exception:
+                pass
+
+        self.batches += 1
+        self.max_batch = max(self.max_batch, len(batch))
+        self.write_seconds += time.perf_counter() - started
+
+    def _log_file(self):
+        """按天滚动，滚动时删除超过保留天数的文件"""
+        today = datetime.now().strftime("%Y%m%d")
+        if self._file is None or self._file_date != today:
+            if self._file is not None:
+                self._file.close()
+            self._file = open(
+                os.path.join(self.log_dir, f"assistant_{today}.log"),
+                "a",
+                encoding="utf-8"
+            )
+            self._file_date = today
+            self._purge_old_files()
+        return self._file
+
+    def _purge_old_files(self):
+        cutoff = (datetime.now() - timedelta(days=self.retention_days)).strftime("%Y%m%d")
+        for name in os.listdir(self.log_dir):
+            if name.startswith("assistant_") and name.endswith(".log"):
+                if name[len("assistant_"):-len(".log")] < cutoff:
+                    try:
+                        os.remove(os.path.join(self.log_dir, name))
+                    except OSError:
+                        pass
+
+    @staticmethod
+    def _format_text(record) -> str:
+        line = (
+            f"{record['time']:%Y-%m-%d %H:%M:%S} | {record['level'].name: <8} | "
+            f"{record['name']}:{record['function']}:{record['line']} - {record['message']}\n"
+        )
+        if record["exception"] is not None:
+            line += "".join(traceback.format_exception(*record["exception"]))
+        return line
+
+    @staticmethod
+    def _format_json(record) -> str:
+        entry = {
+            "time": record["time"].isoformat(timespec="milliseconds"),
+            "level": record["level"].name,
+            "logger": record["name"],
+            "function": record["function"],
+            "line": record["line"],
+            "message": record["message"],
+            **record["extra"]
+        }
+        if record["exception"] is not None:
+            entry["exception"] = "".join(
+                traceback.format_exception(*record["exception"])
+            )
+        return json.dumps(entry, ensure_ascii=False, default=str) + "\n"
+
+    def stats(self) -> dict:
+        return {
+            "queue_depth": len(self._queue),
+            "records": self.records,
+            "dropped": self.dropped,
+            "sampled_out": self.sampled_out,
+            "batches": self.batches,
+            "max_batch": self.max_batch,
+            "write_ms_avg": round(
+                self.write_seconds / self.batches * 1000, 3
+            ) if self.batches else 0.0
+        }
 
 class LoggerService:
     def __init__(self):
+        self.pipeline = None
         self.setup_logger()
-        
+
     def setup_logger(self):
-        """配置日志系统"""
-        # 确保日志目录存在
-        os.makedirs(settings.log_dir, exist_ok=True)
-        
+        """配置日志系统：控制台文本 + 文件JSON行，均经后台管道批量写入"""
         # 移除默认处理器
         logger.remove()
-        
-        # 添加控制台日志
-        logger.add(
-            sink=lambda msg: print(msg, end=''),
-            format="<green>{time:YYYY-MM-DD HH:mm:ss}</green> | <level>{level: <8}</level> | <cyan>{name}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan> - <level>{message}</level>",
-            level=settings.log_level,
-            colorize=True
-        )
-        
-        # 添加文件日志
-        log_file = os.path.join(
-            settings.log_dir, 
-            f"assistant_{datetime.now().strftime('%Y%m%d')}.log"
-        )
+
+        self.pipeline = LogPipeline()
         logger.add(
-            sink=log_file,
-            format="{time:YYYY-MM-DD HH:mm:ss} | {level: <8} | {name}:{function}:{line} - {message}",
+            sink=self.pipeline.sink,
+            format="{message}",
             level=settings.log_level,
-            rotation="1 day",
-            retention="7 days",
-            encoding="utf-8"
+            filter=self.pipeline.sample
         )
-        
+        self.pipeline.start()
+        atexit.register(self.pipeline.stop)
+
         logger.info("日志系统初始化完成")
-    
+
+    def start(self):
+        self.pipeline.start()
+
+    def stop(self):
+        """写出剩余日志"""
+        self.pipeline.stop()
+
     def save_conversation(self, call_id: str, conversation):
-        """保存对话记录"""
+        """保存对话记录（在日志后台线程写盘，不阻塞调用方）"""
+        self.pipeline.submit(partial(
+            self._write_conversation,
+            call_id,
+            list(conversation),
+            datetime.now(),
+            settings.log_dir
+        ))
+
+    def _write_conversation(
+        self,
+        call_id: str,
+        conversation: list,
+        saved_at: datetime,
+        log_dir: str
+    ):
         try:
             log_file = os.path.join(
-                settings.log_dir, 
-                f"conversation_{call_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+                log_dir,
+                f"conversation_{call_id}_{saved_at.strftime('%Y%m%d_%H%M%S')}.json"
             )
-            
+
             with open(log_file, 'w', encoding='utf-8') as f:
-                import json
                 json.dump({
                     "call_id": call_id,
-                    "timestamp": datetime.now().isoformat(),
+                    "timestamp": saved_at.isoformat(),
                     "conversation": conversation
                 }, f, ensure_ascii=False, indent=2)
-            
+
             logger.info(f"对话记录已保存: {log_file}")
-            
+
         except Exception as e:
             logger.error(f"保存对话记录失败: {e}")
 
+    def stats(self) -> dict:
+        return self.pipeline.stats()
+
 logger_service = LoggerService()
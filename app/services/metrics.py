@@ -0,0 +1,246 @@
+from bisect import bisect_left
+from typing import Callable, List, Optional, Sequence
+
+# 单帧处理（毫秒级以下）与请求级（百毫秒到秒级）两组默认分桶，单位秒
+FRAME_BUCKETS = (
+    0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05
+)
+REQUEST_BUCKETS = (
+    0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 5.0, 10.0
+)
+
+
+def _format_value(value: float) -> str:
+    if value == int(value):
+        return str(int(value))
+    return repr(float(value))
+
+
+class Counter:
+    """单调递增计数"""
+
+    def __init__(self, name: str, documentation: str):
+        self.name = name
+        self.documentation = documentation
+        self.value = 0
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+    def render(self) -> List[str]:
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} counter",
+            f"{self.name} {_format_value(self.value)}"
+        ]
+
+
+class Gauge:
+    """瞬时值：inc/dec 维护，或抓取时调用 collect 取值"""
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        collect: Optional[Callable[[], float]] = None
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.collect = collect
+        self.value = 0
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+    def dec(self, amount: float = 1):
+        self.value -= amount
+
+    def render(self) -> List[str]:
+        value = self.collect() if self.collect is not None else self.value
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} gauge",
+            f"{self.name} {_format_value(value)}"
+        ]
+
+
+class Histogram:
+    """预分桶直方图
+
+    observe 只做一次二分查找和两次整数/浮点累加，不加锁也不分配内存；
+    各桶存非累计计数，抓取时再累加成 Prometheus 的 le 桶。
+    """
+
+    def __init__(self, name: str, documentation: str, buckets: Sequence[float]):
+        self.name = name
+        self.documentation = documentation
+        self.bounds = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+    @property
+    def count(self) -> int:
+        return sum(self.counts)
+
+    def render(self) -> List[str]:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} histogram"
+        ]
+        cumulative = 0
+        for bound, count in zip(self.bounds, self.counts):
+            cumulative += count
+            lines.append(f'{self.name}_bucket{{le="{bound}"}} {cumulative}')
+        cumulative += self.counts[-1]
+        lines.append(f'{self.name}_bucket{{le="+Inf"}} {cumulative}')
+        lines.append(f"{self.name}_sum {repr(self.sum)}")
+        lines.append(f"{self.name}_count {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """指标注册表，按 Prometheus 文本格式（0.0.4）输出"""
+
+    def __init__(self, prefix: str = "phone_assistant_"):
+        self.prefix = prefix
+        self._metrics = {}
+
+    def _register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"指标重复注册: {metric.name}")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str) -> Counter:
+        return self._register(Counter(self.prefix + name, documentation))
+
+    def gauge(
+        self,
+        name: str,
+        documentation: str,
+        collect: Optional[Callable[[], float]] = None
+    ) -> Gauge:
+        return self._register(Gauge(self.prefix + name, documentation, collect))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        buckets: Sequence[float] = REQUEST_BUCKETS
+    ) -> Histogram:
+        return self._register(Histogram(self.prefix + name, documentation, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+metrics_registry = MetricsRegistry()
+
+# 一轮对话各阶段
+vad_endpoint_seconds = metrics_registry.histogram(
+    "vad_endpoint_seconds",
+    "Delay from the end of speech to the VAD speech_end decision",
+    (0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.8, 1.0, 1.5, 2.0)
+)
+resample_seconds = metrics_registry.histogram(
+    "resample_seconds",
+    "Per-frame resample and normalize time",
+    FRAME_BUCKETS
+)
+chat_completion_seconds = metrics_registry.histogram(
+    "chat_completion_seconds",
+    "Chat completion latency until the full reply is received"
+)
+tts_first_byte_seconds = metrics_registry.histogram(
+    "tts_first_byte_seconds",
+    "TTS request time to first audio byte"
+)
+turn_first_audio_seconds = metrics_registry.histogram(
+    "turn_first_audio_seconds",
+    "Delay from speech_end to the first reply audio byte sent"
+)
+turn_seconds = metrics_registry.histogram(
+    "turn_seconds",
+    "Total turn latency from speech_end to turn_complete"
+)
+ws_send_seconds = metrics_registry.histogram(
+    "ws_send_seconds",
+    "WebSocket send time per outbound audio chunk",
+    FRAME_BUCKETS
+)
+outbound_tick_jitter_seconds = metrics_registry.histogram(
+    "outbound_tick_jitter_seconds",
+    "Lateness of each outbound scheduler tick",
+    FRAME_BUCKETS
+)
+outbound_underruns = metrics_registry.counter(
+    "outbound_underruns_total",
+    "Times a call's far-end playout buffer ran dry"
+)
+outbound_stalls = metrics_registry.counter(
+    "outbound_stalls_total",
+    "Times a call's outbound audio was dropped because its peer could not keep up"
+)
+utterance_buffer_bytes = metrics_registry.gauge(
+    "utterance_buffer_bytes",
+    "Bytes preallocated by per-call utterance ring buffers"
+)
+
+# 用户语音提前上传
+audio_upload_bytes = metrics_registry.counter(
+    "audio_upload_bytes_total",
+    "Encoded caller audio bytes uploaded to the model"
+)
+audio_upload_committed = metrics_registry.counter(
+    "audio_upload_committed_total",
+    "Early uploads committed when the endpoint matched the tentative pause"
+)
+audio_upload_withdrawn = metrics_registry.counter(
+    "audio_upload_withdrawn_total",
+    "Early uploads withdrawn because the caller kept speaking"
+)
+
+# 推测生成
+speculation_committed = metrics_registry.counter(
+    "speculation_committed_total",
+    "Speculative generations committed when the endpoint matched the pause"
+)
+speculation_wasted = metrics_registry.counter(
+    "speculation_wasted_total",
+    "Speculative generations cancelled because the caller kept speaking"
+)
+speculation_wasted_seconds = metrics_registry.counter(
+    "speculation_wasted_seconds_total",
+    "Model request time spent on cancelled speculative generations"
+)
+speculation_head_start_seconds = metrics_registry.histogram(
+    "speculation_head_start_seconds",
+    "Time a committed speculative generation had already been running at speech_end",
+    (0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.8, 1.0)
+)
+
+# 拨号前预热
+call_warmup_seconds = metrics_registry.histogram(
+    "call_warmup_seconds",
+    "Time to create the session and synthesize the greeting before connect",
+    (0.1, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0)
+)
+call_warmup_claimed = metrics_registry.counter(
+    "call_warmup_claimed_total",
+    "Warmups claimed by the audio stream on connect"
+)
+call_warmup_failed = metrics_registry.counter(
+    "call_warmup_failed_total",
+    "Warmups whose session creation failed"
+)
+call_warmup_expired = metrics_registry.counter(
+    "call_warmup_expired_total",
+    "Warmups released because the call never connected"
+)
@@ -1,128 +1,576 @@
-import httpx
 import asyncio
-from typing import AsyncGenerator
+import base64
+import json
+import time
+from contextlib import aclosing
+from typing import AsyncGenerator, Dict
 from app.config import settings
+from app.services.http_pool import model_http_pool
+from app.services.session_store import BoundedSessionStore
+from app.services.context_manager import ConversationContext
+from app.services.tts_cache import cache_key, tts_cache
+from app.services.codec import container_available, encode_container
+from app.services.metrics import (
+    audio_upload_bytes,
+    chat_completion_seconds,
+    tts_first_byte_seconds
+)
+from app.utils.text import SentenceSegmenter
 from loguru import logger
 
+# 每轮随用户语音附带的回复要求
+_REPLY_INSTRUCTION = "请用中文简短回复，控制在50字以内。"
+
+
+def _history_size(history: dict) -> int:
+    """按消息文本的UTF-8长度加上下文中保留的语音数据估算会话历史占用"""
+    return sum(
+        len((message.get("content") or "").encode("utf-8"))
+        for message in history["messages"]
+    ) + history["context"].audio_bytes
+
+
 class ModelServiceClient:
     def __init__(self):
         self.base_url = settings.remote_model_service_url
         self.api_key = settings.remote_model_service_api_key
         self.timeout = settings.remote_model_service_timeout
         self.model = "/vepfs/public/model-public/Qwen3-Omni-30B-A3B-Instruct"
-        self._session_history = {}
+        self.http_pool = model_http_pool
+        self._session_history = BoundedSessionStore(
+            "会话历史",
+            max_entries=settings.session_max_entries,
+            ttl_seconds=settings.session_ttl_seconds,
+            max_bytes=settings.session_max_bytes,
+            sizeof=_history_size
+        )
+        # session_id -> 正在消费该会话回复的任务
+        self._generations: Dict[str, asyncio.Task] = {}
+        self.cancelled_generations = 0
+
+        self.audio_format = settings.model_audio_format
+        if not container_available(self.audio_format):
+            logger.warning(f"语音格式 {self.audio_format} 不可用（未安装soundfile），改为上传wav")
+            self.audio_format = "wav"
+        # 上传指标
+        self.audio_uploads = 0
+        self.audio_upload_bytes = 0
+        self.request_bytes = 0
 
     async def create_session(self, system_prompt: str) -> str:
         """创建远程会话"""
         import uuid
         session_id = str(uuid.uuid4())
-        self._session_history[session_id] = {
+        self._session_history.set(session_id, {
             "system_prompt": system_prompt,
             "messages": [{"role": "system", "content": system_prompt}],
+            "context": ConversationContext(system_prompt),
             "created_at": "2026-01-16"
-        }
+        })
         logger.info(f"会话创建: {session_id}")
         return session_id
 
-    async def send_audio(self, session_id: str, audio_data: bytes):
-        """发送音频到远程模型 (模拟ASR + 对话)"""
-        if session_id not in self._session_history:
+    def close_session(self, session_id: str):
+        """释放远程会话的本地历史"""
+        history = self._session_history.pop(session_id)
+        if history is not None:
+            history["context"].cancel()
+            logger.info(f"会话历史已释放: {session_id}")
+
+    async def send_audio(
+        self,
+        session_id: str,
+        audio_data: bytes,
+        commit: asyncio.Future = None
+    ):
+        """发送用户语音到远程模型对话"""
+        history = self._session_history.get(session_id)
+        if history is None:
             logger.error(f"会话不存在: {session_id}")
             return
 
-        history = self._session_history[session_id]
-
         logger.info(f"处理音频: {len(audio_data)} bytes")
 
+        user_message = await self._user_message(audio_data)
+        request = self._chat_request(
+            history, user_message, audio_seconds=self._audio_seconds(audio_data)
+        )
+        started = time.perf_counter()
         try:
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
-                response = await client.post(
-                    f"{self.base_url}/v1/chat/completions",
-                    json={
-                        "model": self.model,
-                        "messages": history["messages"] + [
-                            {
-                                "role": "user",
-                                "content": "请用中文简短回复，控制在50字以内。"
-                            }
-                        ],
-                        "max_tokens": 150
-                    }
-                )
-                response.raise_for_status()
-                result = response.json()
-                reply = result["choices"][0]["message"]["content"]
+            response = await self.http_pool.post(
+                f"{self.base_url}/v1/chat/completions",
+                content=self._request_body(request, self._upload_gate(commit)),
+                headers={"Content-Type": "application/json"}
+            )
+            response.raise_for_status()
+            result = response.json()
+            reply = result["choices"][0]["message"]["content"]
+            elapsed = time.perf_counter() - started
+            chat_completion_seconds.observe(elapsed)
 
-                history["messages"].append({
-                    "role": "assistant",
-                    "content": reply,
-                    "tts_text": reply
-                })
+            if commit is not None:
+                # 推测生成：确认说话结束后才写入历史
+                await commit
+            self._append_reply(session_id, history, audio_data, user_message, reply)
 
-                logger.info(f"模型回复: {reply[:100]}")
+            logger.bind(stage="chat", ms=round(elapsed * 1000)).info(
+                f"模型回复: {reply[:100]}"
+            )
 
         except Exception as e:
             logger.error(f"处理音频失败: {e}")
             raise
 
+    async def _user_message(self, audio_data: bytes) -> dict:
+        """本轮用户输入：语音按 model_audio_format 封装，以 input_audio 发送"""
+        if not audio_data:
+            return {"role": "user", "content": _REPLY_INSTRUCTION}
+
+        # FLAC编码与base64在线程中完成，不阻塞事件循环；
+        # 传入的可能是仍在写入的缓冲视图，先拷贝再交给线程
+        encoded, size = await asyncio.to_thread(self._encode_audio, bytes(audio_data))
+        self.audio_uploads += 1
+        self.audio_upload_bytes += size
+        audio_upload_bytes.inc(size)
+        return {
+            "role": "user",
+            "content": [
+                {
+                    "type": "input_audio",
+                    "input_audio": {"data": encoded, "format": self.audio_format}
+                },
+                {"type": "text", "text": _REPLY_INSTRUCTION}
+            ]
+        }
+
+    def _encode_audio(self, audio_data: bytes) -> tuple:
+        """编码为上传格式，返回 (base64文本, 编码后字节数)；在线程中执行，不改共享状态"""
+        audio_file = encode_container(
+            audio_data, settings.audio_sample_rate, self.audio_format
+        )
+        return base64.b64encode(audio_file).decode("ascii"), len(audio_file)
+
+    @staticmethod
+    def _audio_seconds(audio_data: bytes) -> float:
+        return len(audio_data) / 2 / settings.audio_sample_rate
+
+    def _history_message(self, audio_data: bytes) -> dict:
+        """写入对话记录的用户输入：只留文本占位"""
+        if not audio_data:
+            return {"role": "user", "content": _REPLY_INSTRUCTION}
+        seconds = self._audio_seconds(audio_data)
+        return {"role": "user", "content": f"（用户语音 {seconds:.1f}秒）"}
+
+    @staticmethod
+    def _context_message(user_message: dict) -> dict:
+        """写入上下文的用户输入：保留本轮已编码的语音，去掉回复要求"""
+        content = user_message["content"]
+        if isinstance(content, str):
+            return user_message
+        return {
+            "role": "user",
+            "content": [part for part in content if part["type"] == "input_audio"]
+        }
+
+    def _upload_gate(self, commit: asyncio.Future = None):
+        """推测生成时请求体整体发出，否则最后一个字节等 commit"""
+        return None if settings.speculative_prefill else commit
+
+    def _request_body(self, request: dict, commit: asyncio.Future = None):
+        """请求体字节；给定 commit 时为分块上传：先发出除最后一个字节外的
+        全部内容，commit 完成（端点确认）后再发出最后一个字节"""
+        body = json.dumps(request, ensure_ascii=False).encode("utf-8")
+        self.request_bytes += len(body)
+        if commit is None:
+            return body
+
+        async def chunks():
+            yield body[:-1]
+            await commit
+            yield body[-1:]
+
+        return chunks()
+
+    def _chat_request(
+        self,
+        history: dict,
+        user_message: dict,
+        stream: bool = False,
+        audio_seconds: float = 0.0
+    ) -> dict:
+        """构造对话请求体（消息按上下文预算组装）"""
+        request = {
+            "model": self.model,
+            "messages": history["context"].build(user_message, audio_seconds),
+            "max_tokens": 150
+        }
+        if stream:
+            request["stream"] = True
+        return request
+
+    def _append_reply(
+        self,
+        session_id: str,
+        history: dict,
+        audio_data: bytes,
+        user_message: dict,
+        reply: str
+    ):
+        """本轮写入历史：对话记录留文本占位，上下文保留用户语音"""
+        assistant_message = {
+            "role": "assistant",
+            "content": reply,
+            "tts_text": reply
+        }
+        history["messages"].extend([
+            self._history_message(audio_data), assistant_message
+        ])
+
+        context = history["context"]
+        context.add_turn(
+            [self._context_message(user_message), assistant_message],
+            self._audio_seconds(audio_data)
+        )
+        self._session_history.resize(session_id)
+        if context.needs_fold():
+            context.summary_task = asyncio.create_task(
+                self._summarize(session_id, context)
+            )
+
+    async def _summarize(self, session_id: str, context: ConversationContext):
+        """后台把较早的轮次折叠进滚动摘要"""
+        # 用户的话以原始语音交给摘要请求
+        content = [{
+            "type": "text",
+            "text": f"已有摘要：{context.summary or '无'}\n新增对话："
+        }]
+        for message in context.begin_fold():
+            speaker = "用户" if message["role"] == "user" else "助手"
+            if isinstance(message["content"], str):
+                content.append({"type": "text", "text": f"{speaker}：{message['content']}"})
+            else:
+                content.append({"type": "text", "text": f"{speaker}（语音）："})
+                content.extend(message["content"])
+        content.append({"type": "text", "text": "请输出合并后的摘要，不超过100字。"})
+        try:
+            response = await self.http_pool.post(
+                f"{self.base_url}/v1/chat/completions",
+                json={
+                    "model": self.model,
+                    "messages": [
+                        {
+                            "role": "system",
+                            "content": "你负责压缩电话对话记录，保留用户诉求、已确认的信息和待办事项。"
+                        },
+                        {"role": "user", "content": content}
+                    ],
+                    "max_tokens": settings.context_summary_max_tokens
+                }
+            )
+            response.raise_for_status()
+            summary = response.json()["choices"][0]["message"]["content"]
+            context.finish_fold(summary.strip())
+            self._session_history.resize(session_id)
+            logger.info(f"对话摘要已更新: {session_id} {len(summary)}字")
+        except asyncio.CancelledError:
+            context.abort_fold()
+            raise
+        except Exception as e:
+            context.abort_fold()
+            logger.warning(f"对话摘要失败: {session_id} {e}")
+        finally:
+            context.summary_task = None
+
+    async def stream_chat(
+        self,
+        session_id: str,
+        audio_data: bytes,
+        commit: asyncio.Future = None
+    ) -> AsyncGenerator[str, None]:
+        """流式对话：逐个产出模型token（SSE），结束后写入历史"""
+        history = self._session_history.get(session_id)
+        if history is None:
+            logger.error(f"会话不存在: {session_id}")
+            return
+
+        logger.info(f"处理音频(流式): {len(audio_data)} bytes")
+
+        user_message = await self._user_message(audio_data)
+        request = self._chat_request(
+            history,
+            user_message,
+            stream=True,
+            audio_seconds=self._audio_seconds(audio_data)
+        )
+        started = time.perf_counter()
+        tokens = []
+        async with self.http_pool.stream(
+            "POST",
+            f"{self.base_url}/v1/chat/completions",
+            content=self._request_body(request, self._upload_gate(commit)),
+            headers={"Content-Type": "application/json"}
+        ) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    break
+                choices = json.loads(data).get("choices") or [{}]
+                token = choices[0].get("delta", {}).get("content")
+                if token:
+                    tokens.append(token)
+                    yield token
+
+        elapsed = time.perf_counter() - started
+        chat_completion_seconds.observe(elapsed)
+        reply = "".join(tokens)
+        if commit is not None:
+            await commit
+        self._append_reply(session_id, history, audio_data, user_message, reply)
+        logger.bind(stage="chat", ms=round(elapsed * 1000)).info(
+            f"模型回复(流式): {reply[:100]}"
+        )
+
+    async def pipeline_response(
+        self,
+        session_id: str,
+        audio_data: bytes,
+        response_format: str = None,
+        commit: asyncio.Future = None
+    ) -> AsyncGenerator[bytes, None]:
+        """流水线模式：边生成token边按句合成语音，音频按句序产出
+
+        每句话切出后立即发起TTS，与后续token的生成并行；
+        输出端按句子顺序依次读取各句的音频队列。
+        """
+        sentence_queues: asyncio.Queue = asyncio.Queue()
+        tts_slots = asyncio.Semaphore(settings.pipeline_max_tts_concurrency)
+        tts_tasks = []
+
+        async def synthesize_into(sentence: str, queue: asyncio.Queue):
+            try:
+                async with tts_slots:
+                    async for chunk in self.synthesize_stream(
+                        sentence, response_format
+                    ):
+                        queue.put_nowait(chunk)
+            except Exception as e:
+                queue.put_nowait(e)
+            finally:
+                queue.put_nowait(None)
+
+        def start_tts(sentence: str):
+            queue = asyncio.Queue()
+            tts_tasks.append(
+                asyncio.create_task(synthesize_into(sentence, queue))
+            )
+            sentence_queues.put_nowait(queue)
+
+        async def produce():
+            segmenter = SentenceSegmenter()
+            try:
+                async for token in self.stream_chat(session_id, audio_data, commit):
+                    for sentence in segmenter.feed(token):
+                        start_tts(sentence)
+                tail = segmenter.flush()
+                if tail:
+                    start_tts(tail)
+            finally:
+                sentence_queues.put_nowait(None)
+
+        producer = asyncio.create_task(produce())
+        try:
+            while (queue := await sentence_queues.get()) is not None:
+                while (chunk := await queue.get()) is not None:
+                    if isinstance(chunk, Exception):
+                        raise chunk
+                    yield chunk
+            await producer
+
+        except Exception as e:
+            logger.error(f"流水线生成失败: {e}")
+            raise
+
+        finally:
+            for task in [producer] + tts_tasks:
+                task.cancel()
+
+    def _speech_request(self, text: str, response_format: str = None) -> dict:
+        """构造TTS请求体"""
+        return {
+            "model": self.model,
+            "input": text,
+            "voice": settings.tts_voice,
+            "response_format": response_format or settings.tts_response_format
+        }
+
+    def _tts_cache_key(self, text: str, response_format: str = None) -> str:
+        return cache_key(
+            text,
+            settings.tts_voice,
+            response_format or settings.tts_response_format,
+            self.model
+        )
+
+    async def synthesize_stream(
+        self,
+        text: str,
+        response_format: str = None
+    ) -> AsyncGenerator[bytes, None]:
+        """流式合成语音，音频块到达即产出（先查TTS缓存）
+
+        response_format 为空时使用 tts_response_format 配置。
+        """
+        key = self._tts_cache_key(text, response_format)
+        cached = await tts_cache.get(key)
+        if cached is not None:
+            chunk_size = settings.tts_stream_chunk_size
+            for i in range(0, len(cached), chunk_size):
+                yield cached[i:i + chunk_size]
+            return
+
+        started = time.perf_counter()
+        first_chunk = True
+        chunks = []
+
+        async with self.http_pool.stream(
+            "POST",
+            f"{self.base_url}/v1/audio/speech",
+            json=self._speech_request(text, response_format)
+        ) as response:
+            response.raise_for_status()
+            async for chunk in response.aiter_bytes(
+                chunk_size=settings.tts_stream_chunk_size
+            ):
+                if first_chunk:
+                    first_chunk = False
+                    ttfb = time.perf_counter() - started
+                    tts_first_byte_seconds.observe(ttfb)
+                    logger.bind(stage="tts_first_byte", ms=round(ttfb * 1000)).info(
+                        f"TTS首字节: {ttfb * 1000:.0f}ms"
+                    )
+                chunks.append(chunk)
+                yield chunk
+
+        # 只缓存完整合成的结果
+        tts_cache.put(key, b"".join(chunks))
+
     async def stream_response(
         self,
-        session_id: str
+        session_id: str,
+        response_format: str = None
     ) -> AsyncGenerator[bytes, None]:
         """流式接收音频响应 (使用TTS生成音频)"""
-        if session_id not in self._session_history:
+        history = self._session_history.get(session_id)
+        if history is None:
             logger.error(f"会话不存在: {session_id}")
             return
-
-        history = self._session_history[session_id]
         
         last_message = history["messages"][-1]
         tts_input = last_message.get("tts_text") or last_message.get("content", "")
 
         try:
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
-                response = await client.post(
-                    f"{self.base_url}/v1/audio/speech",
-                    json={
-                        "model": self.model,
-                        "input": tts_input,
-                        "voice": "alloy",
-                        "response_format": "mp3"
-                    }
-                )
-                response.raise_for_status()
-                # Yield the entire audio content as a single chunk
-                yield response.content
+            async for chunk in self.synthesize_stream(tts_input, response_format):
+                yield chunk
 
         except Exception as e:
             logger.error(f"生成语音失败: {e}")
             raise
 
-    async def cancel_generation(self, session_id: str):
-        """取消生成"""
-        logger.info(f"取消生成: {session_id}")
+    async def generate_response(
+        self,
+        session_id: str,
+        audio_data: bytes,
+        response_format: str = None,
+        commit: asyncio.Future = None
+    ) -> AsyncGenerator[bytes, None]:
+        """生成一轮回复音频：流水线模式或先对话后合成
 
-    async def generate_greeting(self, prompt: str) -> bytes:
-        """生成问候音频"""
+        response_format 指定TTS输出格式，为空时使用 tts_response_format 配置。
+        给定 commit 时对话请求提前上传，最后一个字节等 commit 完成后发出；
+        推测生成（speculative_prefill）时请求整体发出并开始生成，音频与历史
+        等 commit 完成后才输出和写入，未完成前取消即丢弃本轮。
+
+        消费本生成器的任务会登记到会话上，cancel_generation 取消该任务时
+        正在进行的对话、TTS请求随生成器关闭一并断开。
+        """
+        task = asyncio.current_task()
+        self._generations[session_id] = task
         try:
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
-                response = await client.post(
-                    f"{self.base_url}/v1/audio/speech",
-                    json={
-                        "model": self.model,
-                        "input": prompt,
-                        "voice": "alloy",
-                        "response_format": "mp3"
-                    }
+            if settings.pipeline_mode:
+                source = self.pipeline_response(
+                    session_id, audio_data, response_format, commit
                 )
-                response.raise_for_status()
-                return response.content
+            else:
+                await self.send_audio(session_id, audio_data, commit)
+                source = self.stream_response(session_id, response_format)
+            async with aclosing(source) as chunks:
+                async for chunk in chunks:
+                    if commit is not None and not commit.done():
+                        await commit
+                    yield chunk
+        finally:
+            if self._generations.get(session_id) is task:
+                del self._generations[session_id]
+
+    async def cancel_generation(self, session_id: str) -> bool:
+        """取消该会话进行中的生成，等待请求断开后返回是否有生成被取消"""
+        task = self._generations.pop(session_id, None)
+        if task is None or task.done() or task is asyncio.current_task():
+            return False
+        task.cancel()
+        await asyncio.wait([task])
+        self.cancelled_generations += 1
+        logger.info(f"取消生成: {session_id}")
+        return True
+
+    async def generate_greeting(self, text: str, response_format: str = None) -> bytes:
+        """生成问候音频（先查TTS缓存）"""
+        key = self._tts_cache_key(text, response_format)
+        cached = await tts_cache.get(key)
+        if cached is not None:
+            return cached
+
+        try:
+            response = await self.http_pool.post(
+                f"{self.base_url}/v1/audio/speech",
+                json=self._speech_request(text, response_format)
+            )
+            response.raise_for_status()
+            tts_cache.put(key, response.content)
+            return response.content
         except Exception as e:
             logger.error(f"生成问候失败: {e}")
             raise
 
+    def add_greeting(self, session_id: str, text: str):
+        """问候语写入会话历史，模型据此知道已经打过招呼"""
+        history = self._session_history.get(session_id)
+        if history is None:
+            return
+        message = {"role": "assistant", "content": text, "tts_text": text}
+        history["messages"].append(message)
+        history["context"].add_turn([message])
+        self._session_history.resize(session_id)
+
     async def get_conversation(self, session_id: str) -> list:
         """获取对话记录"""
-        if session_id in self._session_history:
-            return self._session_history[session_id]["messages"]
-        return []
+        history = self._session_history.get(session_id)
+        if history is None:
+            return []
+        return history["messages"]
+
+    def stats(self) -> dict:
+        """会话历史存储与语音上传指标"""
+        return {
+            **self._session_history.stats(),
+            "audio_format": self.audio_format,
+            "audio_uploads": self.audio_uploads,
+            "audio_upload_bytes": self.audio_upload_bytes,
+            "request_bytes": self.request_bytes
+        }
+
+
+model_client = ModelServiceClient()
@@ -0,0 +1,310 @@
+import asyncio
+import time
+from collections import deque
+from typing import Awaitable, Callable, List, Optional
+from app.config import settings
+from app.services.metrics import (
+    outbound_stalls,
+    outbound_tick_jitter_seconds,
+    outbound_underruns,
+    ws_send_seconds
+)
+from loguru import logger
+
+
+class CallOutbound:
+    """一路通话的出站音频：切成固定时长的帧，按实时节奏发送
+
+    以对端播放时钟为准：一段连续播放开始时立即发出 lead 帧预填对端
+    缓冲，之后由 OutboundScheduler 每格补帧，使已发送的音频始终领先
+    播放进度 lead 帧。数据没跟上、对端缓冲已播空时计一次欠载，lead
+    加一帧；连续 outbound_lead_decay_frames 帧无欠载后逐帧回落。
+    frame_bytes 为空（mp3 等压缩格式无法按字节分帧）时到达即发。
+
+    定时轮只把帧放进本路的发送队列，由本路的发送任务逐帧发出，对端
+    缓冲区满时只阻塞本路。单帧发送超过 outbound_send_timeout 秒或积压
+    超过 outbound_max_backlog_frames 帧时视为跟不上，丢弃未发出的音频。
+    """
+
+    def __init__(
+        self,
+        scheduler: "OutboundScheduler",
+        send: Callable[[bytes], Awaitable],
+        frame_bytes: Optional[int]
+    ):
+        self.scheduler = scheduler
+        self._send = send
+        self.frame_bytes = frame_bytes
+        self.frame_seconds = scheduler.tick_seconds
+        self.min_lead_frames = settings.outbound_lead_frames
+        self.lead_frames = self.min_lead_frames
+
+        self._buffer = bytearray()
+        self._finishing = False
+        self._drained = asyncio.Event()
+        self._drained.set()
+        # 当前连续播放段：开始时刻与已发送帧数
+        self._spurt_start: Optional[float] = None
+        self._spurt_frames = 0
+        self._steady_frames = 0
+        self._due_tick: Optional[int] = None
+        # 已出帧、等待发送任务发出的帧
+        self._outbox = deque()
+        self._outbox_ready = asyncio.Event()
+        self._sent = asyncio.Event()
+        self._sent.set()
+        self._sender: Optional[asyncio.Task] = None
+
+        # 每路指标
+        self.frames_sent = 0
+        self.bytes_queued = 0
+        self.bytes_sent = 0
+        self.underruns = 0
+        self.stalls = 0
+        self.flushed_bytes = 0
+        self.max_late_ms = 0.0
+
+    @property
+    def paced(self) -> bool:
+        return self.frame_bytes is not None
+
+    async def write(self, data: bytes):
+        """写入一段回复音频；不在播放中时立即发出 lead 帧"""
+        if not self.paced:
+            self.bytes_queued += len(data)
+            await self._timed_send(data)
+            return
+        self._buffer += data
+        self._drained.clear()
+        if self._due_tick is None:
+            self._pump()
+
+    async def finish(self):
+        """本轮音频已全部写入：不足一帧的尾部也发出"""
+        if not self.paced or self._drained.is_set():
+            return
+        self._finishing = True
+        if self._due_tick is None:
+            self._pump()
+
+    async def drain(self):
+        """等待已写入的音频全部发出"""
+        await self._drained.wait()
+        await self._sent.wait()
+
+    def flush(self) -> int:
+        """插话时立即丢弃尚未发出的音频（含发送队列中的帧），返回丢弃的字节数"""
+        dropped = len(self._buffer) + sum(len(chunk) for chunk in self._outbox)
+        self.flushed_bytes += dropped
+        self._buffer.clear()
+        self._outbox.clear()
+        if self._sender is None or self._sender.done():
+            self._sent.set()
+        self._end_spurt()
+        return dropped
+
+    def _end_spurt(self):
+        self._spurt_start = None
+        self._finishing = False
+        self._due_tick = None
+        self._drained.set()
+
+    async def _timed_send(self, data: bytes):
+        started = time.perf_counter()
+        await self._send(data)
+        ws_send_seconds.observe(time.perf_counter() - started)
+        self.bytes_sent += len(data)
+
+    def _enqueue(self, chunk: bytes):
+        if len(self._outbox) >= settings.outbound_max_backlog_frames:
+            self._stall("发送积压")
+            return
+        self._outbox.append(chunk)
+        self.bytes_queued += len(chunk)
+        self._sent.clear()
+        self._outbox_ready.set()
+        if self._sender is None or self._sender.done():
+            self._sender = asyncio.create_task(self._send_loop())
+
+    async def _send_loop(self):
+        """本路的发送任务：逐帧发出发送队列中的帧"""
+        while True:
+            await self._outbox_ready.wait()
+            while self._outbox:
+                chunk = self._outbox.popleft()
+                try:
+                    await asyncio.wait_for(
+                        self._timed_send(chunk), settings.outbound_send_timeout
+                    )
+                except asyncio.TimeoutError:
+                    self._stall("发送超时")
+                except Exception as e:
+                    logger.warning(f"出站发送失败: {e}")
+                    self.flush()
+            self._outbox_ready.clear()
+            self._sent.set()
+
+    def _stall(self, reason: str):
+        """对端跟不上：丢弃未发出的音频，不影响其他通话"""
+        self.stalls += 1
+        outbound_stalls.inc()
+        dropped = self.flush()
+        logger.warning(f"出站{reason}，丢弃 {dropped} 字节")
+
+    def _pump(self):
+        """补帧到领先 lead 帧为止；仍在播放时挂到定时轮的下一格"""
+        now = time.perf_counter()
+        frame = self.frame_bytes
+        if self._spurt_start is not None:
+            ahead = self._spurt_start + self._spurt_frames * self.frame_seconds - now
+            if ahead < 0 and (self._buffer or not self._finishing):
+                # 对端缓冲已播空：数据没跟上或发送循环被阻塞
+                self.underruns += 1
+                outbound_underruns.inc()
+                self.lead_frames = min(
+                    self.lead_frames + 1, settings.outbound_max_lead_frames
+                )
+                self._steady_frames = 0
+                self.max_late_ms = max(self.max_late_ms, -ahead * 1000)
+                self._spurt_start = None
+
+        while len(self._buffer) >= frame or (self._finishing and self._buffer):
+            if self._spurt_start is None:
+                self._spurt_start = now
+                self._spurt_frames = 0
+            elif (
+                self._spurt_start + self._spurt_frames * self.frame_seconds - now
+                >= self.lead_frames * self.frame_seconds
+            ):
+                break
+            chunk = bytes(self._buffer[:frame])
+            del self._buffer[:frame]
+            self._spurt_frames += 1
+            self.frames_sent += 1
+            self._steady_frames += 1
+            if (
+                self._steady_frames >= settings.outbound_lead_decay_frames
+                and self.lead_frames > self.min_lead_frames
+            ):
+                self.lead_frames -= 1
+                self._steady_frames = 0
+            self._enqueue(chunk)
+            if self._spurt_start is None:
+                # 积压被丢弃
+                return
+
+        if self._finishing and not self._buffer:
+            self._end_spurt()
+        elif self._spurt_start is not None:
+            self.scheduler.schedule(self)
+        else:
+            self._due_tick = None
+
+    def close(self):
+        self.flush()
+        if self._sender is not None:
+            self._sender.cancel()
+
+    def stats(self) -> dict:
+        return {
+            "paced": self.paced,
+            "frames_sent": self.frames_sent,
+            "bytes_sent": self.bytes_sent,
+            "underruns": self.underruns,
+            "stalls": self.stalls,
+            "flushed_bytes": self.flushed_bytes,
+            "lead_frames": self.lead_frames,
+            "max_late_ms": round(self.max_late_ms, 1)
+        }
+
+
+class OutboundScheduler:
+    """所有通话共用的出站定时轮
+
+    一个后台任务以 outbound_frame_ms 为一格推进，每格只处理挂在该格上
+    的通话（补帧后挂到下一格），空闲通话不占用定时器，没有通话在播放
+    时任务退出。按绝对时刻睡眠，不累积漂移，每格醒来的延迟计入抖动。
+    补帧只入各路的发送队列，定时轮本身不等待网络。
+    """
+
+    def __init__(self, frame_ms: int = None, slots: int = 64):
+        self.frame_ms = frame_ms or settings.outbound_frame_ms
+        self.tick_seconds = self.frame_ms / 1000
+        self._wheel: List[List[CallOutbound]] = [[] for _ in range(slots)]
+        self._scheduled = 0
+        self._tick = 0
+        self._task: Optional[asyncio.Task] = None
+
+        # 发送循环指标
+        self.ticks = 0
+        self.jitter_total = 0.0
+        self.max_jitter = 0.0
+
+    def frame_bytes(self, sample_rate: int, sample_width: int) -> Optional[int]:
+        """一帧的字节数；关闭节奏控制时为 None"""
+        if not settings.outbound_pacing:
+            return None
+        return sample_rate * self.frame_ms // 1000 * sample_width
+
+    def create(
+        self,
+        send: Callable[[bytes], Awaitable],
+        frame_bytes: Optional[int]
+    ) -> CallOutbound:
+        return CallOutbound(self, send, frame_bytes)
+
+    def schedule(self, call: CallOutbound, ticks: int = 1):
+        """把通话挂到 ticks 格之后"""
+        call._due_tick = self._tick + ticks
+        self._wheel[call._due_tick % len(self._wheel)].append(call)
+        self._scheduled += 1
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        started = time.perf_counter()
+        base_tick = self._tick
+        while self._scheduled:
+            due = started + (self._tick + 1 - base_tick) * self.tick_seconds
+            delay = due - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            jitter = max(time.perf_counter() - due, 0.0)
+            outbound_tick_jitter_seconds.observe(jitter)
+            self.ticks += 1
+            self.jitter_total += jitter
+            self.max_jitter = max(self.max_jitter, jitter)
+            if jitter > self.tick_seconds:
+                # 每格一次的高频日志，按 log_sample_rate 抽样
+                logger.bind(sample="outbound_late_tick").warning(
+                    f"出站定时轮延迟: {jitter * 1000:.1f}ms"
+                )
+
+            self._tick += 1
+            slot = self._tick % len(self._wheel)
+            bucket, self._wheel[slot] = self._wheel[slot], []
+            self._scheduled -= len(bucket)
+            for call in bucket:
+                # 挂上后被清空或已改挂其他格的跳过
+                if call._due_tick != self._tick:
+                    continue
+                call._due_tick = None
+                try:
+                    call._pump()
+                except Exception as e:
+                    logger.warning(f"出站补帧失败: {e}")
+                    call.flush()
+
+    def stats(self) -> dict:
+        return {
+            "frame_ms": self.frame_ms,
+            "scheduled_calls": self._scheduled,
+            "ticks": self.ticks,
+            "jitter_ms_avg": round(
+                self.jitter_total / self.ticks * 1000, 3
+            ) if self.ticks else 0.0,
+            "jitter_ms_max": round(self.max_jitter * 1000, 3)
+        }
+
+
+outbound_scheduler = OutboundScheduler()
@@ -0,0 +1,269 @@
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import List, Optional
+from sqlalchemy import create_engine, event, func, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.models.tables import CallRecord, MessageRecord
+from loguru import logger
+
+_MIGRATIONS_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+    "migrations"
+)
+
+
+def _enable_sqlite_wal(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.close()
+
+
+def _call_dict(record: CallRecord) -> dict:
+    return {
+        "call_id": record.call_id,
+        "phone_number": record.phone_number,
+        "status": record.status,
+        "prompt": record.prompt,
+        "created_at": record.created_at,
+        "ended_at": record.ended_at,
+        "duration": record.duration
+    }
+
+
+class ConversationStore:
+    """呼叫与对话记录的持久化（write-behind）
+
+    请求路径上只把写操作放入内存队列，由后台线程按批（最多 batch_size
+    条或等待 flush_interval 秒）合并为一个事务提交；SQLite 开启WAL，
+    读查询不会被写事务阻塞。
+    """
+
+    def __init__(self, database_url: str = None):
+        self.database_url = database_url or settings.database_url
+        self.enabled = settings.database_enabled
+        self.batch_size = settings.database_write_batch
+        self.flush_interval = settings.database_flush_interval
+        self.max_pending = settings.database_queue_size
+
+        self.engine: Optional[Engine] = None
+        self._items = deque()
+        self._condition = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+
+        # 写入指标
+        self.writes_total = 0
+        self.writes_dropped = 0
+        self.batches = 0
+        self.batch_ms_max = 0.0
+        self.errors = 0
+
+    def start(self):
+        """建立连接、执行迁移并启动写线程"""
+        if self._thread is not None or not self.enabled:
+            return
+
+        if self.database_url.startswith("sqlite:///"):
+            directory = os.path.dirname(self.database_url[len("sqlite:///"):])
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+
+        self.engine = create_engine(self.database_url)
+        if self.engine.dialect.name == "sqlite":
+            event.listen(self.engine, "connect", _enable_sqlite_wal)
+        self._migrate()
+
+        self._stopping = False
+        self._thread = threading.Thread(
+            target=self._run, name="conversation-store", daemon=True
+        )
+        self._thread.start()
+        logger.info(f"对话存储已启动: {self.engine.url.render_as_string()}")
+
+    def _migrate(self):
+        from alembic import command
+        from alembic.config import Config
+
+        config = Config()
+        config.set_main_option("script_location", _MIGRATIONS_DIR)
+        with self.engine.begin() as connection:
+            config.attributes["connection"] = connection
+            command.upgrade(config, "head")
+
+    def stop(self, timeout: float = 10.0):
+        """提交队列中剩余的写操作后关闭"""
+        if self._thread is None:
+            return
+        with self._condition:
+            self._stopping = True
+            self._condition.notify()
+        self._thread.join(timeout)
+        self._thread = None
+        self.engine.dispose()
+        self.engine = None
+
+    @property
+    def available(self) -> bool:
+        """是否已连接数据库（可查询）"""
+        return self.engine is not None
+
+    def _submit(self, kind: str, *args):
+        if self._thread is None:
+            return
+        with self._condition:
+            if len(self._items) >= self.max_pending:
+                self.writes_dropped += 1
+                logger.error(f"对话存储队列已满，丢弃写入: {kind} {args[0]}")
+                return
+            self._items.append((kind, args))
+            if len(self._items) >= self.batch_size:
+                self._condition.notify()
+
+    def save_call(self, call_id: str, **fields):
+        """新增或更新呼叫记录（非阻塞）"""
+        self._submit("call", call_id, fields)
+
+    def save_messages(self, call_id: str, messages: List[dict]):
+        """追加对话消息（非阻塞）
+
+        序号在写入时接在该通话已存消息之后，重连或换worker后重建的会话
+        不会覆盖之前连接的消息。
+        """
+        if messages:
+            self._submit("messages", call_id, messages, datetime.now())
+
+    def _run(self):
+        while True:
+            with self._condition:
+                deadline = time.monotonic() + self.flush_interval
+                while len(self._items) < self.batch_size and not self._stopping:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+                if not self._items:
+                    if self._stopping:
+                        break
+                    continue
+                batch = [
+                    self._items.popleft()
+                    for _ in range(min(self.batch_size, len(self._items)))
+                ]
+
+            started = time.perf_counter()
+            try:
+                with Session(self.engine) as session, session.begin():
+                    for kind, args in batch:
+                        if kind == "call":
+                            self._apply_call(session, *args)
+                        else:
+                            self._apply_messages(session, *args)
+                self.writes_total += len(batch)
+                self.batches += 1
+                self.batch_ms_max = max(
+                    self.batch_ms_max, (time.perf_counter() - started) * 1000
+                )
+            except Exception as e:
+                self.errors += 1
+                logger.error(f"对话存储写入失败({len(batch)}条): {e}")
+
+    def _apply_call(self, session: Session, call_id: str, fields: dict):
+        record = session.get(CallRecord, call_id)
+        if record is None:
+            fields.setdefault("status", "connected")
+            fields.setdefault("created_at", datetime.now())
+            record = CallRecord(call_id=call_id)
+            session.add(record)
+        for name, value in fields.items():
+            setattr(record, name, value)
+
+    def _apply_messages(
+        self,
+        session: Session,
+        call_id: str,
+        messages: List[dict],
+        created_at: datetime
+    ):
+        if session.get(CallRecord, call_id) is None:
+            self._apply_call(session, call_id, {})
+            session.flush()
+        # 查询前自动 flush，同一批内先写入的消息也计入
+        last_seq = session.scalar(
+            select(func.max(MessageRecord.seq)).where(MessageRecord.call_id == call_id)
+        )
+        first_seq = 0 if last_seq is None else last_seq + 1
+        for offset, message in enumerate(messages):
+            session.add(MessageRecord(
+                call_id=call_id,
+                seq=first_seq + offset,
+                role=message["role"],
+                content=message.get("content") or "",
+                created_at=created_at
+            ))
+
+    def find_calls(
+        self,
+        phone_number: str = None,
+        status: str = None,
+        start: datetime = None,
+        end: datetime = None,
+        limit: int = 100
+    ) -> List[dict]:
+        """按号码、状态、时间范围查询呼叫记录（按创建时间倒序）"""
+        query = select(CallRecord)
+        if phone_number:
+            query = query.where(CallRecord.phone_number == phone_number)
+        if status:
+            query = query.where(CallRecord.status == status)
+        if start:
+            query = query.where(CallRecord.created_at >= start)
+        if end:
+            query = query.where(CallRecord.created_at < end)
+        query = query.order_by(CallRecord.created_at.desc()).limit(limit)
+
+        with Session(self.engine) as session:
+            return [_call_dict(record) for record in session.scalars(query)]
+
+    def get_call(self, call_id: str) -> Optional[dict]:
+        """查询单个呼叫记录"""
+        with Session(self.engine) as session:
+            record = session.get(CallRecord, call_id)
+            return _call_dict(record) if record is not None else None
+
+    def get_messages(self, call_id: str) -> List[dict]:
+        """查询通话的全部消息"""
+        query = (
+            select(MessageRecord)
+            .where(MessageRecord.call_id == call_id)
+            .order_by(MessageRecord.seq)
+        )
+        with Session(self.engine) as session:
+            return [
+                {
+                    "role": record.role,
+                    "content": record.content,
+                    "timestamp": record.created_at
+                }
+                for record in session.scalars(query)
+            ]
+
+    def stats(self) -> dict:
+        """写入指标"""
+        return {
+            "enabled": self.enabled,
+            "queue_depth": len(self._items),
+            "writes_total": self.writes_total,
+            "writes_dropped": self.writes_dropped,
+            "batches": self.batches,
+            "batch_ms_max": round(self.batch_ms_max, 3),
+            "errors": self.errors
+        }
+
+
+conversation_store = ConversationStore()
@@ -1,13 +1,25 @@
-from typing import Dict, List
+from typing import Dict, List, Optional
 from datetime import datetime
+from app.config import settings
 from app.models.conversation import Conversation, Message
-from app.services.model_client import ModelServiceClient
+from app.services.model_client import model_client
+from app.services.session_store import BoundedSessionStore
+from app.services.persistence import conversation_store
+from app.services.metrics import metrics_registry
 from loguru import logger
 
 class SessionManager:
     def __init__(self):
-        self.sessions: Dict[str, Conversation] = {}
-        self.model_client = ModelServiceClient()
+        # call_id -> Conversation，空闲过期或超过上限时淘汰
+        self.sessions = BoundedSessionStore(
+            "会话",
+            max_entries=settings.session_max_entries,
+            ttl_seconds=settings.session_ttl_seconds,
+            on_evict=self._on_evict
+        )
+        # remote_session_id -> call_id
+        self._remote_index: Dict[str, str] = {}
+        self.model_client = model_client
         
     async def create_session(
         self, 
@@ -27,7 +39,11 @@ class SessionManager:
                 created_at=datetime.now()
             )
             
-            self.sessions[call_id] = session
+            previous = self.sessions.pop(call_id)
+            if previous is not None:
+                self._release(previous)
+            self.sessions.set(call_id, session)
+            self._remote_index[remote_session_id] = call_id
             logger.info(f"会话创建成功: {call_id}")
             return session
             
@@ -35,22 +51,71 @@ class SessionManager:
             logger.error(f"创建会话失败: {e}")
             raise
     
-    def get_session(self, call_id: str) -> Conversation:
+    def get_session(self, call_id: str) -> Optional[Conversation]:
         """获取会话"""
         return self.sessions.get(call_id)
     
+    def get_session_by_remote_id(
+        self, 
+        remote_session_id: str
+    ) -> Optional[Conversation]:
+        """按远程会话ID获取会话"""
+        call_id = self._remote_index.get(remote_session_id)
+        if call_id is None:
+            return None
+        return self.sessions.get(call_id)
+    
     def update_history(
         self, 
         call_id: str, 
         messages: List[Message]
     ):
-        """更新对话历史"""
-        if call_id in self.sessions:
-            self.sessions[call_id].messages.extend(messages)
-            self.sessions[call_id].updated_at = datetime.now()
+        """更新对话历史（messages 为完整历史，直接引用不复制）"""
+        session = self.sessions.get(call_id)
+        if session is not None:
+            session.messages = messages
+            session.updated_at = datetime.now()
+            # 只把新增的消息交给后台写入
+            conversation_store.save_messages(
+                call_id, messages[session._persisted_count:]
+            )
+            session._persisted_count = len(messages)
     
     async def cleanup_session(self, call_id: str):
         """清理会话"""
-        if call_id in self.sessions:
-            del self.sessions[call_id]
+        session = self.sessions.pop(call_id)
+        if session is not None:
+            self._release(session)
             logger.info(f"会话已清理: {call_id}")
+    
+    def discard_session(self, call_id: str, session: Conversation):
+        """释放未被使用的会话（如预热过期）；call_id 已换成其他会话时不动"""
+        if self.sessions.get(call_id, touch=False) is session:
+            self.sessions.pop(call_id)
+            self._release(session)
+    
+    def _release(self, session: Conversation):
+        self._remote_index.pop(session.remote_session_id, None)
+        self.model_client.close_session(session.remote_session_id)
+    
+    def _on_evict(self, call_id: str, session: Conversation):
+        self._release(session)
+    
+    def stats(self) -> dict:
+        """会话与会话历史的存储指标"""
+        return {
+            "sessions": self.sessions.stats(),
+            "history": self.model_client.stats()
+        }
+
+
+session_manager = SessionManager()
+
+metrics_registry.gauge(
+    "active_sessions", "Sessions in the session store", lambda: len(session_manager.sessions)
+)
+metrics_registry.gauge(
+    "session_history_bytes",
+    "Estimated bytes of conversation history held in memory",
+    lambda: session_manager.model_client.stats()["resident_bytes"]
+)
@@ -0,0 +1,157 @@
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable
+from loguru import logger
+
+
+class BoundedSessionStore:
+    """有界会话存储：LRU + 空闲TTL + 内存上限
+
+    条目按最近访问顺序排列，get / set 都是O(1)。写入时从最久未访问
+    的一端淘汰过期条目，再按条目数、估算字节数上限淘汰；被淘汰的
+    条目会回调 on_evict(key, value)。
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_entries: int,
+        ttl_seconds: float = 0,
+        max_bytes: int = 0,
+        sizeof: Callable[[Any], int] = None,
+        on_evict: Callable[[Hashable, Any], None] = None,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.on_evict = on_evict
+        self.clock = clock
+
+        # key -> [value, last_access, size]
+        self._entries: "OrderedDict[Hashable, list]" = OrderedDict()
+        self.resident_bytes = 0
+
+        # 存储指标
+        self.hits = 0
+        self.misses = 0
+        self.evicted_lru = 0
+        self.evicted_ttl = 0
+        self.evicted_bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        entry = self._entries.get(key)
+        if entry is None:
+            return False
+        return not self.ttl_seconds or self.clock() - entry[1] <= self.ttl_seconds
+
+    def get(self, key: Hashable, default=None, touch: bool = True):
+        """取值；touch 时刷新访问时间与LRU顺序，已过期的条目视为不存在"""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+
+        now = self.clock()
+        if self.ttl_seconds and now - entry[1] > self.ttl_seconds:
+            self._evict(key, "ttl")
+            self.misses += 1
+            return default
+
+        if touch:
+            entry[1] = now
+            self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def set(self, key: Hashable, value):
+        """写入或替换，并按需淘汰"""
+        size = self.sizeof(value) if self.sizeof else 0
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self.resident_bytes -= old[2]
+        self._entries[key] = [value, self.clock(), size]
+        self.resident_bytes += size
+        self._enforce_limits(keep=key)
+
+    def resize(self, key: Hashable):
+        """条目内容原地变化后重新估算大小"""
+        entry = self._entries.get(key)
+        if entry is None or self.sizeof is None:
+            return
+        size = self.sizeof(entry[0])
+        self.resident_bytes += size - entry[2]
+        entry[2] = size
+        self._enforce_limits(keep=key)
+
+    def pop(self, key: Hashable, default=None):
+        """移除条目（不触发 on_evict）"""
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return default
+        self.resident_bytes -= entry[2]
+        return entry[0]
+
+    def evict_expired(self) -> int:
+        """淘汰所有空闲超过TTL的条目，返回淘汰数"""
+        if not self.ttl_seconds:
+            return 0
+        deadline = self.clock() - self.ttl_seconds
+        evicted = 0
+        while self._entries:
+            key, entry = next(iter(self._entries.items()))
+            if entry[1] >= deadline:
+                break
+            self._evict(key, "ttl")
+            evicted += 1
+        return evicted
+
+    def _enforce_limits(self, keep: Hashable):
+        self.evict_expired()
+        while len(self._entries) > self.max_entries:
+            if not self._evict_oldest(keep, "lru"):
+                break
+        while self.max_bytes and self.resident_bytes > self.max_bytes:
+            if not self._evict_oldest(keep, "bytes"):
+                break
+
+    def _evict_oldest(self, keep: Hashable, reason: str) -> bool:
+        key = next(iter(self._entries))
+        if key == keep:
+            return False
+        self._evict(key, reason)
+        return True
+
+    def _evict(self, key: Hashable, reason: str):
+        value = self.pop(key)
+        if reason == "ttl":
+            self.evicted_ttl += 1
+        elif reason == "bytes":
+            self.evicted_bytes += 1
+        else:
+            self.evicted_lru += 1
+        logger.info(f"{self.name}淘汰: {key} ({reason})")
+        if self.on_evict is not None:
+            try:
+                self.on_evict(key, value)
+            except Exception as e:
+                logger.error(f"{self.name}淘汰回调失败: {key} {e}")
+
+    def stats(self) -> dict:
+        """存储指标"""
+        return {
+            "entries": len(self._entries),
+            "resident_bytes": self.resident_bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evicted_lru": self.evicted_lru,
+            "evicted_ttl": self.evicted_ttl,
+            "evicted_bytes": self.evicted_bytes
+        }
@@ -0,0 +1,221 @@
+import asyncio
+import hashlib
+import os
+import re
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, Optional
+from app.config import settings
+from loguru import logger
+
+# 只有两侧都是英文字母或数字的空白才影响读音，保留为一个空格
+_SIGNIFICANT_WHITESPACE = re.compile(r"(?<=[A-Za-z0-9])\s+(?=[A-Za-z0-9])")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """缓存用的文本归一化：全半角统一、去掉不影响读音的空白、英文小写"""
+    text = unicodedata.normalize("NFKC", text)
+    text = _SIGNIFICANT_WHITESPACE.sub("\0", text)
+    return _WHITESPACE.sub("", text).replace("\0", " ").lower()
+
+
+def cache_key(text: str, voice: str, audio_format: str, model: str) -> str:
+    """按 (归一化文本, 音色, 格式, 模型) 计算内容地址"""
+    material = "\0".join([normalize_text(text), voice, audio_format, model])
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class TTSCache:
+    """TTS结果缓存
+
+    内存层按总字节数做LRU淘汰；可选磁盘层（tts_cache_dir）以内容地址
+    存文件，启动时在线程中扫描建立索引（用于容量淘汰），查询时在线程中
+    按路径读取，命中后提升到内存层；事件循环上不做文件IO。多worker共用
+    同一目录时可互相命中。
+    """
+
+    def __init__(self, cache_dir: str = None):
+        self.enabled = settings.tts_cache_enabled
+        self.max_bytes = settings.tts_cache_max_bytes
+        self.max_item_bytes = settings.tts_cache_max_item_bytes
+        self.cache_dir = settings.tts_cache_dir if cache_dir is None else cache_dir
+        self.disk_max_bytes = settings.tts_cache_disk_max_bytes
+
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self.memory_bytes = 0
+        # key -> 文件大小，按最近写入/命中排序；start 扫描完成前为空
+        self._disk: Optional["OrderedDict[str, int]"] = None
+        self.disk_bytes = 0
+        self._pending_writes: Dict[str, asyncio.Task] = {}
+
+        # 缓存指标
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.bytes_served = 0
+        self.evictions = 0
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.audio")
+
+    async def start(self):
+        """在线程中扫描磁盘层建立索引（服务启动时调用）"""
+        if not self.enabled or not self.cache_dir or self._disk is not None:
+            return
+        self._disk = await asyncio.to_thread(self._scan_disk, self.cache_dir)
+        self.disk_bytes = sum(self._disk.values())
+        logger.info(f"TTS磁盘缓存: {len(self._disk)} 条, {self.disk_bytes} 字节")
+
+    @staticmethod
+    def _scan_disk(cache_dir: str) -> "OrderedDict[str, int]":
+        """按修改时间排序的磁盘层索引"""
+        entries = []
+        if os.path.isdir(cache_dir):
+            for root, _, files in os.walk(cache_dir):
+                for name in files:
+                    if name.endswith(".audio"):
+                        stat = os.stat(os.path.join(root, name))
+                        entries.append((stat.st_mtime, name[:-6], stat.st_size))
+        entries.sort()
+        return OrderedDict((key, size) for _, key, size in entries)
+
+    async def get(self, key: str) -> Optional[bytes]:
+        """查询缓存；磁盘层命中在线程中读出，并提升到内存层"""
+        if not self.enabled:
+            return None
+
+        audio = self._memory.get(key)
+        if audio is not None:
+            self._memory.move_to_end(key)
+            self.memory_hits += 1
+            self.bytes_served += len(audio)
+            return audio
+
+        if self.cache_dir:
+            # 索引只在启动时扫描，其他worker之后写入的文件不在索引中，
+            # 因此按路径直接读取
+            try:
+                audio = await asyncio.to_thread(self._read_file, self._path(key))
+            except OSError as e:
+                if not isinstance(e, FileNotFoundError):
+                    logger.warning(f"TTS磁盘缓存读取失败: {key} {e}")
+                self._unindex(key)
+            else:
+                self._index(key, len(audio))
+                self.disk_hits += 1
+                self.bytes_served += len(audio)
+                self._remember(key, audio)
+                return audio
+
+        self.misses += 1
+        return None
+
+    def put(self, key: str, audio: bytes):
+        """写入内存层；开启磁盘层时在后台线程落盘"""
+        if not self.enabled or not audio or len(audio) > self.max_item_bytes:
+            return
+        self._remember(key, audio)
+
+        if (
+            self.cache_dir
+            and (self._disk is None or key not in self._disk)
+            and key not in self._pending_writes
+        ):
+            self._pending_writes[key] = asyncio.get_running_loop().create_task(
+                self._store_disk(key, audio)
+            )
+
+    def _remember(self, key: str, audio: bytes):
+        """写入内存层并按总字节数淘汰"""
+        if len(audio) > self.max_item_bytes:
+            return
+        old = self._memory.pop(key, None)
+        if old is not None:
+            self.memory_bytes -= len(old)
+        self._memory[key] = audio
+        self.memory_bytes += len(audio)
+        while self.memory_bytes > self.max_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self.memory_bytes -= len(evicted)
+            self.evictions += 1
+
+    async def _store_disk(self, key: str, audio: bytes):
+        try:
+            await asyncio.to_thread(self._write_file, self._path(key), audio)
+        except OSError as e:
+            logger.warning(f"TTS磁盘缓存写入失败: {key} {e}")
+            return
+        finally:
+            self._pending_writes.pop(key, None)
+
+        disk = self._disk
+        if disk is None:
+            # 磁盘层尚未扫描：文件已落盘，扫描时计入
+            return
+        self._index(key, len(audio))
+        evicted = []
+        while self.disk_bytes > self.disk_max_bytes and len(disk) > 1:
+            evicted_key, size = disk.popitem(last=False)
+            self.disk_bytes -= size
+            evicted.append(self._path(evicted_key))
+        if evicted:
+            await asyncio.to_thread(self._remove_files, evicted)
+
+    def _index(self, key: str, size: int):
+        """记录（或刷新）磁盘层条目，移到最近使用端"""
+        if self._disk is None:
+            return
+        self.disk_bytes += size - self._disk.pop(key, 0)
+        self._disk[key] = size
+
+    def _unindex(self, key: str):
+        if self._disk is not None and key in self._disk:
+            self.disk_bytes -= self._disk.pop(key)
+
+    @staticmethod
+    def _read_file(path: str) -> bytes:
+        with open(path, "rb") as f:
+            return f.read()
+
+    @staticmethod
+    def _write_file(path: str, audio: bytes):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(audio)
+        os.replace(temp_path, path)
+
+    @staticmethod
+    def _remove_files(paths: list):
+        for path in paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    async def flush(self):
+        """等待进行中的磁盘写入完成"""
+        if self._pending_writes:
+            await asyncio.gather(*list(self._pending_writes.values()))
+
+    def stats(self) -> dict:
+        """缓存指标"""
+        hits = self.memory_hits + self.disk_hits
+        lookups = hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "memory_entries": len(self._memory),
+            "memory_bytes": self.memory_bytes,
+            "disk_entries": len(self._disk) if self._disk is not None else 0,
+            "disk_bytes": self.disk_bytes,
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "bytes_served": self.bytes_served,
+            "evictions": self.evictions
+        }
+
+
+tts_cache = TTSCache()
@@ -0,0 +1,101 @@
+from typing import Optional
+from app.config import settings
+
+
+class UtteranceBuffer:
+    """每路通话预分配的语音环形缓冲
+
+    所有处理后的音频都写入环形区，语音开始时按VAD给出的采样点偏移
+    向前保留 pre-roll，语音结束时以 memoryview 取出整段话，不做拷贝。
+    环形区按镜像方式存两份（总长 2 × capacity），任意不超过 capacity
+    的区间在内存中都是连续的。取出的视图在继续写入 capacity 字节前有效。
+    """
+
+    def __init__(
+        self,
+        max_utterance_ms: int = None,
+        preroll_ms: int = None,
+        sample_rate: int = None
+    ):
+        sample_rate = sample_rate or settings.audio_sample_rate
+        max_utterance_ms = max_utterance_ms or settings.max_utterance_ms
+        if preroll_ms is None:
+            preroll_ms = settings.vad_preroll_ms
+        bytes_per_ms = sample_rate * 2 // 1000
+
+        self.max_utterance_bytes = max_utterance_ms * bytes_per_ms
+        self.preroll_bytes = preroll_ms * bytes_per_ms
+        self.capacity = self.max_utterance_bytes + self.preroll_bytes
+        self._buffer = bytearray(2 * self.capacity)
+        self._view = memoryview(self._buffer)
+        self._written = 0
+        self._start: Optional[int] = None
+
+    @property
+    def nbytes(self) -> int:
+        """预分配的字节数"""
+        return len(self._buffer)
+
+    @property
+    def active(self) -> bool:
+        """是否处于一段话中"""
+        return self._start is not None
+
+    @property
+    def length(self) -> int:
+        """当前这段话的字节数（含pre-roll）"""
+        if self._start is None:
+            return 0
+        return self._written - self._start
+
+    @property
+    def full(self) -> bool:
+        """当前这段话是否已达到最大长度"""
+        return self.length >= self.max_utterance_bytes
+
+    def write(self, chunk: bytes):
+        """写入一块处理后的音频"""
+        size = len(chunk)
+        if size > self.capacity:
+            chunk = chunk[size - self.capacity:]
+            self._written += size - self.capacity
+            size = self.capacity
+
+        position = self._written % self.capacity
+        self._view[position:position + size] = chunk
+        mirror = position + self.capacity
+        if mirror + size <= 2 * self.capacity:
+            self._view[mirror:mirror + size] = chunk
+        else:
+            head = 2 * self.capacity - mirror
+            chunk = memoryview(chunk)
+            self._view[mirror:] = chunk[:head]
+            self._view[:size - head] = chunk[head:]
+        self._written += size
+
+    def begin(self, sample_offset: int):
+        """语音开始：从 sample_offset 向前保留 pre-roll"""
+        start = sample_offset * 2 - self.preroll_bytes
+        self._start = max(start, self._written - self.capacity, 0)
+
+    def peek(self, sample_offset: int = None) -> memoryview:
+        """当前这段话 [开始, sample_offset) 的零拷贝视图，不结束这段话"""
+        if self._start is None:
+            return self._view[:0]
+
+        start = max(self._start, self._written - self.capacity)
+        end = self._written if sample_offset is None else sample_offset * 2
+        end = min(max(end, start), self._written)
+
+        position = start % self.capacity
+        return self._view[position:position + end - start]
+
+    def end(self, sample_offset: int = None) -> memoryview:
+        """语音结束：返回 [开始, sample_offset) 的零拷贝视图"""
+        utterance = self.peek(sample_offset)
+        self._start = None
+        return utterance
+
+    def discard(self):
+        """丢弃当前这段话"""
+        self._start = None
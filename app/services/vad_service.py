@@ -1,42 +1,383 @@
+import asyncio
 import numpy as np
+from typing import List, NamedTuple
 from app.config import settings
 from loguru import logger
 
+# 激进程度 -> (相对噪声底的RMS倍数, 最低RMS, 判定起始所需连续语音帧)
+# 越激进越不容易把线路噪声判为语音
+AGGRESSIVENESS_PROFILES = {
+    0: (2.0, 300, 1),
+    1: (2.8, 400, 1),
+    2: (4.0, 500, 2),
+    3: (5.6, 700, 3),
+}
+
+def aggressiveness_profile(aggressiveness: int) -> tuple:
+    """按激进程度取判定参数，不支持的取值抛出 ValueError"""
+    if aggressiveness not in AGGRESSIVENESS_PROFILES:
+        raise ValueError(f"不支持的VAD激进程度: {aggressiveness}（可选 0-3）")
+    return AGGRESSIVENESS_PROFILES[aggressiveness]
+
 class VADService:
     def __init__(self):
-        self.energy_threshold = 1000  # 能量阈值
+        profile = aggressiveness_profile(settings.vad_aggressiveness)
+        self.energy_threshold = profile[1]  # 能量阈值
         self.silence_threshold = settings.silence_duration
-        self.frame_duration_ms = 30
+        self.frame_duration_ms = settings.vad_frame_duration
         self.sample_rate = settings.audio_sample_rate
         self.frame_size = int(
-            self.frame_duration_ms * 
+            self.frame_duration_ms *
             self.sample_rate * 2 / 1000
         )
-        
+
     def is_speech(self, audio_chunk: bytes) -> bool:
-        """判断是否包含语音（基于能量检测）"""
+        """判断是否包含语音（按帧能量检测，任一帧超过阈值即为语音）"""
         try:
-            if len(audio_chunk) < self.frame_size:
-                return False
-            
             audio_array = np.frombuffer(audio_chunk, dtype=np.int16)
-            energy = np.sqrt(np.mean(audio_array.astype(float)**2))
-            
+            if audio_array.size == 0:
+                return False
+
+            # 不足一帧的块整体判定，其余按整帧切分（尾部不足一帧的部分并入最后一帧）
+            frame_samples = self.frame_size // 2
+            num_frames = max(1, audio_array.size // frame_samples)
+            frames = np.array_split(
+                audio_array.astype(np.float32), num_frames
+            )
+            energy = max(np.sqrt(np.mean(frame ** 2)) for frame in frames)
+
             return energy > self.energy_threshold
-            
+
         except Exception as e:
             logger.error(f"VAD检测失败: {e}")
             return False
-    
+
     def detect_speech_end(self, audio_buffer: list) -> bool:
         """检测语音结束（静音）"""
         if len(audio_buffer) == 0:
             return True
-        
+
         silence_samples = int(
-            self.silence_threshold * 
+            self.silence_threshold *
             self.sample_rate * 2 / 1000
         )
-        
+
         recent_audio = b''.join(audio_buffer[-min(10, len(audio_buffer)):])
         return len(recent_audio) < silence_samples
+
+
+class SpeechEvent(NamedTuple):
+    # "speech_start" / "speech_end"；语音中的暂定停顿 "speech_pause" 与停顿后
+    # 继续说话 "speech_resume"，停顿的偏移即随后 speech_end 会给出的结束位置
+    kind: str
+    sample_offset: int  # 在该路音频流中的采样点位置
+
+
+class VADDecision(NamedTuple):
+    speaking: bool
+    speech_start: bool
+    speech_end: bool
+    events: List[SpeechEvent]
+
+
+class BatchVADEngine:
+    """多路通话批量、逐帧VAD引擎
+
+    输入按 vad_frame_duration 切成整帧，不足一帧的尾部留到下次；
+    每个tick把所有活跃通话的帧拼成一个二维数组，一次NumPy计算得出
+    各帧能量。每路维护自适应噪声底、连续语音帧数和静音拖尾，输出
+    带采样点偏移的语音开始/结束事件，以及拖尾未满时的暂定停顿/继续
+    事件（供提前上传）。状态按槽位保存在数组中，
+    缓冲区预分配，逐帧不再分配新数组。
+    """
+
+    # 噪声底更新系数：下降快、上升慢；语音帧及语音段内（含静音拖尾）只降不升
+    floor_down = 0.2
+    floor_up = 0.02
+    initial_floor_rms = 100
+
+    def __init__(
+        self,
+        capacity: int = None,
+        aggressiveness: int = None
+    ):
+        self.sample_rate = settings.audio_sample_rate
+        self.frame_samples = int(
+            settings.vad_frame_duration * self.sample_rate / 1000
+        )
+        self.hangover_samples = int(
+            settings.silence_duration * self.sample_rate / 1000
+        )
+        self.pause_samples = int(settings.vad_pause_ms * self.sample_rate / 1000)
+        if aggressiveness is None:
+            aggressiveness = settings.vad_aggressiveness
+        ratio, min_rms, start_frames = aggressiveness_profile(aggressiveness)
+        self.aggressiveness = aggressiveness
+        self.start_frames = start_frames
+        # 在均方值域比较，省去开方
+        self._ratio_sq = np.float32(ratio ** 2)
+        self._min_energy = np.float32(min_rms ** 2)
+
+        capacity = capacity or settings.max_concurrent_calls
+
+        # 按槽位保存的每路状态
+        self._speaking = np.zeros(capacity, dtype=bool)
+        self._silence = np.zeros(capacity, dtype=np.int32)
+        self._run = np.zeros(capacity, dtype=np.int32)
+        self._run_start = np.zeros(capacity, dtype=np.int64)
+        self._position = np.zeros(capacity, dtype=np.int64)
+        self._noise_floor = np.zeros(capacity, dtype=np.float32)
+        self._leftover = np.zeros((capacity, self.frame_samples), dtype=np.int16)
+        self._leftover_len = np.zeros(capacity, dtype=np.int32)
+        self._free_slots = list(range(capacity - 1, -1, -1))
+
+        # 预分配的批处理缓冲（行 = 帧）
+        self._frames = np.zeros((capacity * 4, self.frame_samples), dtype=np.float32)
+        self._energy = np.zeros(capacity * 4, dtype=np.float32)
+
+        self._pending = []
+        self._flush_scheduled = False
+
+    @property
+    def capacity(self) -> int:
+        return len(self._speaking)
+
+    def _grow_slots(self, capacity: int):
+        old = self.capacity
+        for name in (
+            "_speaking", "_silence", "_run", "_run_start",
+            "_position", "_noise_floor", "_leftover_len"
+        ):
+            array = getattr(self, name)
+            grown = np.zeros(capacity, dtype=array.dtype)
+            grown[:old] = array
+            setattr(self, name, grown)
+        leftover = np.zeros((capacity, self.frame_samples), dtype=np.int16)
+        leftover[:old] = self._leftover
+        self._leftover = leftover
+        self._free_slots[:0] = range(capacity - 1, old - 1, -1)
+
+    def _reserve_rows(self, rows: int, samples: int = None):
+        samples = samples or self.frame_samples
+        if rows > self._frames.shape[0] or samples > self._frames.shape[1]:
+            self._frames = np.zeros(
+                (max(rows, self._frames.shape[0]), max(samples, self._frames.shape[1])),
+                dtype=np.float32
+            )
+            self._energy = np.zeros(self._frames.shape[0], dtype=np.float32)
+
+    def register(self) -> int:
+        """为一路通话分配状态槽位"""
+        if not self._free_slots:
+            self._grow_slots(self.capacity * 2)
+        slot = self._free_slots.pop()
+        self._speaking[slot] = False
+        self._silence[slot] = 0
+        self._run[slot] = 0
+        self._run_start[slot] = 0
+        self._position[slot] = 0
+        self._noise_floor[slot] = self.initial_floor_rms ** 2
+        self._leftover_len[slot] = 0
+        return slot
+
+    def end_speech(self, slot: int):
+        """强制结束当前语音段（如达到最大语音长度），之后需重新检测起始"""
+        self._speaking[slot] = False
+        self._run[slot] = 0
+        self._silence[slot] = 0
+
+    def release(self, slot: int):
+        """释放通话的状态槽位"""
+        self._speaking[slot] = False
+        self._leftover_len[slot] = 0
+        self._free_slots.append(slot)
+
+    def _energies(self, rows: int, samples: int) -> np.ndarray:
+        """对缓冲区前 rows 行计算均方能量（原地平方，float32累加）"""
+        buffer = self._frames[:rows, :samples]
+        energy = self._energy[:rows]
+        np.square(buffer, out=buffer)
+        np.sum(buffer, axis=1, out=energy)
+        energy /= np.float32(samples)
+        return energy
+
+    def _step(
+        self,
+        slots: np.ndarray,
+        energy: np.ndarray,
+        lengths
+    ) -> tuple:
+        """每个槽位推进一帧，返回
+        (是否语音帧, 开始, 结束, 开始偏移, 结束偏移, 暂定停顿, 继续说话)"""
+        floor = self._noise_floor[slots]
+        is_speech = energy > np.maximum(floor * self._ratio_sq, self._min_energy)
+
+        # 噪声底只在语音段之外随背景上升，否则持续的语音会把噪声底抬高
+        # 到 ratio 倍接近语音能量，导致误判结束
+        was_speaking = self._speaking[slots]
+        alpha = np.where(
+            energy < floor,
+            self.floor_down,
+            np.where(is_speech | was_speaking, 0.0, self.floor_up)
+        ).astype(np.float32)
+        self._noise_floor[slots] = floor + alpha * (energy - floor)
+
+        position = self._position[slots]
+        run = np.where(is_speech, self._run[slots] + 1, 0)
+        run_start = np.where(run == 1, position, self._run_start[slots])
+        previous_silence = self._silence[slots]
+        silence = np.where(is_speech, 0, previous_silence + lengths)
+
+        start = ~was_speaking & (run >= self.start_frames)
+        end = was_speaking & (silence > self.hangover_samples)
+        end_offset = position + lengths - silence
+        # 暂定停顿：静音首次达到 pause_samples 且拖尾未满；停顿后再出现语音帧为继续
+        pausing = was_speaking & (self.pause_samples > 0)
+        paused = pausing & (previous_silence >= self.pause_samples)
+        pause = pausing & ~paused & ~end & (silence >= self.pause_samples)
+        resume = paused & is_speech
+
+        self._run[slots] = run
+        self._run_start[slots] = run_start
+        self._silence[slots] = silence
+        self._speaking[slots] = (was_speaking | start) & ~end
+        self._position[slots] = position + lengths
+        return is_speech, start, end, run_start, end_offset, pause, resume
+
+    def process_batch(
+        self,
+        slots: np.ndarray,
+        frames: np.ndarray
+    ) -> tuple:
+        """批量判定：frames 为 (通话数 × 采样点) 的int16数组，每行视为一帧
+
+        返回三个布尔数组：是否语音帧、语音开始、语音结束（静音超过拖尾时长）。
+        """
+        count, samples = frames.shape
+        self._reserve_rows(count, samples)
+        np.copyto(self._frames[:count, :samples], frames)
+        energy = self._energies(count, samples)
+        is_speech, start, end = self._step(slots, energy, samples)[:3]
+        return is_speech, start, end
+
+    async def submit(self, slot: int, chunk: bytes) -> VADDecision:
+        """提交一路通话的音频块，与同一tick内其他通话的帧合并判定"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((slot, chunk, future))
+        if not self._flush_scheduled:
+            self._flush_scheduled = True
+            loop.call_soon(self._flush)
+        return await future
+
+    def _split_frames(self, slot: int, chunk: bytes, row: int) -> int:
+        """把 残留 + 新块 切成整帧写入缓冲区第 row 行起，返回帧数"""
+        samples = np.frombuffer(chunk, dtype=np.int16)
+        size = self.frame_samples
+        leftover_len = int(self._leftover_len[slot])
+        frames = 0
+
+        if leftover_len + len(samples) < size:
+            self._leftover[slot, leftover_len:leftover_len + len(samples)] = samples
+            self._leftover_len[slot] = leftover_len + len(samples)
+            return 0
+
+        consumed = 0
+        if leftover_len:
+            consumed = size - leftover_len
+            self._frames[row, :leftover_len] = self._leftover[slot, :leftover_len]
+            self._frames[row, leftover_len:size] = samples[:consumed]
+            frames = 1
+
+        full = (len(samples) - consumed) // size
+        self._frames[row + frames:row + frames + full, :size] = (
+            samples[consumed:consumed + full * size].reshape(full, size)
+        )
+        frames += full
+        consumed += full * size
+
+        tail = len(samples) - consumed
+        self._leftover[slot, :tail] = samples[consumed:]
+        self._leftover_len[slot] = tail
+        return frames
+
+    def _flush(self):
+        self._flush_scheduled = False
+        pending, self._pending = self._pending, []
+
+        # 同一槽位一个tick只处理一块，多出的顺延到下一tick
+        batch = []
+        seen = set()
+        for item in pending:
+            if item[0] in seen:
+                self._pending.append(item)
+            else:
+                seen.add(item[0])
+                batch.append(item)
+        if self._pending:
+            self._flush_scheduled = True
+            asyncio.get_running_loop().call_soon(self._flush)
+
+        try:
+            size = self.frame_samples
+            self._reserve_rows(sum(
+                (len(chunk) // 2 + size) // size for _, chunk, _ in batch
+            ))
+
+            first_row = []
+            frame_counts = []
+            rows = 0
+            for slot, chunk, _ in batch:
+                count = self._split_frames(slot, chunk, rows)
+                first_row.append(rows)
+                frame_counts.append(count)
+                rows += count
+
+            energy = self._energies(rows, size)
+            slots = np.array([slot for slot, _, _ in batch], dtype=np.intp)
+            first_row = np.array(first_row, dtype=np.intp)
+            frame_counts = np.array(frame_counts, dtype=np.intp)
+
+            events = [[] for _ in batch]
+            # 同一路的帧必须按时间顺序推进，不同通话在每一步内向量化
+            for step in range(int(frame_counts.max(initial=0))):
+                active = np.flatnonzero(frame_counts > step)
+                _, start, end, start_offset, end_offset, pause, resume = self._step(
+                    slots[active], energy[first_row[active] + step], size
+                )
+                for i in np.flatnonzero(start):
+                    events[active[i]].append(
+                        SpeechEvent("speech_start", int(start_offset[i]))
+                    )
+                for i in np.flatnonzero(pause):
+                    events[active[i]].append(
+                        SpeechEvent("speech_pause", int(end_offset[i]))
+                    )
+                for i in np.flatnonzero(resume):
+                    events[active[i]].append(
+                        SpeechEvent("speech_resume", int(end_offset[i]))
+                    )
+                for i in np.flatnonzero(end):
+                    events[active[i]].append(
+                        SpeechEvent("speech_end", int(end_offset[i]))
+                    )
+
+        except Exception as e:
+            logger.error(f"批量VAD失败: {e}")
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for i, (slot, _, future) in enumerate(batch):
+            if not future.done():
+                kinds = [event.kind for event in events[i]]
+                future.set_result(VADDecision(
+                    bool(self._speaking[slot]),
+                    "speech_start" in kinds,
+                    "speech_end" in kinds,
+                    events[i]
+                ))
+
+
+vad_engine = BatchVADEngine()
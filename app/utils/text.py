@@ -0,0 +1,44 @@
+import re
+from typing import List
+
+# 中文句末标点直接断句；英文标点需后接空白，避免切开 3.14、e.g. 等
+_SENTENCE_END = re.compile(r"[。！？；…\n]+|[.!?;]+(?=\s)")
+
+# 中日韩字符及全角标点按每字一个token估算
+_CJK = re.compile(r"[\u3000-\u9fff\uac00-\ud7af\uff00-\uffef]")
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算token数：中文每字约1个，其余每4个字符约1个"""
+    if not text:
+        return 0
+    cjk = len(_CJK.findall(text))
+    return cjk + -(-(len(text) - cjk) // 4)
+
+
+class SentenceSegmenter:
+    """增量分句器：按中英文句末标点切分流式token"""
+
+    def __init__(self, min_chars: int = 2):
+        self.min_chars = min_chars
+        self._buffer = ""
+
+    def feed(self, token: str) -> List[str]:
+        """追加token，返回已完整的句子"""
+        self._buffer += token
+        sentences = []
+        start = 0
+        for match in _SENTENCE_END.finditer(self._buffer):
+            sentence = self._buffer[start:match.end()].strip()
+            # 过短的片段（如单个语气词）并入下一句
+            if len(sentence) < self.min_chars:
+                continue
+            sentences.append(sentence)
+            start = match.end()
+        self._buffer = self._buffer[start:]
+        return sentences
+
+    def flush(self) -> str:
+        """返回剩余未断句的文本"""
+        tail, self._buffer = self._buffer.strip(), ""
+        return tail
@@ -0,0 +1,55 @@
+"""create calls and messages
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "calls",
+        sa.Column("call_id", sa.String(64), primary_key=True),
+        sa.Column("phone_number", sa.String(32), nullable=True),
+        sa.Column("status", sa.String(16), nullable=False),
+        sa.Column("prompt", sa.Text(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("ended_at", sa.DateTime(), nullable=True),
+        sa.Column("duration", sa.Integer(), nullable=True),
+    )
+    op.create_index("ix_calls_created_at", "calls", ["created_at"])
+    op.create_index(
+        "ix_calls_phone_number_created_at", "calls", ["phone_number", "created_at"]
+    )
+    op.create_index(
+        "ix_calls_status_created_at", "calls", ["status", "created_at"]
+    )
+
+    op.create_table(
+        "messages",
+        sa.Column(
+            "call_id",
+            sa.String(64),
+            sa.ForeignKey("calls.call_id"),
+            primary_key=True
+        ),
+        sa.Column("seq", sa.Integer(), primary_key=True),
+        sa.Column("role", sa.String(16), nullable=False),
+        sa.Column("content", sa.Text(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+    )
+
+
+def downgrade():
+    op.drop_table("messages")
+    op.drop_index("ix_calls_status_created_at", table_name="calls")
+    op.drop_index("ix_calls_phone_number_created_at", table_name="calls")
+    op.drop_index("ix_calls_created_at", table_name="calls")
+    op.drop_table("calls")
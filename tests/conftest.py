@@ -0,0 +1,16 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tests.fake_model_server import FakeModelServer
+
+
+@pytest.fixture
+def fake_model_server():
+    """启动本地模型服务替身，测试结束后关闭"""
+    server = FakeModelServer().start()
+    yield server
+    server.stop()
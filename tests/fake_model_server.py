@@ -0,0 +1,185 @@
+"""Local stand-in for the remote model service
+
+Serves /v1/chat/completions (plain and SSE streaming) and /v1/audio/speech
+(chunked streaming) with configurable latency, and records request timing
+events so tests and benchmarks can measure overlap between stages.
+prefill_delay_per_token adds a delay proportional to the prompt size, like
+a real model's prefill.
+
+Chat requests are checked like the real endpoint would: every input_audio
+part must be valid base64 of a mono 16-bit WAV/FLAC file in the declared
+format, otherwise the request fails with 400. Decoded clips are recorded as
+"audio_input" events with their size on the wire.
+"""
+import asyncio
+import base64
+import binascii
+import io
+import json
+import socket
+import threading
+import time
+import wave
+
+import uvicorn
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import StreamingResponse
+
+from app.services.context_manager import message_tokens
+
+
+class FakeModelServer:
+    def __init__(
+        self,
+        reply: str = "您好，我是AI客服。请问有什么可以帮您？我们马上为您处理。",
+        token_delay: float = 0.02,
+        tts_first_byte_delay: float = 0.05,
+        tts_chunk_delay: float = 0.01,
+        tts_chunks: int = 4,
+        prefill_delay_per_token: float = 0.0
+    ):
+        self.reply = reply
+        self.token_delay = token_delay
+        self.tts_first_byte_delay = tts_first_byte_delay
+        self.tts_chunk_delay = tts_chunk_delay
+        self.tts_chunks = tts_chunks
+        self.prefill_delay_per_token = prefill_delay_per_token
+        self.events = []
+        self.app = self._create_app()
+        self._server = None
+        self._thread = None
+        self.port = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def _record(self, name: str, detail=None):
+        self.events.append((time.perf_counter(), name, detail))
+
+    def event_times(self, name: str) -> list:
+        return [t for t, event, _ in self.events if event == name]
+
+    def check_audio(self, body: dict, request_bytes: int) -> list:
+        """校验并解码请求中的 input_audio，返回各段的摘要"""
+        clips = []
+        for message in body["messages"]:
+            if isinstance(message["content"], str):
+                continue
+            for part in message["content"]:
+                if part.get("type") != "input_audio":
+                    continue
+                audio = part["input_audio"]
+                try:
+                    data = base64.b64decode(audio["data"], validate=True)
+                except (binascii.Error, KeyError) as e:
+                    raise HTTPException(400, f"invalid input_audio data: {e}")
+                clips.append(self._decode_clip(data, audio.get("format"), request_bytes))
+        return clips
+
+    def _decode_clip(self, data: bytes, audio_format: str, request_bytes: int) -> dict:
+        clip = {"format": audio_format, "bytes": len(data), "request_bytes": request_bytes}
+        if audio_format == "wav":
+            try:
+                with wave.open(io.BytesIO(data)) as wav_file:
+                    if wav_file.getnchannels() != 1 or wav_file.getsampwidth() != 2:
+                        raise HTTPException(400, "input_audio must be mono 16-bit")
+                    clip["sample_rate"] = wav_file.getframerate()
+                    clip["pcm"] = wav_file.readframes(wav_file.getnframes())
+            except (wave.Error, EOFError) as e:
+                raise HTTPException(400, f"invalid wav: {e}")
+        elif audio_format == "flac":
+            if not data.startswith(b"fLaC"):
+                raise HTTPException(400, "invalid flac")
+            try:
+                import soundfile
+            except ImportError:
+                return clip
+            samples, clip["sample_rate"] = soundfile.read(io.BytesIO(data), dtype="int16")
+            clip["pcm"] = samples.tobytes()
+        else:
+            raise HTTPException(400, f"unsupported input_audio format: {audio_format}")
+        return clip
+
+    def synthesize(self, text: str) -> bytes:
+        """TTS替身：音频内容即文本的UTF-8编码，便于校验顺序"""
+        return text.encode("utf-8")
+
+    def _create_app(self) -> FastAPI:
+        app = FastAPI()
+
+        @app.post("/v1/chat/completions")
+        async def chat_completions(request: Request):
+            # 分块上传时第一块到达即记录，便于测量提前上传
+            raw = b""
+            async for chunk in request.stream():
+                if chunk and not raw:
+                    self._record("chat_body_start")
+                raw += chunk
+            body = json.loads(raw)
+            for clip in self.check_audio(body, len(raw)):
+                self._record("audio_input", clip)
+            self._record("chat_start", body)
+            if self.prefill_delay_per_token:
+                prompt_tokens = sum(map(message_tokens, body["messages"]))
+                await asyncio.sleep(self.prefill_delay_per_token * prompt_tokens)
+
+            if not body.get("stream"):
+                await asyncio.sleep(self.token_delay * len(self.reply))
+                self._record("chat_end")
+                return {
+                    "choices": [
+                        {"message": {"role": "assistant", "content": self.reply}}
+                    ]
+                }
+
+            async def events():
+                for token in self.reply:
+                    await asyncio.sleep(self.token_delay)
+                    chunk = {"choices": [{"delta": {"content": token}}]}
+                    yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+                self._record("chat_end")
+                yield "data: [DONE]\n\n"
+
+            return StreamingResponse(events(), media_type="text/event-stream")
+
+        @app.post("/v1/audio/speech")
+        async def audio_speech(request: Request):
+            body = await request.json()
+            self._record("tts_request", body)
+            self._record("tts_start", body["input"])
+            audio = self.synthesize(body["input"])
+            size = -(-len(audio) // self.tts_chunks)
+
+            async def chunks():
+                await asyncio.sleep(self.tts_first_byte_delay)
+                for i in range(0, len(audio), size):
+                    yield audio[i:i + size]
+                    await asyncio.sleep(self.tts_chunk_delay)
+                self._record("tts_end", body["input"])
+
+            return StreamingResponse(chunks(), media_type="audio/pcm")
+
+        return app
+
+    def start(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind(("127.0.0.1", 0))
+        self.port = sock.getsockname()[1]
+
+        config = uvicorn.Config(self.app, log_level="warning")
+        self._server = uvicorn.Server(config)
+        self._thread = threading.Thread(
+            target=self._server.run, kwargs={"sockets": [sock]}, daemon=True
+        )
+        self._thread.start()
+        while not self._server.started:
+            time.sleep(0.01)
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.should_exit = True
+            self._thread.join(timeout=5)
+            self._server = None
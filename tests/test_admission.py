@@ -0,0 +1,64 @@
+"""Test admission control"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+from app.main import app
+from app.services.admission import AdmissionRejected, ConcurrencyLimiter, admission
+from app.services.audio_archiver import audio_archiver
+from app.services.persistence import conversation_store
+
+def test_limiter_queue_handoff_and_rejection():
+    print("Testing concurrency limiter...")
+    
+    async def run():
+        limiter = ConcurrencyLimiter("test", limit=1, max_waiting=1, wait_timeout=0.05)
+        await limiter.acquire()
+        
+        # 名额已满：第一个进入队列，第二个因排队已满立即被拒
+        waiter = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0)
+        assert limiter.waiting == 1
+        with pytest.raises(AdmissionRejected):
+            await limiter.acquire()
+        
+        # 释放时名额直接交给排队者
+        limiter.release()
+        await waiter
+        assert limiter.active == 1 and limiter.waiting == 0
+        
+        # 排队超时被拒，名额不泄漏
+        with pytest.raises(AdmissionRejected):
+            await limiter.acquire()
+        limiter.release()
+        assert limiter.active == 0
+        return limiter.stats()
+    
+    stats = asyncio.run(run())
+    assert stats["admitted"] == 2 and stats["rejected"] == 2 and stats["timeouts"] == 1
+    print(f"[OK] Limiter stats: {stats}")
+
+def test_saturated_server_rejects_quickly(monkeypatch):
+    print("\nTesting saturated server...")
+    monkeypatch.setattr(conversation_store, "enabled", False)
+    monkeypatch.setattr(audio_archiver, "enabled", False)
+    monkeypatch.setattr(admission.calls, "limit", 0)
+    monkeypatch.setattr(admission.calls, "max_waiting", 0)
+    
+    with TestClient(app) as client:
+        assert client.get("/health").status_code == 503
+        response = client.post("/api/call/initiate", json={"phone_number": "13800000000"})
+        assert response.status_code == 503
+        assert "Retry-After" in response.headers
+        
+        with client.websocket_connect("/ws/call/call_busy") as ws:
+            with pytest.raises(WebSocketDisconnect) as closed:
+                ws.receive_text()
+        assert closed.value.code == 1013
+    print("[OK] HTTP 503 and WebSocket close 1013")
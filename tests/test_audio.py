@@ -3,8 +3,18 @@ import sys
 import os
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from app.services.audio_processor import AudioProcessor
-from app.services.vad_service import VADService
+from app.services.audio_processor import (
+    AudioProcessor,
+    AutomaticGainControl,
+    StreamingResampler
+)
+from app.services.vad_service import BatchVADEngine, VADService
+from app.services.utterance_buffer import UtteranceBuffer
+from app.services.audio_archiver import AudioArchiver
+from app.config import settings
+import asyncio
+import tempfile
+import wave
 import numpy as np
 
 def test_audio_processing():
@@ -28,6 +38,57 @@ def test_audio_processing():
     combined = processor.combine_chunks(chunks)
     print(f"[OK] Audio combined: {len(chunks)} chunks -> {len(combined)} bytes")
 
+def test_streaming_resampler():
+    print("\nTesting streaming resampler...")
+    test_audio = np.random.randint(-8000, 8000, 8000, dtype=np.int16)
+    
+    # 分块重采样应与整段重采样逐样本一致（块边界无伪影）
+    chunked = StreamingResampler(8000, 16000)
+    output = np.concatenate([
+        chunked.process(test_audio[i:i + 160])
+        for i in range(0, len(test_audio), 160)
+    ])
+    whole = StreamingResampler(8000, 16000).process(test_audio)
+    
+    assert len(output) == 16000
+    assert np.array_equal(output, whole)
+    print(f"[OK] Streaming resample: {len(test_audio)} -> {len(output)} samples")
+
+def test_automatic_gain_control():
+    print("\nTesting automatic gain control...")
+    agc = AutomaticGainControl(16000)
+    rng = np.random.default_rng(0)
+    noise = (rng.standard_normal(320) * 30).astype(np.int16)
+    speech = (rng.standard_normal(320) * 800).astype(np.int16)
+    
+    # 开头的线路噪声保持单位增益，样本不被改写
+    frame = noise.copy()
+    assert agc.process(frame) is frame
+    assert np.array_equal(frame, noise) and agc.gain == 1.0
+    
+    # 低电平语音被原地放大到目标峰值附近，不削顶
+    for _ in range(10):
+        frame = speech.copy()
+        agc.process(frame)
+    peak_dbfs = 20 * np.log10(np.abs(frame.astype(np.int32)).max() / 32767)
+    assert -8 < peak_dbfs < 0
+    
+    # 语音结束后噪声不会像逐块归一化那样被放大到满幅
+    for _ in range(50):
+        frame = noise.copy()
+        agc.process(frame)
+    assert np.abs(frame.astype(np.int32)).max() < 32767 * 0.1
+    assert np.abs(AudioProcessor()._normalize(noise).astype(np.int32)).max() >= 32000
+    
+    # float32 同样原地处理
+    samples = (rng.standard_normal(320) * 0.02).astype(np.float32)
+    float_agc = AutomaticGainControl(16000)
+    for _ in range(10):
+        frame = samples.copy()
+        float_agc.process(frame)
+    assert 0.3 < np.abs(frame).max() <= 1.0
+    print(f"[OK] Speech peak {peak_dbfs:.1f} dBFS, gain after speech {agc.gain:.2f}")
+
 def test_vad():
     print("\nTesting VAD...")
     vad = VADService()
@@ -48,10 +109,164 @@ def test_vad():
     has_silence = vad.is_speech(silence_bytes)
     print(f"[OK] Silence detection: {'speech detected' if has_silence else 'no speech'}")
 
+def test_batch_vad():
+    print("\nTesting batch VAD...")
+    engine = BatchVADEngine(capacity=2, aggressiveness=0)
+    slots = np.array([engine.register() for _ in range(3)])
+    
+    frames = np.zeros((3, 480), dtype=np.int16)
+    frames[0] = np.random.randint(-4000, 4000, 480)
+    frames[1] = np.random.randint(-100, 100, 480)
+    frames[2] = np.random.randint(-4000, 4000, 480)
+    
+    is_speech, speech_start, speech_end = engine.process_batch(slots, frames)
+    assert list(is_speech) == [True, False, True]
+    assert list(speech_start) == [True, False, True]
+    print(f"[OK] Batch decisions: {list(is_speech)}")
+    
+    # 静音超过拖尾时长后才判定语音结束
+    silence = np.zeros((3, 480), dtype=np.int16)
+    ended = []
+    for _ in range(engine.hangover_samples // 480 + 1):
+        ended.append(engine.process_batch(slots, silence)[2].copy())
+    assert not ended[0].any()
+    assert list(ended[-1]) == [True, False, True]
+    print(f"[OK] Speech end after {len(ended)} silent frames")
+
+def test_streaming_vad_events():
+    print("\nTesting streaming VAD events...")
+    engine = BatchVADEngine(capacity=1)
+    slot = engine.register()
+    frame = engine.frame_samples
+    
+    # 0.3s 线路噪声 + 0.5s 语音 + 1s 静音，按不对齐帧长的块送入
+    noise = np.random.randint(-150, 150, frame * 10)
+    speech = np.random.randint(-6000, 6000, frame * 17)
+    silence = np.random.randint(-150, 150, frame * 34)
+    audio = np.concatenate([noise, speech, silence]).astype(np.int16).tobytes()
+    
+    async def run(audio):
+        events = []
+        for i in range(0, len(audio), 700):
+            decision = await engine.submit(slot, audio[i:i + 700])
+            events += decision.events
+        return events
+    
+    events = asyncio.run(run(audio))
+    assert [event.kind for event in events] == ["speech_start", "speech_pause", "speech_end"]
+    assert events[0].sample_offset == frame * 10
+    assert events[1].sample_offset == events[2].sample_offset == frame * 27
+    print(f"[OK] Events: {events}")
+    
+    # 停顿 0.3s 后继续说话：暂定停顿被撤销，结束位置落在第二段语音之后
+    pause = np.random.randint(-150, 150, frame * 10)
+    audio = np.concatenate([speech, pause, speech, silence]).astype(np.int16).tobytes()
+    engine.release(slot)
+    slot = engine.register()
+    events = asyncio.run(run(audio))
+    assert [event.kind for event in events] == [
+        "speech_start", "speech_pause", "speech_resume", "speech_pause", "speech_end"
+    ]
+    assert events[1].sample_offset == frame * 17
+    assert events[3].sample_offset == events[4].sample_offset == frame * 44
+    print(f"[OK] Pause withdrawn on resume: {[event.kind for event in events]}")
+
+def test_long_utterance_vad():
+    print("\nTesting VAD on a long utterance...")
+    engine = BatchVADEngine(capacity=1, aggressiveness=2)
+    slot = engine.register()
+    frame = engine.frame_samples
+    rng = np.random.default_rng(7)
+    
+    # 4s 持续语音，音节之间 50ms 低噪声间隙：语音段内噪声底不得被抬高
+    syllable = frame * 7
+    gap = int(0.05 * engine.sample_rate)
+    parts = [rng.integers(-150, 150, frame * 10)]
+    while sum(len(part) for part in parts) < frame * 10 + 4 * engine.sample_rate:
+        parts += [rng.integers(-6000, 6000, syllable), rng.integers(-150, 150, gap)]
+    speech_end = sum(len(part) for part in parts) - gap
+    parts.append(rng.integers(-150, 150, frame * 40))
+    audio = np.concatenate(parts).astype(np.int16).tobytes()
+    
+    async def run():
+        events = []
+        for i in range(0, len(audio), 640):
+            events += (await engine.submit(slot, audio[i:i + 640])).events
+        return [event for event in events if event.kind in ("speech_start", "speech_end")]
+    
+    events = asyncio.run(run())
+    assert [event.kind for event in events] == ["speech_start", "speech_end"]
+    assert abs(events[1].sample_offset - speech_end) < frame
+    print(f"[OK] One utterance of {(events[1].sample_offset - events[0].sample_offset) / engine.sample_rate:.2f}s")
+    
+    # 超出范围的激进程度明确报错
+    try:
+        BatchVADEngine(capacity=1, aggressiveness=4)
+        assert False, "应拒绝超出范围的激进程度"
+    except ValueError as e:
+        print(f"[OK] Rejected: {e}")
+
+def test_utterance_buffer():
+    print("\nTesting utterance buffer...")
+    buffer = UtteranceBuffer(max_utterance_ms=100, preroll_ms=20, sample_rate=16000)
+    stream = np.arange(16000 * 2, dtype=np.int16)
+    
+    # 写入跨越多次环绕，语音段含20ms pre-roll，取出的视图与原始流一致
+    for i in range(0, 10000, 200):
+        buffer.write(stream[i:i + 200].tobytes())
+    buffer.begin(9000)
+    for i in range(10000, 10400, 200):
+        buffer.write(stream[i:i + 200].tobytes())
+    
+    view = buffer.end(10300)
+    assert isinstance(view, memoryview)
+    assert np.array_equal(
+        np.frombuffer(view, dtype=np.int16), stream[9000 - 320:10300]
+    )
+    assert not buffer.active
+    print(f"[OK] Utterance view: {len(view)} bytes, zero-copy")
+
+def test_audio_archiver():
+    print("\nTesting audio archiver...")
+    output_dir = settings.audio_output_dir
+    with tempfile.TemporaryDirectory() as tmp:
+        settings.audio_output_dir = tmp
+        try:
+            archiver = AudioArchiver()
+            archiver.enabled = True
+            turn = np.arange(2400, dtype=np.int16).tobytes()
+            
+            # 两轮pcm回复合并为同一个WAV文件
+            assert archiver.submit_turn("call-1", [turn[:1000], turn[1000:]], "pcm")
+            assert archiver.submit_turn("call-1", [turn], "pcm")
+            archiver.close_call("call-1")
+            archiver.stop()
+            
+            files = os.listdir(tmp)
+            assert len(files) == 1
+            with wave.open(os.path.join(tmp, files[0]), "rb") as wav_file:
+                assert wav_file.getframerate() == settings.tts_sample_rate
+                assert wav_file.readframes(wav_file.getnframes()) == turn * 2
+            
+            stats = archiver.stats()
+            assert stats["turns_written"] == 2
+            assert stats["files_written"] == 1
+            assert stats["queue_depth"] == 0
+        finally:
+            settings.audio_output_dir = output_dir
+    print("[OK] Audio archiver test passed")
+
 if __name__ == "__main__":
     try:
         test_audio_processing()
+        test_streaming_resampler()
+        test_automatic_gain_control()
         test_vad()
+        test_batch_vad()
+        test_streaming_vad_events()
+        test_long_utterance_vad()
+        test_utterance_buffer()
+        test_audio_archiver()
         print("\n[SUCCESS] All tests passed!")
     except Exception as e:
         print(f"\n[FAILED] Test error: {e}")
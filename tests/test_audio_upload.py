@@ -0,0 +1,142 @@
+"""Test caller audio upload to the model and early upload on tentative pauses"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import asyncio
+import json
+
+import numpy as np
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.services import codec
+from app.services.audio_archiver import audio_archiver
+from app.services.http_pool import model_http_pool
+from app.services.metrics import audio_upload_committed, audio_upload_withdrawn
+from app.services.model_client import ModelServiceClient, model_client
+from app.services.persistence import conversation_store
+from tests.fake_model_server import FakeModelServer
+
+def test_user_audio_sent_as_input_audio(fake_model_server):
+    print("Testing input_audio payload...")
+    fake_model_server.token_delay = 0.001
+    pcm = (np.random.default_rng(0).standard_normal(16000) * 3000).astype(np.int16).tobytes()
+
+    async def run():
+        client = ModelServiceClient()
+        client.base_url = fake_model_server.url
+        session_id = await client.create_session("系统提示")
+        try:
+            for _ in range(2):
+                await client.send_audio(session_id, memoryview(pcm))
+            return client, await client.get_conversation(session_id)
+        finally:
+            await model_http_pool.close()
+
+    client, conversation = asyncio.run(run())
+    clips = [detail for _, name, detail in fake_model_server.events if name == "audio_input"]
+    requests = [detail for _, name, detail in fake_model_server.events if name == "chat_start"]
+
+    # 第二轮请求附带上一轮语音（复用已编码结果）与本轮语音，解码后与原始PCM一致
+    assert len(clips) == 3
+    assert clips[0]["format"] == client.audio_format
+    if "pcm" in clips[0]:
+        assert clips[0]["sample_rate"] == 16000
+        assert all(clip["pcm"] == pcm for clip in clips)
+    assert requests[1]["messages"][1]["content"] == [requests[0]["messages"][1]["content"][0]]
+    assert client.stats()["audio_upload_bytes"] == clips[0]["bytes"] + clips[2]["bytes"]
+
+    # 对话记录只保留文本占位
+    assert conversation[1]["content"] == "（用户语音 1.0秒）"
+    print(f"[OK] {clips[0]['format']} {clips[0]['bytes']} bytes, request {clips[0]['request_bytes']} bytes")
+
+def test_flac_falls_back_to_wav(monkeypatch):
+    print("\nTesting container fallback...")
+    monkeypatch.setattr(codec, "soundfile", None)
+    monkeypatch.setattr("app.config.settings.model_audio_format", "flac")
+    client = ModelServiceClient()
+    assert client.audio_format == "wav"
+    data = codec.encode_container(b"\x01\x00" * 160, 16000, "wav")
+    assert data[:4] == b"RIFF" and len(data) == 44 + 320
+    print("[OK] Uploading wav without soundfile")
+
+def _run_call(server, monkeypatch, frames):
+    monkeypatch.setattr(conversation_store, "enabled", False)
+    monkeypatch.setattr(audio_archiver, "enabled", False)
+    monkeypatch.setattr(model_client, "base_url", server.url)
+    with TestClient(app) as client:
+        with client.websocket_connect("/ws/call/call_upload") as ws:
+            for frame in frames:
+                ws.send_bytes(frame)
+            types = []
+            while "turn_complete" not in types:
+                message = ws.receive()
+                if message.get("text"):
+                    types.append(json.loads(message["text"])["type"])
+    return types
+
+def test_early_upload_committed_and_withdrawn(monkeypatch):
+    print("\nTesting early upload over WebSocket...")
+    server = FakeModelServer(reply="您好", token_delay=0.001).start()
+    rng = np.random.default_rng(1)
+    speech = [
+        (rng.standard_normal(160) * 5000).astype(np.int16).tobytes() for _ in range(50)
+    ]
+    silence = [np.zeros(160, dtype=np.int16).tobytes()] * 60
+    pause = [np.zeros(160, dtype=np.int16).tobytes()] * 15
+
+    try:
+        # 一口气说完：停顿处开始上传，端点确认后提交
+        committed = audio_upload_committed.value
+        types = _run_call(server, monkeypatch, speech + silence)
+        assert audio_upload_committed.value == committed + 1
+        assert "speech_pause" not in types
+        assert len(server.event_times("chat_body_start")) == 1
+        first = next(detail for _, name, detail in server.events if name == "audio_input")
+
+        # 停顿 0.3s 后继续说：撤回提前上传，端点后重新上传整段
+        server.events.clear()
+        withdrawn = audio_upload_withdrawn.value
+        _run_call(server, monkeypatch, speech + pause + speech + silence)
+        assert audio_upload_withdrawn.value > withdrawn
+    finally:
+        server.stop()
+
+    clips = [detail for _, name, detail in server.events if name == "audio_input"]
+    assert len(server.event_times("chat_start")) == 1
+    assert clips[-1]["bytes"] > first["bytes"] * 1.5
+    print(f"[OK] Resumed utterance uploaded once: {clips[-1]['bytes']} bytes")
+
+def test_end_and_start_in_one_chunk(monkeypatch):
+    print("\nTesting speech_end and speech_start in one chunk...")
+    server = FakeModelServer(reply="您好", token_delay=0.001).start()
+    monkeypatch.setattr("app.config.settings.barge_in_enabled", False)
+    monkeypatch.setattr(conversation_store, "enabled", False)
+    monkeypatch.setattr(audio_archiver, "enabled", False)
+    monkeypatch.setattr(model_client, "base_url", server.url)
+    rng = np.random.default_rng(3)
+    speech = (rng.standard_normal(8000) * 5000).astype(np.int16).tobytes()
+    silence = np.zeros(8000, dtype=np.int16).tobytes()
+
+    try:
+        with TestClient(app) as client:
+            with client.websocket_connect("/ws/call/call_large_chunks") as ws:
+                # 一块里：第一段话、足以断句的静音、第二段话
+                ws.send_bytes(speech + silence + speech)
+                ws.send_bytes(silence + silence)
+                completed = 0
+                while completed < 2:
+                    message = ws.receive()
+                    if message.get("text") and json.loads(message["text"])["type"] == "turn_complete":
+                        completed += 1
+    finally:
+        server.stop()
+
+    # 两段话各自完整上传，没有被下一段的开始截断（第二轮请求附带第一段作为历史）
+    clips = [detail for _, name, detail in server.events if name == "audio_input"]
+    assert len(clips) == 3 and clips[1]["pcm"] == clips[0]["pcm"]
+    clips = [clips[0], clips[2]]
+    durations = [len(clip["pcm"]) / 2 / clip["sample_rate"] for clip in clips]
+    assert all(0.8 < duration < 1.8 for duration in durations)
+    print(f"[OK] Two utterances: {[round(d, 2) for d in durations]}s")
@@ -0,0 +1,80 @@
+"""Test barge-in over the WebSocket call endpoint"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import json
+import time
+
+import numpy as np
+from fastapi.testclient import TestClient
+
+from app.config import settings
+from app.main import app
+from app.services.audio_archiver import audio_archiver
+from app.services.model_client import model_client
+from app.services.persistence import conversation_store
+from tests.fake_model_server import FakeModelServer
+
+SPEECH = (np.random.default_rng(0).standard_normal(480) * 5000).astype(np.int16).tobytes()
+SILENCE = b"\x00" * 960
+
+def _receive_until(ws, message_type):
+    """读取消息直到出现指定类型，返回期间收到的文本消息类型与音频字节数"""
+    types, audio_bytes = [], 0
+    while True:
+        message = ws.receive()
+        if message.get("bytes"):
+            audio_bytes += len(message["bytes"])
+            if message_type == "audio":
+                return types, audio_bytes
+            continue
+        kind = json.loads(message["text"])["type"]
+        types.append(kind)
+        if kind == message_type:
+            return types, audio_bytes
+
+def test_caller_speech_interrupts_playback(monkeypatch):
+    print("Testing barge-in...")
+    server = FakeModelServer(
+        reply="您好，请问有什么可以帮您？",
+        token_delay=0.001,
+        tts_chunks=20,
+        tts_chunk_delay=0.05
+    ).start()
+    monkeypatch.setattr(conversation_store, "enabled", False)
+    monkeypatch.setattr(audio_archiver, "enabled", False)
+    monkeypatch.setattr(model_client, "base_url", server.url)
+    # 替身音频很短，按小块转发才能在播放中途插话
+    monkeypatch.setattr(settings, "tts_stream_chunk_size", 2)
+    cancelled_before = model_client.cancelled_generations
+
+    try:
+        with TestClient(app) as client:
+            with client.websocket_connect("/ws/call/call_barge_in") as ws:
+                for _ in range(10):
+                    ws.send_bytes(SPEECH)
+                for _ in range(20):
+                    ws.send_bytes(SILENCE)
+                _receive_until(ws, "audio")
+                interrupted_at = time.perf_counter()
+
+                # 播放中用户再次说话：先取消上一轮，再上报语音开始
+                for _ in range(10):
+                    ws.send_bytes(SPEECH)
+                types, _ = _receive_until(ws, "speech_start")
+                elapsed_ms = (time.perf_counter() - interrupted_at) * 1000
+                assert types[-3:] == ["stop_audio", "interrupted", "speech_start"]
+                assert "turn_complete" not in types
+
+                for _ in range(20):
+                    ws.send_bytes(SILENCE)
+                _, audio_bytes = _receive_until(ws, "turn_complete")
+    finally:
+        server.stop()
+
+    # 被打断的TTS请求已断开，只有第二轮合成完成
+    assert model_client.cancelled_generations == cancelled_before + 1
+    assert len(server.event_times("tts_start")) == 2
+    assert len(server.event_times("tts_end")) == 1
+    print(f"[OK] Interrupted in {elapsed_ms:.0f}ms, second turn {audio_bytes} bytes")
@@ -0,0 +1,126 @@
+"""Test call state backends and call-affinity routing"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import asyncio
+
+import pytest
+
+from app.services.call_manager import CallManager
+from app.services.call_router import CallRouter
+from app.services.call_state import MemoryCallState, SQLCallState
+from app.services.http_pool import model_http_pool
+
+@pytest.mark.parametrize("backend", ["memory", "sql"])
+def test_call_state_backend(backend, tmp_path):
+    print(f"Testing {backend} call state...")
+    if backend == "memory":
+        state = MemoryCallState()
+    else:
+        state = SQLCallState(f"sqlite:///{tmp_path}/state.db")
+    state.start()
+
+    async def scenario():
+        assert await state.get("call_a") is None
+        assert not await state.update("call_a", status="connected")
+        await state.put("call_a", phone_number="13800000000", status="initiated")
+        assert await state.update("call_a", status="connected", worker="node:1")
+        return await state.get("call_a")
+
+    try:
+        call = asyncio.run(scenario())
+    finally:
+        state.stop()
+    assert call == {
+        "call_id": "call_a",
+        "phone_number": "13800000000",
+        "status": "connected",
+        "worker": "node:1"
+    }
+    print(f"[OK] {backend}: {call}")
+
+def test_calls_shared_between_workers(tmp_path, monkeypatch):
+    print("\nTesting shared state across workers...")
+    url = f"sqlite:///{tmp_path}/state.db"
+    # 两个worker各自的引擎指向同一个数据库文件
+    api_worker = CallManager(SQLCallState(url))
+    ws_worker = CallManager(SQLCallState(url))
+    api_worker.state.start()
+    ws_worker.state.start()
+    monkeypatch.setattr(api_worker, "_start_warmup", lambda call_id, prompt, greeting: None)
+
+    async def scenario():
+        call = await api_worker.initiate_call("13800000000", "你好")
+        await ws_worker.connect_audio_stream(call["call_id"])
+        connected = await api_worker.get_call_status(call["call_id"])
+        await api_worker.terminate_call(call["call_id"])
+        terminated = await ws_worker.get_call_status(call["call_id"])
+        await model_http_pool.close()
+        return connected, terminated
+
+    try:
+        connected, terminated = asyncio.run(scenario())
+    finally:
+        api_worker.state.stop()
+        ws_worker.state.stop()
+
+    assert connected["status"] == "connected"
+    assert connected["worker"] == ws_worker.router.worker_id
+    assert terminated["status"] == "terminated"
+    assert terminated["duration"] >= 0
+    print(f"[OK] Call visible to both workers: {terminated['status']}")
+
+@pytest.mark.parametrize("upsert", [True, False])
+def test_concurrent_put_same_call(upsert, tmp_path, monkeypatch):
+    print(f"\nTesting concurrent writes (upsert={upsert})...")
+    url = f"sqlite:///{tmp_path}/state.db"
+    workers = [SQLCallState(url), SQLCallState(url)]
+    for state in workers:
+        state.start()
+        if not upsert:
+            # 不支持 upsert 的方言：UPDATE + INSERT，插入冲突时改为UPDATE
+            monkeypatch.setattr(state, "_upsert", lambda values: None)
+
+    async def scenario():
+        for i in range(20):
+            await asyncio.gather(
+                workers[0].put(f"call_{i}", status="initiated", prompt="你好"),
+                workers[1].put(f"call_{i}", status="connected", worker="node:2")
+            )
+        return [await workers[0].get(f"call_{i}") for i in range(20)]
+
+    try:
+        calls = asyncio.run(scenario())
+    finally:
+        for state in workers:
+            state.stop()
+    # 两个worker写入的字段合并到同一行
+    assert all(call["prompt"] == "你好" and call["worker"] == "node:2" for call in calls)
+    assert workers[0].stats()["writes"] == workers[1].stats()["writes"] == 20
+    assert workers[0].stats()["reads"] == 20
+    print(f"[OK] {len(calls)} calls written by two workers")
+
+def test_call_affinity_routing():
+    print("\nTesting call-affinity routing...")
+    nodes = "a=ws://10.0.0.1:8000,b=ws://10.0.0.2:8000,c=ws://10.0.0.3:8000"
+    router = CallRouter(node_id="a", nodes=nodes)
+    call_ids = [f"call_{i}" for i in range(3000)]
+    homes = {call_id: router.home_node(call_id) for call_id in call_ids}
+
+    # 归属稳定，且大致均匀
+    assert all(router.home_node(call_id) == homes[call_id] for call_id in call_ids)
+    counts = {node: list(homes.values()).count(node) for node in "abc"}
+    assert min(counts.values()) > 800
+    assert router.ws_url("call_0") == f"{router.nodes[homes['call_0']]}/ws/call/call_0"
+
+    # 去掉一个节点时只有它上面的通话改变归属
+    shrunk = CallRouter(node_id="a", nodes=nodes.rsplit(",", 1)[0])
+    moved = [call_id for call_id in call_ids if shrunk.home_node(call_id) != homes[call_id]]
+    assert all(homes[call_id] == "c" for call_id in moved)
+
+    standalone = CallRouter(node_id="a", nodes="")
+    assert standalone.home_node("call_0") == "a"
+    assert standalone.ws_url("call_0") is None
+    assert standalone.record_connection("call_0")
+    print(f"[OK] Distribution {counts}, {len(moved)} calls moved on node removal")
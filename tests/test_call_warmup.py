@@ -0,0 +1,155 @@
+"""Test pre-dial warmup of sessions and greetings"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import asyncio
+import json
+import time
+
+import numpy as np
+from fastapi.testclient import TestClient
+
+from app.config import settings
+from app.main import app
+from app.services.audio_archiver import audio_archiver
+from app.services.call_warmup import CallWarmup, call_warmup
+from app.services.http_pool import model_http_pool
+from app.services.model_client import model_client
+from app.services.persistence import conversation_store
+from app.services.session_manager import session_manager
+
+def test_greeting_plays_on_connect(fake_model_server, monkeypatch):
+    print("Testing pre-dial warmup...")
+    monkeypatch.setattr(settings, "tts_response_format", "pcm")
+    monkeypatch.setattr(conversation_store, "enabled", False)
+    monkeypatch.setattr(audio_archiver, "enabled", False)
+    monkeypatch.setattr(model_client, "base_url", fake_model_server.url)
+    greeting = f"您好，这里是预热测试{time.time_ns()}"
+    rng = np.random.default_rng(2)
+    speech = [
+        (rng.standard_normal(160) * 5000).astype(np.int16).tobytes() for _ in range(50)
+    ]
+    silence = [np.zeros(160, dtype=np.int16).tobytes()] * 60
+
+    with TestClient(app) as client:
+        call = client.post("/api/call/initiate", json={
+            "phone_number": "13800000000",
+            "prompt": "你是银行客服",
+            "greeting": greeting
+        }).json()
+        deadline = time.time() + 5
+        while not fake_model_server.event_times("tts_end") and time.time() < deadline:
+            time.sleep(0.01)
+        time.sleep(0.05)
+        tts_requests = len(fake_model_server.event_times("tts_request"))
+
+        with client.websocket_connect(f"/ws/call/{call['call_id']}") as ws:
+            # 接通后先收到问候语音，之后才是本轮完成
+            greeting_bytes = 0
+            while True:
+                message = ws.receive()
+                if message.get("bytes"):
+                    greeting_bytes += len(message["bytes"])
+                elif json.loads(message["text"])["type"] == "turn_complete":
+                    first_audio_ms = json.loads(message["text"])["first_audio_ms"]
+                    break
+            assert len(fake_model_server.event_times("tts_request")) == tts_requests
+
+            for frame in speech + silence:
+                ws.send_bytes(frame)
+            while True:
+                message = ws.receive()
+                if message.get("text") and json.loads(message["text"])["type"] == "turn_complete":
+                    break
+
+    assert greeting_bytes == len(fake_model_server.synthesize(greeting))
+    assert first_audio_ms < 100
+    # 会话使用发起时的提示词，模型知道已经打过招呼
+    requests = [detail for _, name, detail in fake_model_server.events if name == "chat_start"]
+    messages = requests[-1]["messages"]
+    assert messages[0] == {"role": "system", "content": "你是银行客服"}
+    assert messages[1] == {"role": "assistant", "content": greeting}
+    assert call_warmup.stats()["pending"] == 0
+    print(f"[OK] Greeting ({greeting_bytes} bytes) first audio {first_audio_ms}ms after connect")
+
+def test_greeting_on_another_worker(fake_model_server, monkeypatch):
+    print("\nTesting greeting with multiple workers...")
+    monkeypatch.setattr(settings, "workers", 2)
+    monkeypatch.setattr(settings, "tts_response_format", "pcm")
+    monkeypatch.setattr(conversation_store, "enabled", False)
+    monkeypatch.setattr(audio_archiver, "enabled", False)
+    monkeypatch.setattr(model_client, "base_url", fake_model_server.url)
+    greeting = f"您好，多worker问候{time.time_ns()}"
+    stats = call_warmup.stats()
+
+    with TestClient(app) as client:
+        call = client.post("/api/call/initiate", json={
+            "phone_number": "13800000000",
+            "prompt": "你是保险客服",
+            "greeting": greeting
+        }).json()
+        deadline = time.time() + 5
+        while not fake_model_server.event_times("tts_end") and time.time() < deadline:
+            time.sleep(0.01)
+        time.sleep(0.05)
+        # 只预合成进TTS缓存，本worker不保留按通话的预热结果
+        assert call_warmup.stats()["pending"] == 0
+        assert call_warmup.stats()["prefetched"] == stats["prefetched"] + 1
+        assert call_warmup.stats()["started"] == stats["started"]
+        tts_requests = len(fake_model_server.event_times("tts_request"))
+
+        # 音频流接到（任一）worker：从通话状态取提示词与问候语，问候语命中缓存
+        with client.websocket_connect(f"/ws/call/{call['call_id']}") as ws:
+            greeting_bytes = 0
+            while True:
+                message = ws.receive()
+                if message.get("bytes"):
+                    greeting_bytes += len(message["bytes"])
+                elif json.loads(message["text"])["type"] == "turn_complete":
+                    break
+            session = session_manager.get_session(call["call_id"])
+            assert session.system_prompt == "你是保险客服"
+
+    assert greeting_bytes == len(fake_model_server.synthesize(greeting))
+    assert len(fake_model_server.event_times("tts_request")) == tts_requests
+    print(f"[OK] Greeting played from cache: {greeting_bytes} bytes")
+
+def test_warmup_expiry_and_failure(fake_model_server, monkeypatch):
+    print("\nTesting warmup expiry and failure...")
+    monkeypatch.setattr(model_client, "base_url", fake_model_server.url)
+    warmup = CallWarmup(ttl=0.2)
+
+    async def run():
+        try:
+            # 一直未接通：到期释放会话
+            warmup.start("call_never_connected", "提示词", "您好")
+            await asyncio.sleep(0.1)
+            assert session_manager.get_session("call_never_connected") is not None
+            await asyncio.sleep(0.2)
+            assert session_manager.get_session("call_never_connected") is None
+            assert await warmup.claim("call_never_connected") is None
+
+            # 问候合成失败：会话仍可用，接通时现合成
+            monkeypatch.setattr(model_client, "base_url", "http://127.0.0.1:9")
+            warmup.start("call_no_greeting", "提示词", "合成失败的问候")
+            warm = await warmup.claim("call_no_greeting")
+            assert warm.session is session_manager.get_session("call_no_greeting")
+            assert warm.greeting is None
+            await session_manager.cleanup_session("call_no_greeting")
+
+            # 会话创建失败：移除预热，接通时按未预热处理
+            async def broken(call_id, prompt):
+                raise RuntimeError("会话服务不可用")
+            monkeypatch.setattr(session_manager, "create_session", broken)
+            warmup.start("call_failed", "提示词", "")
+            await asyncio.sleep(0.05)
+            assert await warmup.claim("call_failed") is None
+        finally:
+            await model_http_pool.close()
+
+    asyncio.run(run())
+    assert warmup.stats() == {
+        "pending": 0, "started": 3, "prefetched": 0, "claimed": 1, "failed": 1, "expired": 1
+    }
+    print(f"[OK] {warmup.stats()}")
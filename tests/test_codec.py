@@ -0,0 +1,109 @@
+"""Test G.711 codec and audio format negotiation"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import json
+import warnings
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+from app.main import app
+from app.services import codec
+from app.services.audio_archiver import audio_archiver
+from app.services.audio_processor import AudioProcessor, OutboundTranscoder
+from app.services.codec import AudioFormat
+from app.services.model_client import model_client
+from app.services.persistence import conversation_store
+from tests.fake_model_server import FakeModelServer
+
+@pytest.mark.parametrize("encoding", ["ulaw", "alaw"])
+def test_g711_matches_reference(encoding):
+    print(f"Testing {encoding} lookup tables...")
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", DeprecationWarning)
+        audioop = pytest.importorskip("audioop")
+    samples = np.arange(-32768, 32768, dtype=np.int16)
+    codes = bytes(range(256))
+    lin2, to_lin = (
+        (audioop.lin2ulaw, audioop.ulaw2lin) if encoding == "ulaw"
+        else (audioop.lin2alaw, audioop.alaw2lin)
+    )
+    
+    # 全部 int16 与全部码字都与参考实现逐一一致
+    assert codec.encode(samples, encoding) == lin2(samples.tobytes(), 2)
+    assert codec.decode(codes, encoding).tobytes() == to_lin(codes, 2)
+    print(f"[OK] {encoding} encode/decode identical to audioop")
+
+def test_audio_format_and_transcoder():
+    print("\nTesting format negotiation and outbound transcoding...")
+    assert AudioFormat.parse("ULAW", "8000") == AudioFormat("ulaw", 8000)
+    for encoding, sample_rate in (("opus", 8000), ("alaw", 16000), ("pcm", 4000)):
+        with pytest.raises(ValueError):
+            AudioFormat.parse(encoding, sample_rate)
+    
+    # 采样率一致时入站不重采样
+    processor = AudioProcessor()
+    assert processor.create_resampler(processor.target_sample_rate) is None
+    
+    # 格式一致时出站原样透传
+    chunk = np.arange(480, dtype=np.int16).tobytes()
+    passthrough = OutboundTranscoder(24000, AudioFormat("pcm", 24000))
+    assert passthrough.process(chunk) is chunk
+    
+    # 奇数字节切分不影响结果
+    audio = (np.random.default_rng(0).standard_normal(2400) * 3000).astype(np.int16)
+    whole = OutboundTranscoder(24000, AudioFormat("ulaw", 8000)).process(audio.tobytes())
+    split = OutboundTranscoder(24000, AudioFormat("ulaw", 8000))
+    pieces = [audio.tobytes()[i:i + 333] for i in range(0, audio.nbytes, 333)]
+    assert b"".join(split.process(piece) for piece in pieces) == whole
+    assert len(whole) == 800
+    print(f"[OK] 2400 samples @24kHz -> {len(whole)} ulaw bytes @8kHz")
+
+def test_websocket_negotiates_g711(monkeypatch):
+    print("\nTesting G.711 call over WebSocket...")
+    server = FakeModelServer(reply="您好" * 30, token_delay=0.001).start()
+    monkeypatch.setattr(conversation_store, "enabled", False)
+    monkeypatch.setattr(audio_archiver, "enabled", False)
+    monkeypatch.setattr(model_client, "base_url", server.url)
+    speech = codec.encode(
+        (np.random.default_rng(0).standard_normal(160) * 5000).astype(np.int16), "ulaw"
+    )
+    silence = codec.encode(np.zeros(160, dtype=np.int16), "ulaw")
+    
+    try:
+        with TestClient(app) as client:
+            with client.websocket_connect(
+                "/ws/call/call_g711?encoding=opus"
+            ) as ws:
+                with pytest.raises(WebSocketDisconnect) as rejected:
+                    ws.receive_text()
+            assert rejected.value.code == 1003
+            
+            with client.websocket_connect(
+                "/ws/call/call_g711?encoding=ulaw&sample_rate=8000"
+            ) as ws:
+                # 20ms 一帧：语音 1s 后接静音 1.2s
+                for _ in range(50):
+                    ws.send_bytes(speech)
+                for _ in range(60):
+                    ws.send_bytes(silence)
+                audio = b""
+                while True:
+                    message = ws.receive()
+                    if message.get("bytes"):
+                        audio += message["bytes"]
+                    elif json.loads(message["text"])["type"] == "turn_complete":
+                        break
+    finally:
+        server.stop()
+    
+    # TTS取裸PCM（24kHz 16bit），按 3:1 降采样后每样本1字节
+    request = next(detail for _, name, detail in server.events if name == "tts_request")
+    assert request["response_format"] == "pcm"
+    tts_bytes = len(server.synthesize(request["input"]))
+    assert abs(len(audio) - tts_bytes // 2 // 3) <= 1
+    print(f"[OK] TTS {tts_bytes} pcm bytes -> {len(audio)} ulaw bytes")
@@ -0,0 +1,82 @@
+"""Test token-budgeted conversation context"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import asyncio
+
+from app.services.context_manager import ConversationContext, message_tokens
+from app.services.http_pool import model_http_pool
+from app.services.model_client import ModelServiceClient
+
+def _turn(i):
+    return [
+        {"role": "user", "content": f"第{i}个问题"},
+        {"role": "assistant", "content": f"第{i}个回答"}
+    ]
+
+def test_context_budget_and_fold():
+    print("Testing context budget and fold...")
+    context = ConversationContext("系统提示", max_tokens=1000, keep_turns=2, summary_batch=2)
+    user = {"role": "user", "content": "新问题"}
+    for i in range(4):
+        context.add_turn(_turn(i))
+
+    # 折叠完成前较早轮次仍以原文发送
+    assert context.needs_fold()
+    folded = context.begin_fold()
+    assert [m["content"] for m in folded][:2] == ["第0个问题", "第0个回答"]
+    assert len(context.build(user)) == 1 + 8 + 1
+
+    # 摘要替换较早轮次，系统提示与摘要构成稳定前缀
+    context.finish_fold("用户问了两个问题")
+    first = context.build(user)
+    context.add_turn(_turn(4))
+    second = context.build(user)
+    assert first[0]["content"] == "系统提示"
+    assert "用户问了两个问题" in first[1]["content"]
+    assert second[:len(first) - 1] == first[:-1]
+
+    # 超出预算时从最早的原文轮次开始舍弃
+    tight = ConversationContext("系统提示", max_tokens=40, keep_turns=10, summary_batch=10)
+    for i in range(10):
+        tight.add_turn(_turn(i))
+    messages = tight.build(user)
+    assert sum(map(message_tokens, messages)) <= 40
+    assert messages[-2]["content"] == "第9个回答"
+    assert tight.truncated_requests == 1
+    print(f"[OK] Prefix stable, truncated to {len(messages)} messages")
+
+def test_rolling_summary_in_background(fake_model_server):
+    print("\nTesting rolling summary...")
+    fake_model_server.token_delay = 0.001
+
+    async def run():
+        client = ModelServiceClient()
+        client.base_url = fake_model_server.url
+        session_id = await client.create_session("系统提示")
+        context = ConversationContext("系统提示", keep_turns=2, summary_batch=2)
+        client._session_history.get(session_id)["context"] = context
+        try:
+            for _ in range(8):
+                await client.send_audio(session_id, b"\x00" * 3200)
+                if context.summary_task is not None:
+                    await context.summary_task
+            return context
+        finally:
+            await model_http_pool.close()
+
+    context = asyncio.run(run())
+    requests = [detail for _, name, detail in fake_model_server.events if name == "chat_start"]
+    turn_requests = [r for r in requests if r["messages"][0]["content"] == "系统提示"]
+
+    # 摘要后请求消息数不随轮数增长
+    assert context.folds >= 2
+    assert context.summary == fake_model_server.reply
+    assert max(len(r["messages"]) for r in turn_requests) <= 2 + 2 * (2 + 2) + 1
+    # 原文轮次带着用户语音，折叠时语音一并交给摘要请求
+    assert turn_requests[-1]["messages"][-3]["content"][0]["type"] == "input_audio"
+    summary_requests = [r for r in requests if r["messages"][0]["content"] != "系统提示"]
+    parts = summary_requests[0]["messages"][1]["content"]
+    assert sum(part["type"] == "input_audio" for part in parts) == 2
+    print(f"[OK] {context.folds} folds, {len(turn_requests[-1]['messages'])} messages in last request")
@@ -0,0 +1,39 @@
+"""Test shared model HTTP pool metrics"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import asyncio
+
+import httpx
+
+from app.services.http_pool import ModelHTTPPool
+
+def test_connections_counted_from_trace(fake_model_server):
+    print("Testing HTTP pool metrics...")
+    pool = ModelHTTPPool()
+
+    async def run():
+        try:
+            # 顺序请求复用同一条长连接
+            for _ in range(5):
+                response = await pool.post(
+                    f"{fake_model_server.url}/v1/audio/speech", json={"input": "您好"}
+                )
+                assert response.status_code == 200
+            # 连接失败只计入失败次数，不算新建连接
+            try:
+                await pool.post("http://127.0.0.1:9/v1/audio/speech", json={"input": "您好"})
+            except httpx.ConnectError:
+                pass
+            return pool.stats()
+        finally:
+            await pool.close()
+
+    stats = asyncio.run(run())
+    assert stats["requests_total"] == 6
+    assert stats["new_connections"] == 1
+    assert stats["connect_failures"] == 1
+    assert stats["requests_in_flight"] == 0
+    assert stats["requests_in_flight_peak"] == 1
+    print(f"[OK] {stats}")
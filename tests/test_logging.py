@@ -0,0 +1,129 @@
+"""Test the background batched log pipeline"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import json
+import time
+
+from loguru import logger
+
+from app.config import settings
+from app.services.logger_service import LogPipeline, logger_service
+
+class StalledStream:
+    """模拟阻塞的终端/管道：每次 write 卡住 stall 秒"""
+    def __init__(self, stall: float):
+        self.stall = stall
+        self.writes = 0
+
+    def write(self, text: str):
+        time.sleep(self.stall)
+        self.writes += 1
+
+    def flush(self):
+        pass
+
+def read_records(log_dir) -> list:
+    records = []
+    for name in sorted(os.listdir(log_dir)):
+        with open(os.path.join(log_dir, name), encoding="utf-8") as f:
+            records += [json.loads(line) for line in f]
+    return records
+
+def test_structured_sampled_and_non_blocking(tmp_path, monkeypatch):
+    print("Testing log pipeline...")
+    stream = StalledStream(0.2)
+    monkeypatch.setattr(sys, "stdout", stream)
+    pipeline = LogPipeline(log_dir=str(tmp_path), batch_size=64, sample_rate=10)
+    handler = logger.add(
+        pipeline.sink, format="{message}", filter=pipeline.sample, level="DEBUG"
+    )
+    pipeline.start()
+    try:
+        started = time.perf_counter()
+        with logger.contextualize(call_id="call_log", turn=3):
+            logger.bind(stage="first_audio", ms=120).info("首个音频字节")
+            for i in range(1000):
+                logger.bind(sample="frame").debug(f"帧 {i}")
+        elapsed = time.perf_counter() - started
+    finally:
+        logger.remove(handler)
+        pipeline.stop()
+
+    # 控制台阻塞不影响调用方：1000条日志只入队，批量写出
+    assert elapsed < 0.2
+    assert stream.writes < 10
+    records = read_records(tmp_path)
+    first = records[0]
+    assert first["message"] == "首个音频字节"
+    assert (first["call_id"], first["turn"], first["stage"], first["ms"]) == ("call_log", 3, "first_audio", 120)
+    frames = [r for r in records if r.get("sample") == "frame"]
+    assert [r["message"] for r in frames] == [f"帧 {i}" for i in range(0, 1000, 10)]
+    assert frames[0]["sample_rate"] == 10
+    assert pipeline.sampled_out == 900
+    print(f"[OK] 1001 logs in {elapsed * 1000:.1f}ms with a stalled console, {pipeline.stats()}")
+
+def test_queue_full_drops(tmp_path):
+    print("\nTesting queue overflow...")
+    pipeline = LogPipeline(log_dir=str(tmp_path), console=False, queue_size=100)
+    handler = logger.add(pipeline.sink, format="{message}")
+    try:
+        # 后台线程未启动：超出队列上限的记录被丢弃而不是阻塞
+        for i in range(150):
+            logger.info(f"记录 {i}")
+    finally:
+        logger.remove(handler)
+    assert pipeline.dropped == 50
+    pipeline.start()
+    pipeline.stop()
+    assert len(read_records(tmp_path)) == 100
+    print(f"[OK] {pipeline.stats()}")
+
+class BrokenFile:
+    def write(self, text: str):
+        raise OSError("磁盘已满")
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+def test_failed_write_counted_as_dropped(tmp_path, monkeypatch):
+    print("\nTesting failed writes...")
+    pipeline = LogPipeline(log_dir=str(tmp_path), console=False)
+    monkeypatch.setattr(pipeline, "_log_file", lambda: BrokenFile())
+    handler = logger.add(pipeline.sink, format="{message}")
+    try:
+        for i in range(10):
+            logger.info(f"记录 {i}")
+    finally:
+        logger.remove(handler)
+    pipeline.start()
+    pipeline.stop()
+    # 写入失败的记录只计为丢弃，不计为已写出
+    assert pipeline.stats()["records"] == 0
+    assert pipeline.stats()["dropped"] == 10
+    print(f"[OK] {pipeline.stats()}")
+
+def test_save_conversation_in_background(tmp_path, monkeypatch):
+    print("\nTesting background conversation save...")
+    monkeypatch.setattr(settings, "log_dir", str(tmp_path))
+    # 其他测试中应用关闭时停止了全局管道，按应用启动时的方式重新启动
+    logger_service.start()
+    conversation = [{"role": "user", "content": "你好"}]
+    logger_service.save_conversation("call_save", conversation)
+    # 调用方随后修改列表不影响已提交的记录
+    conversation.append({"role": "assistant", "content": "您好"})
+
+    deadline = time.time() + 2
+    while not os.listdir(tmp_path) and time.time() < deadline:
+        time.sleep(0.01)
+    time.sleep(0.05)
+    (name,) = os.listdir(tmp_path)
+    assert name.startswith("conversation_call_save_")
+    with open(tmp_path / name, encoding="utf-8") as f:
+        saved = json.load(f)
+    assert saved["conversation"] == [{"role": "user", "content": "你好"}]
+    print(f"[OK] Saved {name}")
@@ -0,0 +1,48 @@
+"""Test Prometheus metrics exposition"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.services.metrics import MetricsRegistry
+
+def test_histogram_buckets_are_cumulative():
+    print("Testing histogram exposition...")
+    registry = MetricsRegistry(prefix="")
+    histogram = registry.histogram("latency_seconds", "test", (0.1, 0.5, 1.0))
+    gauge = registry.gauge("depth", "test", lambda: 3)
+    for value in (0.05, 0.1, 0.3, 2.0):
+        histogram.observe(value)
+    
+    text = registry.render()
+    # 边界值计入 le 等于该边界的桶
+    assert 'latency_seconds_bucket{le="0.1"} 2' in text
+    assert 'latency_seconds_bucket{le="0.5"} 3' in text
+    assert 'latency_seconds_bucket{le="1.0"} 3' in text
+    assert 'latency_seconds_bucket{le="+Inf"} 4' in text
+    assert "latency_seconds_count 4" in text
+    assert "# TYPE depth gauge\ndepth 3" in text
+    assert gauge.collect() == 3
+    print("[OK] Histogram and gauge rendered")
+
+def test_metrics_endpoint():
+    print("\nTesting /metrics endpoint...")
+    client = TestClient(app)
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    for name in (
+        "vad_endpoint_seconds",
+        "resample_seconds",
+        "chat_completion_seconds",
+        "tts_first_byte_seconds",
+        "turn_seconds",
+        "ws_send_seconds",
+        "active_calls",
+        "active_sessions",
+        "utterance_buffer_bytes"
+    ):
+        assert f"# TYPE phone_assistant_{name} " in response.text
+    print("[OK] All stage histograms and gauges exposed")
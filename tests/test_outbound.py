@@ -0,0 +1,149 @@
+"""Test the paced outbound audio scheduler"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import asyncio
+import time
+
+import numpy as np
+
+from app.services.outbound_scheduler import OutboundScheduler
+
+FRAME = 320  # 8kHz 16bit 20ms
+
+class Recorder:
+    def __init__(self):
+        self.sent = []
+
+    async def send(self, data: bytes):
+        self.sent.append((time.perf_counter(), len(data)))
+
+def test_paced_frames_with_lead():
+    print("Testing paced outbound frames...")
+    scheduler = OutboundScheduler(frame_ms=20)
+
+    async def run():
+        recorders = [Recorder(), Recorder()]
+        calls = [scheduler.create(r.send, FRAME) for r in recorders]
+        started = time.perf_counter()
+        # 两路同时写入 1s 音频（最后半帧为尾部）
+        for call in calls:
+            await call.write(b"\x00" * (FRAME * 50 + FRAME // 2))
+            await call.finish()
+        tasks = {
+            task for task in asyncio.all_tasks()
+            if task is not asyncio.current_task()
+        }
+        await asyncio.gather(*(call.drain() for call in calls))
+        return started, recorders, calls, tasks
+
+    started, recorders, calls, tasks = asyncio.run(run())
+    sent = recorders[0].sent
+
+    # 先发出 lead 帧，其余按20ms节奏；两路共用一个定时任务，各有一个发送任务
+    assert sum(task.get_coro().__name__ == "_run" for task in tasks) == 1
+    assert [size for _, size in sent] == [FRAME] * 50 + [FRAME // 2]
+    lead = calls[0].min_lead_frames
+    assert sent[lead - 1][0] - started < 0.01
+    elapsed = sent[-1][0] - started
+    assert abs(elapsed - (51 - lead) * 0.02) < 0.1
+    intervals = np.diff([t for t, _ in sent[lead:]])
+    assert abs(intervals.mean() - 0.02) < 0.003
+    assert calls[0].underruns == 0
+    print(f"[OK] 51 frames in {elapsed * 1000:.0f}ms, mean interval {intervals.mean() * 1000:.1f}ms, "
+          f"jitter max {scheduler.stats()['jitter_ms_max']}ms")
+
+class StalledRecorder(Recorder):
+    """对端缓冲区满：发出 stall_after 帧后发送一直挂起"""
+    def __init__(self, stall_after: int):
+        super().__init__()
+        self.stall_after = stall_after
+
+    async def send(self, data: bytes):
+        if len(self.sent) == self.stall_after:
+            await asyncio.sleep(10)
+        await super().send(data)
+
+def test_stalled_peer_does_not_delay_others(monkeypatch):
+    print("\nTesting stalled peer isolation...")
+    monkeypatch.setattr("app.config.settings.outbound_send_timeout", 0.3)
+    scheduler = OutboundScheduler(frame_ms=20)
+
+    async def run():
+        recorders = [Recorder(), StalledRecorder(5), Recorder()]
+        calls = [scheduler.create(r.send, FRAME) for r in recorders]
+        for call in calls:
+            await call.write(b"\x00" * FRAME * 50)
+            await call.finish()
+        await asyncio.gather(*(call.drain() for call in calls))
+        return recorders, calls
+
+    started = time.perf_counter()
+    recorders, calls = asyncio.run(run())
+    elapsed = time.perf_counter() - started
+
+    # 其他两路照常按20ms节奏发完，没有欠载
+    for recorder, call in (recorders[0], calls[0]), (recorders[2], calls[2]):
+        assert len(recorder.sent) == 50
+        intervals = np.diff([t for t, _ in recorder.sent[call.min_lead_frames:]])
+        assert abs(intervals.mean() - 0.02) < 0.003
+        assert intervals.max() < 0.04
+        assert call.underruns == 0
+    # 卡住的一路发送超时后丢弃未发出的音频
+    stalled = calls[1]
+    assert len(recorders[1].sent) == 5
+    assert stalled.stalls == 1
+    assert stalled.flushed_bytes > 0
+    assert elapsed < 2
+    print(f"[OK] Others max interval {intervals.max() * 1000:.1f}ms, stalled call {stalled.stats()}")
+
+def test_flush_and_underrun():
+    print("\nTesting flush and underrun...")
+    scheduler = OutboundScheduler(frame_ms=20)
+
+    async def run():
+        recorder = Recorder()
+        call = scheduler.create(recorder.send, FRAME)
+
+        # 插话：未发出的帧立即丢弃，之后不再发送
+        await call.write(b"\x00" * FRAME * 50)
+        await asyncio.sleep(0.1)
+        dropped = call.flush()
+        frames_at_flush = len(recorder.sent)
+        await call.drain()
+        await asyncio.sleep(0.1)
+        assert len(recorder.sent) == frames_at_flush
+        assert dropped == FRAME * (50 - frames_at_flush)
+
+        # 数据没跟上：对端播空后计一次欠载，lead 加一帧
+        lead = call.lead_frames
+        await call.write(b"\x00" * FRAME * 2)
+        await asyncio.sleep(0.15)
+        await call.write(b"\x00" * FRAME * 10)
+        await call.finish()
+        await call.drain()
+        return call, lead
+
+    call, lead = asyncio.run(run())
+    assert call.underruns == 1
+    assert call.lead_frames == lead + 1
+    assert call.flushed_bytes > 0
+    print(f"[OK] {call.stats()}")
+
+def test_unpaced_passthrough():
+    print("\nTesting compressed passthrough...")
+    scheduler = OutboundScheduler(frame_ms=20)
+
+    async def run():
+        recorder = Recorder()
+        call = scheduler.create(recorder.send, None)
+        await call.write(b"mp3" * 1000)
+        await call.finish()
+        await call.drain()
+        return recorder
+
+    recorder = asyncio.run(run())
+    assert [size for _, size in recorder.sent] == [3000]
+    assert scheduler.ticks == 0
+    print("[OK] Compressed audio sent as it arrives")
@@ -0,0 +1,81 @@
+"""Test write-behind conversation store"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+
+from app.services.persistence import ConversationStore
+
+def test_write_behind_survives_restart():
+    print("Testing conversation store...")
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite:///{os.path.join(tmp, 'db', 'conversations.db')}"
+        now = datetime.now()
+        
+        store = ConversationStore(url)
+        store.enabled = True
+        store.start()
+        store.save_call(
+            "call-1",
+            phone_number="13800000000",
+            status="initiated",
+            prompt="prompt",
+            created_at=now - timedelta(hours=2)
+        )
+        store.save_call("call-2", phone_number="13900000000", status="initiated", created_at=now)
+        store.save_call("call-1", status="terminated", ended_at=now, duration=60)
+        store.save_messages("call-1", [
+            {"role": "system", "content": "prompt"},
+            {"role": "user", "content": "你好"}
+        ])
+        store.save_messages("call-1", [{"role": "assistant", "content": "您好"}])
+        # 未经 initiate 的通话（仅WebSocket）自动补建呼叫记录
+        store.save_messages("call-3", [{"role": "system", "content": "prompt"}])
+        store.stop()
+        assert store.stats()["writes_total"] == 6
+        
+        # 重启后数据仍在，迁移幂等
+        store = ConversationStore(url)
+        store.enabled = True
+        store.start()
+        try:
+            with store.engine.connect() as connection:
+                mode = connection.execute(text("PRAGMA journal_mode")).scalar()
+            assert mode == "wal"
+            
+            calls = store.find_calls(phone_number="13800000000")
+            assert [c["call_id"] for c in calls] == ["call-1"]
+            assert calls[0]["status"] == "terminated" and calls[0]["duration"] == 60
+            assert [c["call_id"] for c in store.find_calls(status="initiated")] == ["call-2"]
+            recent = store.find_calls(start=now - timedelta(minutes=1))
+            assert {c["call_id"] for c in recent} == {"call-2", "call-3"}
+            
+            messages = store.get_messages("call-1")
+            assert [m["content"] for m in messages] == ["prompt", "你好", "您好"]
+            assert store.get_call("call-3")["status"] == "connected"
+            
+            # 重连后重建的会话从头提交历史：接在已存消息之后，不覆盖
+            store.save_messages("call-1", [
+                {"role": "system", "content": "prompt"},
+                {"role": "user", "content": "第二次连接"}
+            ])
+            store.save_messages("call-1", [{"role": "assistant", "content": "请讲"}])
+            deadline = time.time() + 2
+            while len(store.get_messages("call-1")) < 6 and time.time() < deadline:
+                time.sleep(0.01)
+            messages = store.get_messages("call-1")
+            assert [m["content"] for m in messages] == [
+                "prompt", "你好", "您好", "prompt", "第二次连接", "请讲"
+            ]
+        finally:
+            store.stop()
+    print("[OK] Calls and messages persisted across restart")
+
+if __name__ == "__main__":
+    test_write_behind_survives_restart()
+    print("\n[SUCCESS] All tests passed!")
@@ -0,0 +1,67 @@
+"""Test sentence-level LLM -> TTS pipelining"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import asyncio
+import time
+
+from app.services.http_pool import model_http_pool
+from app.services.model_client import ModelServiceClient
+from app.utils.text import SentenceSegmenter
+
+def test_sentence_segmenter():
+    print("Testing sentence segmenter...")
+    segmenter = SentenceSegmenter()
+    sentences = []
+    for token in "你好！价格是3.14元。Sure. Anything else? 好的":
+        sentences += segmenter.feed(token)
+    tail = segmenter.flush()
+    
+    assert sentences == ["你好！", "价格是3.14元。", "Sure.", "Anything else?"]
+    assert tail == "好的"
+    print(f"[OK] Segmented: {sentences} + {tail!r}")
+
+async def _run_turn(client, session_id):
+    started = time.perf_counter()
+    first_audio = None
+    chunks = []
+    async for chunk in client.pipeline_response(session_id, b"\x00" * 3200):
+        if first_audio is None:
+            first_audio = time.perf_counter()
+        chunks.append(chunk)
+    return started, first_audio, b"".join(chunks)
+
+def test_pipeline_overlaps_generation_and_tts(fake_model_server):
+    print("\nTesting pipeline mode...")
+    
+    async def run():
+        client = ModelServiceClient()
+        client.base_url = fake_model_server.url
+        session_id = await client.create_session("test")
+        try:
+            result = await _run_turn(client, session_id)
+            history = await client.get_conversation(session_id)
+            return result, history
+        finally:
+            await model_http_pool.close()
+    
+    (started, first_audio, audio), history = asyncio.run(run())
+    server = fake_model_server
+    reply = server.reply
+    chat_end = server.event_times("chat_end")[0]
+    tts_starts = server.event_times("tts_start")
+    
+    # 首句TTS在整段回复生成结束前就已发起，首个音频也先于生成结束到达
+    assert len(tts_starts) == 3
+    assert tts_starts[0] < chat_end
+    assert first_audio < chat_end
+    
+    # 各句音频按句序拼回
+    assert audio == server.synthesize("".join(SentenceSegmenter().feed(reply)))
+    
+    assert history[-1]["content"] == reply
+    print(
+        f"[OK] First audio {1000 * (first_audio - started):.0f}ms, "
+        f"reply done {1000 * (chat_end - started):.0f}ms"
+    )
@@ -0,0 +1,86 @@
+"""Test bounded session store and shared session manager"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import asyncio
+
+from app.services.session_store import BoundedSessionStore
+from app.services.session_manager import SessionManager
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+    
+    def __call__(self):
+        return self.now
+
+def test_lru_and_ttl_eviction():
+    print("Testing session store eviction...")
+    clock = FakeClock()
+    evicted = []
+    store = BoundedSessionStore(
+        "test",
+        max_entries=2,
+        ttl_seconds=10,
+        on_evict=lambda key, value: evicted.append(key),
+        clock=clock
+    )
+    
+    # 超过条目上限时淘汰最久未访问的条目
+    store.set("a", 1)
+    store.set("b", 2)
+    assert store.get("a") == 1
+    store.set("c", 3)
+    assert evicted == ["b"]
+    assert "a" in store and "c" in store
+    
+    # 空闲超过TTL的条目在访问或写入时淘汰
+    clock.now = 5
+    assert store.get("c") == 3
+    clock.now = 12
+    assert store.get("a") is None
+    store.set("d", 4)
+    assert evicted == ["b", "a"]
+    assert len(store) == 2
+    
+    stats = store.stats()
+    assert stats["evicted_lru"] == 1 and stats["evicted_ttl"] == 1
+    print(f"[OK] Evicted {evicted}, stats {stats}")
+
+def test_byte_cap_eviction():
+    print("\nTesting session store byte cap...")
+    store = BoundedSessionStore("test", max_entries=100, max_bytes=10, sizeof=len)
+    store.set("a", "xxxx")
+    store.set("b", "yyyy")
+    
+    # 原地增长后重新估算，超过字节上限时淘汰最旧条目
+    store.set("b", "yyyyyyyy")
+    assert "a" not in store
+    assert store.resident_bytes == 8
+    print(f"[OK] Resident {store.resident_bytes} bytes")
+
+def test_session_manager_cleanup_releases_history():
+    print("\nTesting session manager cleanup...")
+    
+    async def run():
+        manager = SessionManager()
+        session = await manager.create_session("call-1", "prompt")
+        remote_id = session.remote_session_id
+        
+        assert manager.get_session_by_remote_id(remote_id) is session
+        assert await manager.model_client.get_conversation(remote_id)
+        
+        await manager.cleanup_session("call-1")
+        assert manager.get_session("call-1") is None
+        assert manager.get_session_by_remote_id(remote_id) is None
+        assert await manager.model_client.get_conversation(remote_id) == []
+    
+    asyncio.run(run())
+    print("[OK] Session and remote history released")
+
+if __name__ == "__main__":
+    test_lru_and_ttl_eviction()
+    test_byte_cap_eviction()
+    test_session_manager_cleanup_releases_history()
+    print("\n[SUCCESS] All tests passed!")
@@ -0,0 +1,108 @@
+"""Test speculative generation from a tentative pause"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import asyncio
+import json
+import time
+
+import numpy as np
+from fastapi.testclient import TestClient
+
+from app.config import settings
+from app.main import app
+from app.services.audio_archiver import audio_archiver
+from app.services.http_pool import model_http_pool
+from app.services.metrics import speculation_committed, speculation_wasted
+from app.services.model_client import ModelServiceClient, model_client
+from app.services.persistence import conversation_store
+from tests.fake_model_server import FakeModelServer
+
+PCM = (np.random.default_rng(0).standard_normal(8000) * 3000).astype(np.int16).tobytes()
+
+def test_speculative_reply_held_until_commit(fake_model_server, monkeypatch):
+    print("Testing speculative generation...")
+    monkeypatch.setattr(settings, "speculative_prefill", True)
+    monkeypatch.setattr(settings, "pipeline_mode", True)
+    fake_model_server.token_delay = 0.001
+    fake_model_server.tts_first_byte_delay = 0.01
+
+    async def run():
+        client = ModelServiceClient()
+        client.base_url = fake_model_server.url
+        session_id = await client.create_session("系统提示")
+        chunks = []
+
+        async def consume(commit):
+            async for chunk in client.generate_response(session_id, PCM, "pcm", commit):
+                chunks.append((time.perf_counter(), chunk))
+
+        try:
+            # 用户继续说话：推测生成被取消，不写入历史
+            wasted = asyncio.create_task(consume(asyncio.get_running_loop().create_future()))
+            await asyncio.sleep(0.3)
+            wasted.cancel()
+            await asyncio.wait([wasted])
+            assert not chunks
+            assert await client.get_conversation(session_id) == [
+                {"role": "system", "content": "系统提示"}
+            ]
+
+            # 确认说话结束：已生成的回复立即输出
+            commit = asyncio.get_running_loop().create_future()
+            task = asyncio.create_task(consume(commit))
+            await asyncio.sleep(0.3)
+            assert not chunks
+            committed_at = time.perf_counter()
+            commit.set_result(committed_at)
+            await task
+            return committed_at, chunks, await client.get_conversation(session_id)
+        finally:
+            await model_http_pool.close()
+
+    committed_at, chunks, conversation = asyncio.run(run())
+    chat_end = fake_model_server.event_times("chat_end")
+
+    # 两次请求都在提交前完整发出；第二轮的生成在提交前已完成，音频在提交后才输出
+    assert len(fake_model_server.event_times("chat_start")) == 2
+    assert chat_end[-1] < committed_at
+    assert all(t >= committed_at for t, _ in chunks)
+    assert chunks[0][0] - committed_at < 0.05
+    assert [message["role"] for message in conversation] == ["system", "user", "assistant"]
+    print(f"[OK] First chunk {(chunks[0][0] - committed_at) * 1000:.1f}ms after commit")
+
+def test_speculation_counters_over_websocket(monkeypatch):
+    print("\nTesting speculation counters...")
+    server = FakeModelServer(reply="您好", token_delay=0.001).start()
+    monkeypatch.setattr(settings, "speculative_prefill", True)
+    monkeypatch.setattr(conversation_store, "enabled", False)
+    monkeypatch.setattr(audio_archiver, "enabled", False)
+    monkeypatch.setattr(model_client, "base_url", server.url)
+    rng = np.random.default_rng(1)
+    speech = [
+        (rng.standard_normal(160) * 5000).astype(np.int16).tobytes() for _ in range(50)
+    ]
+    pause = [np.zeros(160, dtype=np.int16).tobytes()] * 15
+    silence = [np.zeros(160, dtype=np.int16).tobytes()] * 60
+    committed = speculation_committed.value
+    wasted = speculation_wasted.value
+
+    try:
+        with TestClient(app) as client:
+            with client.websocket_connect("/ws/call/call_speculation") as ws:
+                for frame in speech + pause + speech + silence:
+                    ws.send_bytes(frame)
+                while True:
+                    message = ws.receive()
+                    if message.get("text") and json.loads(message["text"])["type"] == "turn_complete":
+                        break
+    finally:
+        server.stop()
+
+    # 第一次停顿后继续说话为浪费，第二次停顿被端点确认
+    assert speculation_wasted.value == wasted + 1
+    assert speculation_committed.value == committed + 1
+    requests = [detail for _, name, detail in server.events if name == "chat_start"]
+    assert len(requests[-1]["messages"]) == 2
+    print(f"[OK] {len(requests)} requests, 1 wasted, 1 committed")
@@ -0,0 +1,73 @@
+"""Test content-addressed TTS cache"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import asyncio
+import tempfile
+
+from app.services.http_pool import model_http_pool
+from app.services.model_client import ModelServiceClient
+from app.services.tts_cache import TTSCache, cache_key
+
+def test_memory_lru_by_bytes():
+    print("Testing TTS cache memory tier...")
+    cache = TTSCache(cache_dir="")
+    cache.max_bytes = 10
+    
+    # 归一化后相同的文本命中同一条目
+    assert cache_key(" 您好，\n欢迎 ", "alloy", "mp3", "m") == cache_key("您好，欢迎", "alloy", "mp3", "m")
+    assert cache_key("您好", "alloy", "mp3", "m") != cache_key("您好", "echo", "mp3", "m")
+    
+    cache.put("a", b"x" * 6)
+    cache.put("b", b"y" * 4)
+    assert asyncio.run(cache.get("a")) == b"x" * 6
+    cache.put("c", b"z" * 4)
+    assert asyncio.run(cache.get("b")) is None
+    assert cache.memory_bytes == 10
+    
+    stats = cache.stats()
+    assert stats["memory_hits"] == 1 and stats["misses"] == 1
+    assert stats["bytes_served"] == 6
+    print(f"[OK] Memory tier stats: {stats}")
+
+def test_tts_cache_skips_repeated_synthesis(fake_model_server, monkeypatch):
+    print("\nTesting TTS cache in model client...")
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        async def run():
+            cache = TTSCache(cache_dir=tmp)
+            await cache.start()
+            # 另一个worker：在文件写入前已启动，索引中没有该条目
+            other_worker = TTSCache(cache_dir=tmp)
+            await other_worker.start()
+            monkeypatch.setattr("app.services.model_client.tts_cache", cache)
+            client = ModelServiceClient()
+            client.base_url = fake_model_server.url
+            try:
+                first = b"".join([c async for c in client.synthesize_stream("您好，欢迎致电。")])
+                second = b"".join([c async for c in client.synthesize_stream("您好，欢迎致电。 ")])
+                greeting = await client.generate_greeting("您好，欢迎致电。")
+                await cache.flush()
+                
+                # 重启后由磁盘层命中，读出后提升到内存层
+                restarted = TTSCache(cache_dir=tmp)
+                await restarted.start()
+                assert restarted.stats()["disk_entries"] == 1
+                monkeypatch.setattr("app.services.model_client.tts_cache", restarted)
+                key = client._tts_cache_key("您好，欢迎致电。")
+                assert await restarted.get(key) == fake_model_server.synthesize("您好，欢迎致电。")
+                third = await client.generate_greeting("您好，欢迎致电。")
+                assert await other_worker.get(key) == third
+                return first, second, greeting, third, cache.stats(), restarted.stats()
+            finally:
+                await model_http_pool.close()
+        
+        first, second, greeting, third, stats, disk_stats = asyncio.run(run())
+    
+    expected = fake_model_server.synthesize("您好，欢迎致电。")
+    assert first == second == greeting == third == expected
+    assert len(fake_model_server.event_times("tts_start")) == 1
+    assert stats["memory_hits"] == 2 and stats["disk_entries"] == 1
+    assert disk_stats["disk_hits"] == 1 and disk_stats["memory_hits"] == 1
+    print(f"[OK] One synthesis served 4 requests, hit rate {stats['hit_rate']}")
@@ -0,0 +1,108 @@
+"""增益微基准：逐块峰值归一化 vs 流式自动增益（AGC）
+
+用法:
+    python tools/bench_agc.py [--seconds 60] [--frame-ms 20]
+
+对重采样后（16kHz int16）的帧序列（语音与线路噪声交替）统计：
+- ns/sample: 每个样本的处理耗时
+- alloc_bytes/frame: 每帧处理期间的临时内存峰值（tracemalloc）
+- noise_peak_dbfs: 静音帧输出的峰值，逐块归一化会把噪声放大到满幅
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from app.services.audio_processor import AudioProcessor, AutomaticGainControl
+
+SAMPLE_RATE = 16000
+
+
+def make_frames(seconds: int, frame_ms: int) -> tuple:
+    """语音 1.5s（较低电平）与噪声 1s 交替，返回帧列表与每帧是否为噪声"""
+    rng = np.random.default_rng(0)
+    frame_samples = SAMPLE_RATE * frame_ms // 1000
+    frames, is_noise = [], []
+    t = 0.0
+    while t < seconds:
+        for duration, level, noise in ((1.5, 1500, False), (1.0, 30, True)):
+            for _ in range(int(duration * 1000 / frame_ms)):
+                frame = rng.standard_normal(frame_samples) * level
+                frames.append(frame.astype(np.int16))
+                is_noise.append(noise)
+            t += duration
+    return frames, is_noise
+
+
+def normalize_path(frames: list) -> list:
+    processor = AudioProcessor()
+    return [processor._normalize(frame) for frame in frames]
+
+
+def agc_path(frames: list) -> list:
+    agc = AutomaticGainControl(SAMPLE_RATE)
+    # 帧在处理前已是可写的独立数组（重采样器输出），原地处理
+    return [agc.process(frame) for frame in frames]
+
+
+def measure(name: str, fn, frames: list, is_noise: list) -> dict:
+    timing_frames = [frame.copy() for frame in frames]
+    started = time.perf_counter()
+    outputs = fn(timing_frames)
+    elapsed = time.perf_counter() - started
+    samples = sum(len(frame) for frame in frames)
+
+    # 逐帧测临时内存峰值：处理器在整段上预热后再测
+    alloc_frames = [frame.copy() for frame in frames]
+    state = AutomaticGainControl(SAMPLE_RATE)
+    processor = AudioProcessor()
+    peaks = []
+    tracemalloc.start()
+    for frame in alloc_frames:
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+        if fn is agc_path:
+            state.process(frame)
+        else:
+            processor._normalize(frame)
+        peaks.append(tracemalloc.get_traced_memory()[1] - baseline)
+    tracemalloc.stop()
+    steady = peaks[len(peaks) // 10:]
+
+    noise_peak = max(
+        int(np.abs(output.astype(np.int32)).max())
+        for output, noise in zip(outputs, is_noise) if noise
+    )
+    result = {
+        "ns_per_sample": elapsed * 1e9 / samples,
+        "alloc_bytes_per_frame": float(np.mean(steady)),
+        "noise_peak_dbfs": 20 * np.log10(max(noise_peak, 1) / 32767)
+    }
+    print(
+        f"{name:<10} {result['ns_per_sample']:>8.2f} ns/sample  "
+        f"{result['alloc_bytes_per_frame']:>9.0f} B/frame  "
+        f"noise peak {result['noise_peak_dbfs']:>6.1f} dBFS"
+    )
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=int, default=60)
+    parser.add_argument("--frame-ms", type=int, default=20)
+    args = parser.parse_args()
+
+    frames, is_noise = make_frames(args.seconds, args.frame_ms)
+    print(f"{len(frames)} 帧 x {len(frames[0])} 样本 (16kHz int16)")
+    old = measure("normalize", normalize_path, frames, is_noise)
+    new = measure("agc", agc_path, frames, is_noise)
+    print(f"加速比: {old['ns_per_sample'] / new['ns_per_sample']:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""对话上下文基准：完整历史 vs token预算 + 滚动摘要
+
+用法:
+    python tools/bench_context.py [--turns 40] [--report-every 5] [--prefill-ms-per-token 0.2]
+
+对本地模型服务替身（tests/fake_model_server.py）连续发起多轮对话，替身按
+提示token数模拟 prefill 延迟。记录每轮对话请求的JSON字节数与往返延迟；
+full 模式不设预算也不折叠（等同于每轮重发全部历史），budget 模式使用
+CONTEXT_* 配置。
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.context_manager import ConversationContext
+from app.services.http_pool import model_http_pool
+from app.services.model_client import ModelServiceClient
+from tests.fake_model_server import FakeModelServer
+
+SYSTEM_PROMPT = "你是AI客服，请友善地与用户对话。" * 10
+REPLY = "好的，已为您查询到订单状态，预计明天上午送达，请问还有其他需要帮助的吗？"
+
+
+async def run(server: FakeModelServer, mode: str, turns: int) -> list:
+    client = ModelServiceClient()
+    client.base_url = server.url
+    session_id = await client.create_session(SYSTEM_PROMPT)
+    if mode == "full":
+        context = ConversationContext(
+            SYSTEM_PROMPT, max_tokens=10 ** 9, keep_turns=10 ** 9
+        )
+        client._session_history.get(session_id)["context"] = context
+
+    latencies = []
+    try:
+        for _ in range(turns):
+            started = time.perf_counter()
+            await client.send_audio(session_id, b"")
+            latencies.append((time.perf_counter() - started) * 1000)
+    finally:
+        await model_http_pool.close()
+
+    payloads = [
+        len(json.dumps(body, ensure_ascii=False).encode("utf-8"))
+        for _, name, body in server.events
+        if name == "chat_start" and body["messages"][0]["content"] == SYSTEM_PROMPT
+    ]
+    server.events.clear()
+    return list(zip(payloads, latencies))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--turns", type=int, default=40)
+    parser.add_argument("--report-every", type=int, default=5)
+    parser.add_argument("--prefill-ms-per-token", type=float, default=0.2)
+    args = parser.parse_args()
+
+    server = FakeModelServer(
+        reply=REPLY,
+        token_delay=0.0,
+        prefill_delay_per_token=args.prefill_ms_per_token / 1000
+    ).start()
+    try:
+        results = {
+            mode: asyncio.run(run(server, mode, args.turns))
+            for mode in ("full", "budget")
+        }
+    finally:
+        server.stop()
+
+    print(
+        f"{'turn':>5} {'full(B)':>9} {'full(ms)':>9} "
+        f"{'budget(B)':>10} {'budget(ms)':>11}"
+    )
+    for turn in range(args.report_every, args.turns + 1, args.report_every):
+        full_bytes, full_ms = results["full"][turn - 1]
+        budget_bytes, budget_ms = results["budget"][turn - 1]
+        print(
+            f"{turn:>5} {full_bytes:>9} {full_ms:>9.1f} "
+            f"{budget_bytes:>10} {budget_ms:>11.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
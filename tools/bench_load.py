@@ -0,0 +1,395 @@
+"""端到端负载测试：N 路并发通话压测完整服务
+
+用法:
+    python tools/bench_load.py [--calls 20] [--turns 3] [--output report.json]
+    python tools/bench_load.py --calls 50 --compare report.json
+
+在子进程中启动 FastAPI 服务（uvicorn），模型服务由本进程内的
+FakeModelServer 替身提供，延迟可配置。每路通话通过 WebSocket 以实时节奏
+（20ms/帧）发送 8kHz int16 音频：一段语音（--audio 指定的WAV录音，或合成
+噪声）后接静音，直到收到 turn_complete 再开始下一轮。
+
+延迟从主叫最后一帧语音发出时计起（含VAD端点判定），即主叫感受到的延迟：
+- turn_latency_ms: 到 turn_complete
+- first_audio_ms: 到收到第一个回复音频
+服务进程的CPU与常驻内存从 /proc 采样，按通话数均摊。结果写为JSON，
+--compare 与之前的报告逐项对比。--speculative 开启推测生成，报告中给出
+提交与浪费的推测次数。
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import wave
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import httpx
+import numpy as np
+import websockets
+
+from tests.fake_model_server import FakeModelServer
+
+SAMPLE_RATE = 8000
+FRAME_MS = 20
+FRAME_BYTES = SAMPLE_RATE * FRAME_MS // 1000 * 2
+SILENCE = b"\x00" * FRAME_BYTES
+
+
+def load_speech(path: str, speech_ms: int) -> list:
+    """读取 8kHz 单声道 16bit WAV，或生成合成语音，切成 20ms 帧"""
+    if path:
+        with wave.open(path, "rb") as f:
+            if (
+                f.getframerate() != SAMPLE_RATE
+                or f.getnchannels() != 1
+                or f.getsampwidth() != 2
+            ):
+                raise SystemExit(f"{path} 需为 8kHz 单声道 16bit WAV")
+            audio = f.readframes(f.getnframes())
+    else:
+        samples = SAMPLE_RATE * speech_ms // 1000
+        rng = np.random.default_rng(0)
+        audio = (rng.standard_normal(samples) * 5000).astype(np.int16).tobytes()
+
+    audio += b"\x00" * (-len(audio) % FRAME_BYTES)
+    return [audio[i:i + FRAME_BYTES] for i in range(0, len(audio), FRAME_BYTES)]
+
+
+def free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def process_usage(pid: int) -> tuple:
+    """返回 (CPU秒, 常驻内存MB)，非Linux返回 (None, None)"""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        with open(f"/proc/{pid}/status") as f:
+            rss_kb = next(
+                int(line.split()[1]) for line in f if line.startswith("VmRSS:")
+            )
+    except OSError:
+        return None, None
+    ticks = os.sysconf("SC_CLK_TCK")
+    # fields[0] 为 state，utime/stime 分别是 stat 的第14/15列
+    cpu = (int(fields[11]) + int(fields[12])) / ticks
+    return cpu, rss_kb / 1024
+
+
+def percentiles(values: list) -> dict:
+    if not values:
+        return {"count": 0}
+    array = np.array(values)
+    return {
+        "count": len(values),
+        "p50": round(float(np.percentile(array, 50)), 1),
+        "p95": round(float(np.percentile(array, 95)), 1),
+        "p99": round(float(np.percentile(array, 99)), 1),
+        "max": round(float(array.max()), 1)
+    }
+
+
+class AppServer:
+    """在子进程中运行被测服务"""
+
+    def __init__(
+        self,
+        model_url: str,
+        calls: int,
+        database_enabled: bool,
+        speculative: bool = False
+    ):
+        self.port = free_port()
+        self.model_url = model_url
+        self.calls = calls
+        self.database_enabled = database_enabled
+        self.speculative = speculative
+        self.process = None
+        self._tempdir = None
+
+    @property
+    def url(self) -> str:
+        return f"127.0.0.1:{self.port}"
+
+    def start(self):
+        self._tempdir = tempfile.TemporaryDirectory()
+        env = dict(
+            os.environ,
+            REMOTE_MODEL_SERVICE_URL=self.model_url,
+            MAX_CONCURRENT_CALLS=str(self.calls),
+            SAVE_AUDIO_OUTPUT="false",
+            DATABASE_ENABLED=str(self.database_enabled).lower(),
+            DATABASE_URL=f"sqlite:///{self._tempdir.name}/load.db",
+            SPECULATIVE_PREFILL=str(self.speculative).lower(),
+            LOG_LEVEL="WARNING",
+            no_proxy="127.0.0.1"
+        )
+        self.process = subprocess.Popen(
+            [
+                sys.executable, "-m", "uvicorn", "app.main:app",
+                "--host", "127.0.0.1", "--port", str(self.port),
+                "--log-level", "warning"
+            ],
+            cwd=ROOT, env=env
+        )
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise SystemExit("服务启动失败")
+            try:
+                httpx.get(f"http://{self.url}/health", timeout=1)
+                return self
+            except httpx.TransportError:
+                time.sleep(0.1)
+        raise SystemExit("服务启动超时")
+
+    def counters(self) -> dict:
+        """读取 /metrics 中的计数器"""
+        text = httpx.get(f"http://{self.url}/metrics", timeout=5).text
+        values = {}
+        for line in text.splitlines():
+            name, _, value = line.partition(" ")
+            if name.endswith("_total"):
+                values[name.removeprefix("phone_assistant_")] = float(value)
+        return values
+
+    def usage(self) -> tuple:
+        return process_usage(self.process.pid)
+
+    def stop(self):
+        if self.process is not None:
+            self.process.terminate()
+            self.process.wait(timeout=10)
+            self.process = None
+        if self._tempdir is not None:
+            self._tempdir.cleanup()
+            self._tempdir = None
+
+
+async def simulate_call(
+    url: str,
+    call_id: str,
+    speech: list,
+    turns: int,
+    turn_timeout: float,
+    result: dict
+):
+    """一路通话：每轮发送语音后持续发静音，直到本轮回复播放完成"""
+    async with websockets.connect(f"ws://{url}/ws/call/{call_id}") as ws:
+        state = {"speech_done": None, "first_audio": None}
+        turn_complete = asyncio.Event()
+
+        async def receive():
+            async for message in ws:
+                now = time.perf_counter()
+                if isinstance(message, bytes):
+                    if state["first_audio"] is None and state["speech_done"]:
+                        state["first_audio"] = now
+                elif json.loads(message)["type"] == "turn_complete":
+                    if state["speech_done"] is not None:
+                        result["turn_latency_ms"].append(
+                            (now - state["speech_done"]) * 1000
+                        )
+                    if state["first_audio"] is not None:
+                        result["first_audio_ms"].append(
+                            (state["first_audio"] - state["speech_done"]) * 1000
+                        )
+                    turn_complete.set()
+
+        receiver = asyncio.create_task(receive())
+        next_send = time.perf_counter()
+
+        async def send(frame: bytes):
+            nonlocal next_send
+            await ws.send(frame)
+            next_send += FRAME_MS / 1000
+            await asyncio.sleep(max(0, next_send - time.perf_counter()))
+
+        try:
+            for _ in range(turns):
+                turn_complete.clear()
+                state["first_audio"] = None
+                for frame in speech:
+                    await send(frame)
+                state["speech_done"] = time.perf_counter()
+
+                deadline = state["speech_done"] + turn_timeout
+                while not turn_complete.is_set():
+                    if time.perf_counter() > deadline or receiver.done():
+                        result["timeouts"] += 1
+                        return
+                    await send(SILENCE)
+                result["turns"] += 1
+        finally:
+            receiver.cancel()
+
+
+async def drive(args, url: str, speech: list, server: AppServer) -> dict:
+    result = {
+        "turns": 0,
+        "timeouts": 0,
+        "errors": 0,
+        "turn_latency_ms": [],
+        "first_audio_ms": []
+    }
+    peak_rss = [0.0]
+    stop = asyncio.Event()
+
+    async def sample_rss():
+        while not stop.is_set():
+            _, rss = server.usage()
+            if rss is not None:
+                peak_rss[0] = max(peak_rss[0], rss)
+            await asyncio.sleep(0.2)
+
+    async def call(index: int):
+        # 在 ramp 时间内均匀错开各路通话的接入
+        await asyncio.sleep(args.ramp * index / args.calls)
+        try:
+            await simulate_call(
+                url, f"load_{index}", speech, args.turns, args.turn_timeout, result
+            )
+        except (OSError, websockets.WebSocketException) as e:
+            result["errors"] += 1
+            print(f"通话 load_{index} 失败: {e}", file=sys.stderr)
+
+    sampler = asyncio.create_task(sample_rss())
+    started = time.perf_counter()
+    await asyncio.gather(*[call(i) for i in range(args.calls)])
+    result["wall_seconds"] = time.perf_counter() - started
+    stop.set()
+    await sampler
+    result["peak_rss_mb"] = peak_rss[0]
+    return result
+
+
+def run(args) -> dict:
+    speech = load_speech(args.audio, args.speech_ms)
+    fake = FakeModelServer(
+        token_delay=args.token_delay,
+        tts_first_byte_delay=args.tts_first_byte_delay,
+        tts_chunk_delay=args.tts_chunk_delay,
+        prefill_delay_per_token=args.prefill_delay_per_token
+    ).start()
+    server = AppServer(fake.url, args.calls, args.database, args.speculative).start()
+    try:
+        cpu_before, rss_before = server.usage()
+        result = asyncio.run(drive(args, server.url, speech, server))
+        cpu_after, _ = server.usage()
+        counters = server.counters()
+    finally:
+        server.stop()
+        fake.stop()
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {
+            key: value for key, value in vars(args).items()
+            if key not in ("output", "compare")
+        },
+        "calls": args.calls,
+        "turns_completed": result["turns"],
+        "timeouts": result["timeouts"],
+        "errors": result["errors"],
+        "wall_seconds": round(result["wall_seconds"], 2),
+        "turn_latency_ms": percentiles(result["turn_latency_ms"]),
+        "first_audio_ms": percentiles(result["first_audio_ms"]),
+        "speculation": {
+            "committed": counters.get("speculation_committed_total", 0),
+            "wasted": counters.get("speculation_wasted_total", 0),
+            "wasted_seconds": round(
+                counters.get("speculation_wasted_seconds_total", 0), 3
+            )
+        }
+    }
+    if cpu_before is not None:
+        cpu = cpu_after - cpu_before
+        report.update({
+            "cpu_seconds": round(cpu, 3),
+            "cpu_seconds_per_call": round(cpu / args.calls, 4),
+            "cpu_percent": round(cpu / result["wall_seconds"] * 100, 1),
+            "rss_mb_baseline": round(rss_before, 1),
+            "rss_mb_peak": round(result["peak_rss_mb"], 1),
+            "memory_mb_per_call": round(
+                (result["peak_rss_mb"] - rss_before) / args.calls, 3
+            )
+        })
+    return report
+
+
+def compare(report: dict, baseline: dict):
+    """逐项打印与基线报告的差异"""
+    rows = [
+        ("turn_latency_ms", "p50"), ("turn_latency_ms", "p95"),
+        ("turn_latency_ms", "p99"), ("first_audio_ms", "p50"),
+        ("first_audio_ms", "p95"), ("first_audio_ms", "p99"),
+        ("cpu_seconds_per_call", None), ("memory_mb_per_call", None)
+    ]
+    print(f"\n对比基线 {baseline.get('commit')} ({baseline.get('calls')} 路)")
+    print(f"{'metric':<24} {'baseline':>10} {'current':>10} {'change':>8}")
+    for key, sub in rows:
+        old, new = baseline.get(key), report.get(key)
+        if sub is not None:
+            old = old.get(sub) if old else None
+            new = new.get(sub) if new else None
+        if old is None or new is None:
+            continue
+        change = f"{(new - old) / old * 100:+.1f}%" if old else "-"
+        name = f"{key}.{sub}" if sub else key
+        print(f"{name:<24} {old:>10} {new:>10} {change:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=20)
+    parser.add_argument("--turns", type=int, default=3)
+    parser.add_argument("--audio", help="主叫语音，8kHz 单声道 16bit WAV")
+    parser.add_argument("--speech-ms", type=int, default=1000,
+                        help="未指定 --audio 时合成语音的时长")
+    parser.add_argument("--ramp", type=float, default=1.0,
+                        help="所有通话在该秒数内逐步接入")
+    parser.add_argument("--turn-timeout", type=float, default=30.0)
+    parser.add_argument("--token-delay", type=float, default=0.02)
+    parser.add_argument("--tts-first-byte-delay", type=float, default=0.05)
+    parser.add_argument("--tts-chunk-delay", type=float, default=0.01)
+    parser.add_argument("--prefill-delay-per-token", type=float, default=0.0)
+    parser.add_argument("--database", action="store_true",
+                        help="开启对话持久化（临时SQLite）")
+    parser.add_argument("--speculative", action="store_true",
+                        help="开启推测生成（SPECULATIVE_PREFILL）")
+    parser.add_argument("--output", help="JSON报告路径")
+    parser.add_argument("--compare", help="用于对比的基线JSON报告")
+    args = parser.parse_args()
+
+    report = run(args)
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(report, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""日志压力下的事件循环延迟：原同步 sink vs 后台批量管道
+
+用法:
+    python tools/bench_logging.py [--calls 50] [--rate 50] [--seconds 5] [--stall-ms 0 20]
+
+每路通话以 rate 条/秒写 INFO 日志（带 call_id/turn 上下文），同时一个
+探测协程每 5ms 醒来一次，统计醒来的延迟（事件循环被阻塞的时长）。
+控制台输出到一个模拟的终端，stall_ms 非零时每 50 次 write 卡住一次，
+模拟终端/管道缓冲区满；文件写到临时目录。
+- legacy:   原配置，控制台 print sink + 同步文件 sink，格式化与IO都在事件循环内
+- pipeline: sink 只入队，后台线程批量格式化为JSON行写出
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from loguru import logger
+
+from app.services.logger_service import LogPipeline
+
+TICK = 0.005
+
+
+class Console:
+    """模拟终端：丢弃输出，每 stall_every 次 write 卡住 stall 秒"""
+
+    def __init__(self, stall: float, stall_every: int = 50):
+        self.stall = stall
+        self.stall_every = stall_every
+        self.writes = 0
+
+    def write(self, text: str):
+        self.writes += 1
+        if self.stall and self.writes % self.stall_every == 0:
+            time.sleep(self.stall)
+
+    def flush(self):
+        pass
+
+
+def legacy_setup(log_dir: str):
+    """原 LoggerService.setup_logger 的配置"""
+    logger.add(
+        lambda msg: print(msg, end=''),
+        format="<green>{time:YYYY-MM-DD HH:mm:ss}</green> | <level>{level: <8}</level> | <cyan>{name}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan> - <level>{message}</level>",
+        level="INFO",
+        colorize=True
+    )
+    logger.add(
+        os.path.join(log_dir, "assistant_{time:YYYYMMDD}.log"),
+        rotation="1 day",
+        retention="7 days",
+        format="{time:YYYY-MM-DD HH:mm:ss} | {level: <8} | {name}:{function}:{line} - {message}",
+        level="INFO"
+    )
+    return None
+
+
+def pipeline_setup(log_dir: str):
+    pipeline = LogPipeline(log_dir=log_dir)
+    logger.add(pipeline.sink, format="{message}", level="INFO", filter=pipeline.sample)
+    pipeline.start()
+    return pipeline
+
+
+async def workload(calls: int, rate: float, seconds: float) -> list:
+    lags = []
+    stop = time.perf_counter() + seconds
+
+    async def probe():
+        while time.perf_counter() < stop:
+            due = time.perf_counter() + TICK
+            await asyncio.sleep(TICK)
+            lags.append(time.perf_counter() - due)
+
+    async def one_call(index: int):
+        with logger.contextualize(call_id=f"call_{index}", turn=1):
+            while time.perf_counter() < stop:
+                logger.bind(stage="tts_first_byte", ms=42).info(f"TTS首字节: 42ms {index}")
+                await asyncio.sleep(1 / rate)
+
+    await asyncio.gather(probe(), *(one_call(i) for i in range(calls)))
+    return lags
+
+
+def measure(name: str, setup, args, stall_ms: float):
+    console = Console(stall_ms / 1000)
+    stdout = sys.stdout
+    with tempfile.TemporaryDirectory() as log_dir:
+        logger.remove()
+        sys.stdout = console
+        try:
+            pipeline = setup(log_dir)
+            lags = asyncio.run(workload(args.calls, args.rate, args.seconds))
+            if pipeline is not None:
+                pipeline.stop()
+        finally:
+            logger.remove()
+            sys.stdout = stdout
+    lag_ms = np.array(lags) * 1000
+    extra = f"  dropped {pipeline.dropped}" if pipeline is not None else ""
+    print(
+        f"{name:<9} stall {stall_ms:>4.0f}ms  loop lag p50 {np.percentile(lag_ms, 50):>6.2f}ms  "
+        f"p99 {np.percentile(lag_ms, 99):>7.2f}ms  max {lag_ms.max():>7.2f}ms  "
+        f"console writes {console.writes}{extra}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=50)
+    parser.add_argument("--rate", type=float, default=50.0, help="每路每秒日志条数")
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--stall-ms", type=float, nargs="+", default=[0, 20])
+    args = parser.parse_args()
+
+    for stall_ms in args.stall_ms:
+        measure("legacy", legacy_setup, args, stall_ms)
+        measure("pipeline", pipeline_setup, args, stall_ms)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""事件循环延迟基准：逐帧DSP在 inline / thread / process 执行器下的表现
+
+用法:
+    python tools/bench_loop_lag.py [--calls 10 50 100 200] [--seconds 5]
+
+每路模拟通话以实时节奏（20ms/帧）送入 8kHz int16 音频，经 CallDSPStage
+处理；同时用一个探测任务测量事件循环延迟（sleep 的超时量）。
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from app.services.audio_processor import AudioProcessor
+from app.services.dsp_executor import CallDSPStage, DSPExecutor
+
+FRAME_MS = 20
+PROBE_INTERVAL = 0.005
+
+
+async def simulate_call(stage: CallDSPStage, frames: list, processed: list):
+    async def consume():
+        async for _ in stage.results():
+            processed[0] += 1
+
+    consumer = asyncio.create_task(consume())
+    next_send = time.perf_counter()
+    for frame in frames:
+        stage.push(frame)
+        next_send += FRAME_MS / 1000
+        await asyncio.sleep(max(0, next_send - time.perf_counter()))
+    stage.close()
+    await consumer
+
+
+async def probe_lag(lags: list, stop: asyncio.Event):
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(PROBE_INTERVAL)
+        lags.append(time.perf_counter() - started - PROBE_INTERVAL)
+
+
+async def run(mode: str, calls: int, seconds: int) -> dict:
+    executor = DSPExecutor()
+    executor.mode = mode
+    processor = AudioProcessor()
+
+    rng = np.random.default_rng(0)
+    frame_samples = 8000 * FRAME_MS // 1000
+    frames = [
+        rng.integers(-8000, 8000, frame_samples, dtype=np.int16).tobytes()
+        for _ in range(seconds * 1000 // FRAME_MS)
+    ]
+
+    lags = []
+    processed = [0]
+    stop = asyncio.Event()
+    prober = asyncio.create_task(probe_lag(lags, stop))
+
+    stages = [
+        CallDSPStage(
+            executor,
+            processor,
+            processor.create_resampler(8000),
+            processor.create_agc()
+        )
+        for _ in range(calls)
+    ]
+    cpu_start = time.process_time()
+    await asyncio.gather(*[
+        simulate_call(stage, frames, processed) for stage in stages
+    ])
+    cpu = time.process_time() - cpu_start
+    stop.set()
+    await prober
+    executor.shutdown()
+
+    lags_ms = np.array(lags) * 1000
+    return {
+        "mode": mode,
+        "calls": calls,
+        "frames": processed[0],
+        "lag_p50_ms": float(np.percentile(lags_ms, 50)),
+        "lag_p99_ms": float(np.percentile(lags_ms, 99)),
+        "lag_max_ms": float(lags_ms.max()),
+        "loop_cpu_ms_per_call_second": cpu * 1000 / (calls * seconds),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, nargs="+", default=[10, 50, 100, 200])
+    parser.add_argument("--seconds", type=int, default=5)
+    parser.add_argument(
+        "--modes", nargs="+", default=["inline", "thread", "process"]
+    )
+    args = parser.parse_args()
+
+    print(f"{'mode':<8} {'calls':>6} {'p50(ms)':>9} {'p99(ms)':>9} {'max(ms)':>9}")
+    for calls in args.calls:
+        for mode in args.modes:
+            result = asyncio.run(run(mode, calls, args.seconds))
+            print(
+                f"{mode:<8} {calls:>6} {result['lag_p50_ms']:>9.2f} "
+                f"{result['lag_p99_ms']:>9.2f} {result['lag_max_ms']:>9.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""出站节奏基准：每路一个睡眠循环 vs 所有通话共用一个定时轮
+
+用法:
+    python tools/bench_outbound.py [--calls 10 100 500] [--seconds 5]
+
+每路通话持续发送 20ms 帧（8kHz 16bit，发送函数为空操作），统计：
+- late_ms: 每帧实际发出时刻相对计划时刻（对端播放进度 + lead）的延迟，p50/p99/max
+- cpu_ms_per_call_s: 每路每秒音频消耗的CPU毫秒数
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from app.services.outbound_scheduler import OutboundScheduler
+
+FRAME_MS = 20
+FRAME = 8000 * FRAME_MS // 1000 * 2
+
+
+async def sleep_loops(calls: int, frames: int, lead: int) -> list:
+    """对照：每路一个按绝对时刻睡眠的发送循环"""
+    late = []
+
+    async def one_call():
+        started = time.perf_counter()
+        for i in range(frames):
+            due = started + max(i - lead + 1, 0) * FRAME_MS / 1000
+            delay = due - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            late.append(time.perf_counter() - due)
+
+    await asyncio.gather(*(one_call() for _ in range(calls)))
+    return late
+
+
+async def timer_wheel(calls: int, frames: int, lead: int) -> list:
+    scheduler = OutboundScheduler(frame_ms=FRAME_MS)
+    late = []
+
+    async def one_call():
+        started = None
+        sent = 0
+
+        async def send(data: bytes):
+            nonlocal started, sent
+            now = time.perf_counter()
+            if started is None:
+                started = now
+            due = started + max(sent - lead + 1, 0) * FRAME_MS / 1000
+            late.append(max(now - due, 0.0))
+            sent += 1
+
+        call = scheduler.create(send, FRAME)
+        call.lead_frames = lead
+        await call.write(b"\x00" * FRAME * frames)
+        await call.finish()
+        await call.drain()
+
+    await asyncio.gather(*(one_call() for _ in range(calls)))
+    return late
+
+
+def measure(name: str, fn, calls: int, seconds: float, lead: int):
+    frames = int(seconds * 1000 / FRAME_MS)
+    cpu_started = time.process_time()
+    late = asyncio.run(fn(calls, frames, lead))
+    cpu = time.process_time() - cpu_started
+    late_ms = np.array(late) * 1000
+    print(
+        f"{name:<12} {calls:>5} 路  late p50 {np.percentile(late_ms, 50):>6.2f}ms  "
+        f"p99 {np.percentile(late_ms, 99):>6.2f}ms  max {late_ms.max():>7.2f}ms  "
+        f"CPU {cpu * 1000 / calls / seconds:>6.2f} ms/路·秒"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, nargs="+", default=[10, 100, 500])
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--lead", type=int, default=3)
+    args = parser.parse_args()
+
+    for calls in args.calls:
+        measure("sleep_loops", sleep_loops, calls, args.seconds, args.lead)
+        measure("timer_wheel", timer_wheel, calls, args.seconds, args.lead)
+
+
+if __name__ == "__main__":
+    main()
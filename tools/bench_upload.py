@@ -0,0 +1,107 @@
+"""用户语音上传基准：每轮请求体字节数与端点后的上传耗时
+
+用法:
+    python tools/bench_upload.py [--seconds 1 2 4 8] [--uplink-mbps 10]
+
+对不同时长的一段话（16kHz 单声道合成语音）统计各封装格式下
+/v1/chat/completions 请求体的字节数（base64 后）、编码耗时，以及按
+上行带宽估算的端点确认后仍需上传的时间：整段上传时是整个请求体，
+提前上传（AUDIO_UPLOAD_EARLY）时只剩最后一个字节。
+flac 需要安装 soundfile，未安装时跳过。
+"""
+import argparse
+import asyncio
+import base64
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from app.services.codec import CONTAINERS, container_available
+from app.services.model_client import ModelServiceClient
+
+SAMPLE_RATE = 16000
+
+
+def make_utterance(seconds: float) -> bytes:
+    """带音节包络的谐波信号加少量噪声，近似语音的可压缩性"""
+    rng = np.random.default_rng(0)
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    pitch = 140 + 30 * np.sin(2 * np.pi * 0.7 * t)
+    phase = 2 * np.pi * np.cumsum(pitch) / SAMPLE_RATE
+    voiced = sum(np.sin(k * phase) / k for k in range(1, 8))
+    envelope = np.clip(np.sin(2 * np.pi * 3 * t), 0, None)
+    audio = 6000 * envelope * voiced + rng.standard_normal(len(t)) * 200
+    return audio.astype(np.int16).tobytes()
+
+
+def pcm_request_bytes(client: ModelServiceClient, history: dict, pcm: bytes) -> int:
+    """对照：base64 裸PCM"""
+    message = {
+        "role": "user",
+        "content": [
+            {
+                "type": "input_audio",
+                "input_audio": {
+                    "data": base64.b64encode(pcm).decode("ascii"),
+                    "format": "pcm16"
+                }
+            }
+        ]
+    }
+    request = client._chat_request(history, message)
+    return len(json.dumps(request, ensure_ascii=False).encode("utf-8"))
+
+
+async def measure(client: ModelServiceClient, history: dict, pcm: bytes, container: str) -> dict:
+    client.audio_format = container
+    started = time.perf_counter()
+    message = await client._user_message(pcm)
+    body = client._request_body(client._chat_request(history, message))
+    return {"bytes": len(body), "encode_ms": (time.perf_counter() - started) * 1000}
+
+
+async def run(seconds_list: list, uplink_mbps: float):
+    client = ModelServiceClient()
+    session_id = await client.create_session("你是AI客服，请友善地与用户对话")
+    history = client._session_history.get(session_id)
+    bytes_per_ms = uplink_mbps * 1e6 / 8 / 1000
+    containers = [c for c in CONTAINERS if container_available(c)]
+    skipped = [c for c in CONTAINERS if c not in containers]
+    if skipped:
+        print(f"跳过（依赖未安装）: {', '.join(skipped)}")
+
+    print(
+        f"{'时长':>6} {'格式':<6} {'请求体字节':>11} {'相对PCM':>8} "
+        f"{'编码ms':>8} {'端点后上传ms':>12} {'提前上传':>8}"
+    )
+    for seconds in seconds_list:
+        pcm = make_utterance(seconds)
+        baseline = pcm_request_bytes(client, history, pcm)
+        print(
+            f"{seconds:>5}s {'pcm':<6} {baseline:>11} {1:>8.2f} {'-':>8} "
+            f"{baseline / bytes_per_ms:>12.1f} {'-':>8}"
+        )
+        for container in containers:
+            result = await measure(client, history, pcm, container)
+            print(
+                f"{seconds:>5}s {container:<6} {result['bytes']:>11} "
+                f"{result['bytes'] / baseline:>8.2f} {result['encode_ms']:>8.2f} "
+                f"{result['bytes'] / bytes_per_ms:>12.1f} {1 / bytes_per_ms:>8.3f}"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=float, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--uplink-mbps", type=float, default=10.0)
+    args = parser.parse_args()
+    asyncio.run(run(args.seconds, args.uplink_mbps))
+
+
+if __name__ == "__main__":
+    main()
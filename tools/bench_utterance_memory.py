@@ -0,0 +1,114 @@
+"""语音缓冲内存基准：list追加 + b''.join vs 预分配环形缓冲
+
+用法:
+    python tools/bench_utterance_memory.py [--minutes 1] [--speech-ms 4000] [--pause-ms 1000]
+
+模拟一路通话：16kHz处理后音频按20ms分块到达，说话 speech-ms、停顿
+pause-ms 交替。用 tracemalloc 统计每次操作的临时分配，累计为每通话
+分钟分配的字节数（不含两条路径共有的处理后音频块本身）；环形缓冲
+的一次性预分配单独列出。
+"""
+import argparse
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.utterance_buffer import UtteranceBuffer
+
+SAMPLE_RATE = 16000
+CHUNK_MS = 20
+CHUNK_BYTES = SAMPLE_RATE * 2 * CHUNK_MS // 1000
+
+
+class AllocationMeter:
+    def __init__(self):
+        self.allocated = 0
+        self.preallocated = 0
+        self.peak = 0
+
+    def preallocate(self, fn, *args):
+        current, _ = tracemalloc.get_traced_memory()
+        result = fn(*args)
+        self.preallocated += tracemalloc.get_traced_memory()[0] - current
+        return result
+
+    def _measure(self, fn, *args):
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        result = fn(*args)
+        _, peak = tracemalloc.get_traced_memory()
+        return result, peak - current, peak
+
+    def calibrate(self):
+        """测量空调用的开销（调用帧、参数元组），之后逐次扣除"""
+        self.overhead = min(
+            self._measure(lambda chunk: None, b"")[1] for _ in range(100)
+        )
+
+    def measure(self, fn, *args):
+        result, allocated, peak = self._measure(fn, *args)
+        self.allocated += max(0, allocated - self.overhead)
+        self.peak = max(self.peak, peak)
+        return result
+
+
+def schedule(minutes: int, speech_ms: int, pause_ms: int):
+    """产出 (块, 是否语音开始, 是否语音结束)"""
+    chunk = bytes(CHUNK_BYTES)
+    cycle = (speech_ms + pause_ms) // CHUNK_MS
+    speech = speech_ms // CHUNK_MS
+    for i in range(minutes * 60 * 1000 // CHUNK_MS):
+        position = i % cycle
+        yield chunk, position == 0, position == speech
+
+
+def list_join(minutes, speech_ms, pause_ms, meter):
+    audio_buffer = []
+    speaking = False
+    for chunk, start, end in schedule(minutes, speech_ms, pause_ms):
+        if start:
+            speaking = True
+        if end:
+            speaking = False
+            meter.measure(b"".join, audio_buffer)
+            audio_buffer = []
+        if speaking:
+            meter.measure(audio_buffer.append, chunk)
+
+
+def ring_buffer(minutes, speech_ms, pause_ms, meter):
+    buffer = meter.preallocate(UtteranceBuffer)
+    written = 0
+    for chunk, start, end in schedule(minutes, speech_ms, pause_ms):
+        meter.measure(buffer.write, chunk)
+        written += len(chunk) // 2
+        if start:
+            buffer.begin(written - len(chunk) // 2)
+        if end:
+            meter.measure(buffer.end, written)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--minutes", type=int, default=1)
+    parser.add_argument("--speech-ms", type=int, default=4000)
+    parser.add_argument("--pause-ms", type=int, default=1000)
+    args = parser.parse_args()
+
+    tracemalloc.start()
+    for name, fn in (("list+join", list_join), ("ring", ring_buffer)):
+        meter = AllocationMeter()
+        meter.calibrate()
+        fn(args.minutes, args.speech_ms, args.pause_ms, meter)
+        print(
+            f"{name:<10} 分配 {meter.allocated / args.minutes / 1024:>10.1f} KiB/通话分钟   "
+            f"预分配 {meter.preallocated / 1024:>8.1f} KiB   "
+            f"峰值 {meter.peak / 1024:>8.1f} KiB"
+        )
+    tracemalloc.stop()
+
+
+if __name__ == "__main__":
+    main()